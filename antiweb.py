@@ -78,6 +78,15 @@ Multi-File Processing and Sphinx Support
 antiweb creates .rst files which can be further processed by documentation systems like Sphinx.
 Additionally you can process multiple files at once with the -r option added.
 The optional directory parameter then can be empty to use the current directory, or you provide the directory antiweb should use.
+With the -j option the files are distributed to several worker processes (-j 0 uses all available cores).
+The output messages are still printed in the same order as in a single process run.
+With the --cache-dir option the lexed source files are stored in a parse cache, so unchanged
+files and files included by many documents need not be lexed again.
+With the -i option only files which changed since the last build are processed. The state of the last build
+is stored in the manifest file *.antiweb-manifest.json* within the documentation directory.
+The --stats option prints how long the processing phases took, the --trace option writes
+a trace of the build and the --memory option reports the memory peaks and allocation sites
+(see :ref:`Statistics <label-stats>`).
 
 
 .. _label-daemon-mode:
@@ -95,6 +104,15 @@ Antiweb uses the python library *Watchdog* to monitor the source directory.
 Read the documentation of the corresponding event file handler (:ref:`FileChangeHandler <label-filechangehandler>`).
 
 
+***********
+Server Mode
+***********
+
+With the ``--serve`` option antiweb does not process a file but starts a server listening on
+the given Unix socket. The server keeps its caches between the requests. Files are sent to the server
+by the antiweb client, which does not need to import pygments (see :ref:`Server <label-server>`).
+
+
 ************************
 How to add new languages
 ************************
@@ -105,7 +123,7 @@ A simple Reader example is provides by :py:class:`CReader`
 a more advanced reader is :py:class:`PythonReader`.
 
 #@include(comments doc, antiweb_lib\readers\config.py)
-#@include(get_comment_markers doc, antiweb_lib\document.py)
+#@include(get_comment_markers doc, antiweb_lib\readers\config.py)
 
 *******
 Example
@@ -229,6 +247,11 @@ import os.path
 import os
 
 from antiweb_lib.write import write
+from antiweb_lib.build import build
+from antiweb_lib.scanner import scan
+from antiweb_lib import parsecache, stats
+from antiweb_lib.server import serve
+from antiweb_lib.profiler import Profiler
 
 from watchdog.observers import Observer
 from antiweb_lib.filechangehandler import FileChangeHandler
@@ -276,6 +299,55 @@ def parsing():
                                                 "automatically updates the resulting documentation files - "
                                                 "can only be used together with -r option")
 
+    parser.add_option("--ignore", dest="ignore", action="append",
+                      type="string", help="glob pattern of files and directories which are skipped by the -r option")
+
+    parser.add_option("-i", "--incremental", dest="incremental",
+                      action="store_true", help="skips files which did not change since the last build - "
+                                                "can only be used together with -r option")
+
+    parser.add_option("--cache-dir", dest="cache_dir", default="",
+                      type="string", help="directory of the parse cache, which stores the lexed source files - "
+                                          "must not be writable by other users")
+
+    parser.add_option("--cache-size", dest="cache_size", default=100,
+                      type="int", help="maximum size of the parse cache in megabytes (default 100)")
+
+    parser.add_option("--max-size", dest="max_size", default=10,
+                      type="int", help="files larger than this size in megabytes are skipped "
+                                       "by the -r option (default 10)")
+
+    parser.add_option("--serve", dest="serve", default="",
+                      type="string", help="starts a server which processes files sent by the antiweb client "
+                                          "over the given unix socket")
+
+    parser.add_option("--stats", dest="stats",
+                      action="store_true", help="prints the duration of each processing phase")
+
+    parser.add_option("--stats-json", dest="stats_json", default="",
+                      type="string", help="writes the duration of each processing phase to a JSON file "
+                                          "(implies --stats)")
+
+    parser.add_option("--memory", dest="memory",
+                      action="store_true", help="reports the memory peak and the allocation sites "
+                                                "of each file and phase (implies --stats)")
+
+    parser.add_option("--trace", dest="trace", default="",
+                      type="string", help="writes a trace of the processed files and phases to a JSON file, "
+                                          "which can be opened by chrome://tracing")
+
+    parser.add_option("--profile", dest="profile",
+                      action="store_true", help="runs the processing under a profiler and prints the "
+                                                "functions which took the most time")
+
+    parser.add_option("--profile-output", dest="profile_output", default="",
+                      type="string", help="writes the profile to a file: collapsed stacks for *.folded "
+                                          "or *.collapsed, a pstats file otherwise (implies --profile)")
+
+    parser.add_option("-j", "--jobs", dest="jobs", default=1,
+                      type="int", help="number of worker processes used together with -r option "
+                                       "(0 uses all available cores)")
+
     options, args = parser.parse_args()
 
     #There is no argument given, so we assume the user wants to use the current directory.
@@ -285,6 +357,16 @@ def parsing():
     return (options, args, parser)
 #@(parsing)
 
+def _write_stats(recorder, options):
+    if recorder:
+        if options.stats:
+            stats.write_report(recorder, options.stats_json)
+
+        if options.trace:
+            stats.write_trace(recorder, options.trace)
+
+        stats.disable()
+
 def main():
 
     options, args, parser = parsing()
@@ -295,6 +377,23 @@ def main():
     if options.warnings is None:
         options.warnings = True
 
+    parsecache.configure(options)
+
+    if options.stats_json or options.memory:
+        options.stats = True
+
+    recorder = None
+    if options.stats or options.trace:
+        recorder = stats.enable(trace=bool(options.trace), memory=bool(options.memory))
+        if options.trace:
+            options.trace = os.path.abspath(options.trace)
+
+    if options.serve:
+        serve(options.serve, options)
+        #the statistics of all requests are reported when the server stops
+        _write_stats(recorder, options)
+        return True
+
     if not args:
         parser.print_help()
         sys.exit(0)
@@ -316,6 +415,22 @@ def main():
         output_path = os.path.join(previous_dir, options.output)
         options.output = os.path.abspath(output_path)
 
+#@edoc
+
+#With the --profile option the processing runs under a profiler (see :ref:`Profiler <label-profiler>`).
+#Worker processes cannot be profiled, therefore all files are processed in this process.
+
+#@code
+
+    profiler = None
+    if options.profile or options.profile_output:
+        if options.jobs != 1:
+            logger.warning("--profile processes all files in a single process")
+            options.jobs = 1
+
+        profiler = Profiler(options.profile_output and os.path.abspath(options.profile_output))
+        profiler.start()
+
     if options.recursive:
         directory = absolute_path
 
@@ -331,7 +446,10 @@ def main():
 #@edoc
 
 #The program walks through the given directory and all subdirectories. The absolute file names
-#are retrieved. Only files with the allowed extensions are processed.
+#are retrieved. Only files with the allowed extensions are processed. Directories like *.git* or *build*,
+#and all files and directories matching an ``--ignore`` pattern are skipped.
+#Before a file is lexed, its raw content is searched for a start directive. Files without
+#a start directive, binary files and files larger than ``--max-size`` megabytes are skipped.
 
 #@code
 
@@ -339,32 +457,12 @@ def main():
         rst_extension = ".rst"
         ext_tuple = (".cs",".cpp",".py",".cc", rst_extension, ".xml")
 
-        handled_files = []
-
-        for root, dirs, files in os.walk(directory, topdown=False):
-            for filename in files:
-                fname = os.path.join(root, filename)
-
-                if not (os.path.isfile(fname) and fname.endswith(ext_tuple)):
-                    continue
-
-                # rst files should be handled last as they might be a documentation file of a
-                # file that is not yet processed -> in this case the rst file will be ignored
-                if fname.endswith(rst_extension):
-                    handled_files.append(fname)
-                else:
-                    handled_files.insert(0, fname)
+        with stats.phase("walk"):
+            handled_files = list(scan(directory, ext_tuple, options.ignore, rst_extension))
 
         #used to store all created files: needed for daemon mode if source and output directory are the same
         #or directory is a subdirectory of the source directory
-        created_files = set()
-
-        for file in handled_files:
-            if not file in created_files:
-                out_file = write(directory, file, options)
-
-                if out_file:
-                    created_files.add(out_file)
+        created_files = build(directory, handled_files, options)
 
 #@edoc
 
@@ -419,7 +517,13 @@ def main():
 
         write(os.getcwd(), absolute_file_path, options)
 
+    if profiler:
+        profiler.stop()
+        print("\n" + profiler.report())
+
     os.chdir(previous_dir)
+
+    _write_stats(recorder, options)
     return True
 #@edoc
 
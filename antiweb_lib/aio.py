@@ -0,0 +1,150 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import time
+import asyncio
+import logging
+
+from antiweb_lib.document import WebError
+from antiweb_lib.write import generate_from_text
+from antiweb_lib.batch import GenerateResult
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+########
+Asyncio
+########
+
+The asyncio interface is used by services running an event loop, e.g. to render documentation
+previews. The event loop is never blocked: The source file is read by the default executor
+of the loop, lexing and compiling the document (including reading included files) is done
+by a configurable executor. Without an executor the default executor of the loop is used.
+
+The asyncio interface requires Python 3.7 or newer (:py:meth:`agenerate_many` is an asynchronous
+generator), the rest of antiweb runs with Python 3.5.
+
+A ``ProcessPoolExecutor`` runs several documents in parallel, each worker with its own caches.
+With a ``ThreadPoolExecutor`` all documents share the caches of the process; the shared
+sub documents are compiled by one thread at a time.
+
+If a coroutine is cancelled, a document that was not yet started is not processed anymore.
+A document that is already processed by the executor is finished, but its result is dropped.
+
+@include(agenerate doc)
+@include(agenerate_many doc)
+"""
+
+def _read(fname):
+    with open(fname, "r") as f:
+        return f.read()
+
+def _compile(text, fname, tokens, show_warnings, language):
+    #runs in the executor: the dependencies are returned, as a process
+    #executor cannot fill a set of the calling process
+    dependencies = set()
+    text = generate_from_text(text, fname, tokens, show_warnings, language,
+                              dependencies=dependencies)
+    return text, dependencies
+
+#@cstart(agenerate)
+async def agenerate(fname, tokens=None, show_warnings=False, text=None, language=None,
+                    executor=None, dependencies=None):
+#@start(agenerate doc)
+    """
+.. py:method:: agenerate(fname[, tokens[, show_warnings[, text[, language[, executor[, dependencies]]]]]])
+
+   The coroutine version of :py:meth:`generate`.
+
+   :param string fname: The path to the source file.
+   :param list tokens: A list of string tokens, used for @if directives.
+   :param bool show_warnings: Warnings will be written via the logging module.
+   :param string text: The source code. If given, ``fname`` is not read (see :py:meth:`generate_from_text`).
+   :param string language: A pygments lexer alias, e.g. ``"python"``.
+   :param executor: A ``concurrent.futures.Executor`` used to lex and compile the document.
+   :param set dependencies: If given, the absolute paths of all files included
+                            by the source file are added to this set.
+   :return: The generated documentation content as a string - None if an error occurred.
+   :raises WebError: If the document contains errors.
+    """
+#@include(agenerate)
+#@(agenerate doc)
+
+    loop = asyncio.get_event_loop()
+
+    if text is None:
+        try:
+            text = await loop.run_in_executor(None, _read, fname)
+        except IOError as e:
+            logger.error("I/O error : " + e.strerror)
+            return None
+
+    result, included = await loop.run_in_executor(executor, _compile, text, fname, tokens,
+                                                  show_warnings, language)
+    if dependencies is not None:
+        dependencies.update(included)
+
+    return result
+
+#@(agenerate)
+
+async def _agenerate_result(fname, tokens, show_warnings, executor, semaphore):
+    result = GenerateResult(fname)
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            result.text = await agenerate(fname, tokens, show_warnings, executor=executor,
+                                          dependencies=result.dependencies)
+        except WebError as e:
+            result.errors = e.error_list
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.exception = e
+        finally:
+            result.timings["total"] = time.perf_counter() - start
+
+    return result
+
+#@cstart(agenerate_many)
+async def agenerate_many(paths, tokens=None, show_warnings=False, executor=None, limit=None):
+#@start(agenerate_many doc)
+    """
+.. py:method:: agenerate_many(paths[, tokens[, show_warnings[, executor[, limit]]]])
+
+   The asynchronous version of :py:meth:`generate_many`, used with ``async for``.
+   In contrast to :py:meth:`generate_many`, the log messages are not captured
+   in the results, but emitted by the ``antiweb`` logger.
+
+   :param paths: A sequence of source file paths.
+   :param list tokens: A list of string tokens, used for @if directives.
+   :param bool show_warnings: Warnings will be written via the logging module.
+   :param executor: A ``concurrent.futures.Executor`` used to lex and compile the documents.
+   :param integer limit: The maximum number of files processed at the same time,
+                         ``None`` for no limit.
+   :return: An asynchronous iterator of :py:class:`GenerateResult` objects in the
+            order in which they are completed. If the iteration is stopped or cancelled,
+            all pending files are cancelled.
+    """
+#@include(agenerate_many)
+#@(agenerate_many doc)
+
+    paths = list(paths)
+    semaphore = asyncio.Semaphore(limit or max(1, len(paths)))
+    tasks = [ asyncio.ensure_future(_agenerate_result(fname, tokens, show_warnings, executor, semaphore))
+              for fname in paths ]
+
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        for task in tasks:
+            task.cancel()
+
+#@(agenerate_many)
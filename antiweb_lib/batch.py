@@ -0,0 +1,179 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from antiweb_lib.document import WebError
+from antiweb_lib.write import generate
+from antiweb_lib.build import _captured_log, _job_count, _initialize_worker
+from antiweb_lib import parsecache
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+######
+Batch
+######
+
+The batch interface is used by programs which embed antiweb and generate the documentation
+of many files at once. In contrast to :py:meth:`generate`, errors are not raised but returned
+together with the result of each file.
+
+All files of a batch share the cached languages and lexers, the sub document cache
+and the parse cache. If the files are distributed to worker processes, each worker
+has its own caches, which are shared by all files processed by the worker.
+
+@include(GenerateResult doc)
+@include(generate_many doc)
+"""
+
+#@cstart(GenerateResult)
+class GenerateResult(object):
+    #@start(GenerateResult doc)
+    #GenerateResult
+    #==============
+    """
+    .. py:class:: GenerateResult(fname)
+
+       The result of generating the documentation of one file.
+
+       .. py:attribute:: fname
+
+          The path of the source file.
+
+       .. py:attribute:: text
+
+          The generated documentation or ``None`` if an error occurred.
+
+       .. py:attribute:: errors
+
+          A list of ``(line, description)`` tuples, as found in ``WebError.error_list``.
+
+       .. py:attribute:: exception
+
+          An unexpected exception raised while processing the file, or ``None``.
+
+       .. py:attribute:: messages
+
+          A list of ``(level, message)`` tuples of all messages logged while processing the file.
+
+       .. py:attribute:: dependencies
+
+          A set of the absolute paths of all files included by the source file.
+
+       .. py:attribute:: timings
+
+          A dictionary of durations in seconds. ``"total"`` is the time needed to process the file.
+
+       .. py:attribute:: ok
+
+          ``True`` if the documentation was generated.
+    """
+    #@indent 3
+    #@include(GenerateResult)
+    #@(GenerateResult doc)
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.text = None
+        self.errors = []
+        self.exception = None
+        self.messages = []
+        self.dependencies = set()
+        self.timings = {}
+
+    @property
+    def ok(self):
+        return self.text is not None
+
+    def __repr__(self):
+        return "<GenerateResult %s %s>" % (self.fname, "ok" if self.ok else "failed")
+
+#@(GenerateResult)
+
+#@cstart(_generate_result)
+def _generate_result(fname, tokens, show_warnings):
+#@start(_generate_result doc)
+    """
+.. py:method:: _generate_result(fname, tokens, show_warnings)
+
+   Runs :py:meth:`generate` and stores the outcome in a :py:class:`GenerateResult`.
+   All messages of the ``antiweb`` logger are captured in the result.
+    """
+#@include(_generate_result)
+#@(_generate_result doc)
+
+    result = GenerateResult(fname)
+
+    with _captured_log() as capture:
+        start = time.perf_counter()
+        try:
+            result.text = generate(fname, tokens, show_warnings, result.dependencies)
+        except WebError as e:
+            result.errors = e.error_list
+        except Exception as e:
+            result.exception = e
+        finally:
+            result.timings["total"] = time.perf_counter() - start
+
+    result.messages = capture.messages
+    return result
+
+#@(_generate_result)
+
+def _set_parse_cache(parse_cache):
+    parsecache._parse_cache = parse_cache
+
+def _worker_result(parse_cache, fname, tokens, show_warnings):
+    #the workers use the same parse cache as the calling process
+    _initialize_worker(_set_parse_cache, parse_cache)
+    return _generate_result(fname, tokens, show_warnings)
+
+#@cstart(generate_many)
+def generate_many(paths, tokens=None, jobs=1, show_warnings=False):
+#@start(generate_many doc)
+    """
+.. py:method:: generate_many(paths[, tokens[, jobs[, show_warnings]]])
+
+   Generates the documentation of many source files.
+
+   :param paths: A sequence of source file paths.
+   :param list tokens: A list of string tokens, used for @if directives.
+   :param integer jobs: The number of worker processes. ``1`` processes all files in the
+                        calling process, a value smaller than one uses all available cores.
+   :param bool show_warnings: Warnings are stored in the messages of the results.
+   :return: An iterator of :py:class:`GenerateResult` objects. Without workers the results are
+            yielded in the order of ``paths``, otherwise in the order in which they are completed.
+    """
+#@include(generate_many)
+#@(generate_many doc)
+
+    paths = list(paths)
+
+    if jobs == 1 or len(paths) < 2:
+        for fname in paths:
+            yield _generate_result(fname, tokens, show_warnings)
+
+        return
+
+    workers = min(_job_count(jobs), len(paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [ executor.submit(_worker_result, parsecache._parse_cache, fname, tokens, show_warnings)
+                    for fname in paths ]
+
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            #the caller stopped iterating: pending files need not be processed
+            for future in futures:
+                future.cancel()
+
+#@(generate_many)
@@ -0,0 +1,300 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from antiweb_lib.write import write, create_write_string
+from antiweb_lib.manifest import Manifest, manifest_path
+from antiweb_lib.scanner import check_file
+from antiweb_lib import parsecache, stats
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+######
+Build
+######
+
+This module processes all files found by the recursive (``-r``) option.
+The files are either written one after another or distributed to a pool
+of worker processes (``-j`` option). Incremental builds (``--incremental`` option)
+skip all files which did not change since the last build.
+
+@include(build doc)
+@include(_LogCapture doc)
+@include(_write_job doc)
+@include(_write_files doc)
+@include(_prefilter doc)
+"""
+
+#@cstart(_LogCapture)
+class _LogCapture(logging.Handler):
+    #@start(_LogCapture doc)
+    """
+.. py:class:: _LogCapture()
+
+   A logging handler which stores the formatted messages of the ``antiweb`` logger instead
+   of printing them. It is used by the worker processes, so that the parent process
+   can emit the messages in a deterministic order.
+    """
+    #@include(_LogCapture)
+    #@(_LogCapture doc)
+
+    def __init__(self):
+        super(_LogCapture, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, self.format(record)))
+
+#@(_LogCapture)
+
+@contextmanager
+def _captured_log():
+    #replaces the handlers of the antiweb logger by a _LogCapture
+    capture = _LogCapture()
+    handlers = logger.handlers[:]
+    propagate = logger.propagate
+
+    logger.handlers = [capture]
+    logger.propagate = False
+
+    try:
+        yield capture
+    finally:
+        logger.handlers = handlers
+        logger.propagate = propagate
+
+#True if the worker process was initialized
+_worker_initialized = False
+
+def _initialize_worker(initializer, *args):
+    #initializes a worker process with its first job: the initializer
+    #argument of ProcessPoolExecutor needs Python 3.7
+    global _worker_initialized
+
+    if not _worker_initialized:
+        _worker_initialized = True
+        initializer(*args)
+
+#@cstart(_write_job)
+def _write_job(directory, input_file, options):
+#@start(_write_job doc)
+    """
+.. py:method:: _write_job(directory, input_file, options)
+
+   Runs :py:meth:`write` inside a worker process. All log messages of the
+   ``antiweb`` logger are captured and returned to the parent process.
+
+   :param directory: The absolute path of the processed directory.
+   :param input_file: The absolute path of the file which should be processed.
+   :param options: Commandline options.
+   :return: A tuple ``(input_file, generated_file, dependencies, messages, file_stats)``.
+            ``file_stats`` contains the measured phases if the ``--stats``, ``--memory``
+            or ``--trace`` option is set.
+    """
+#@include(_write_job)
+#@(_write_job doc)
+
+    _initialize_worker(parsecache.configure, options)
+
+    dependencies = set()
+    trace = bool(getattr(options, "trace", None))
+    memory = bool(getattr(options, "memory", None))
+    recorder = stats.enable(trace=trace, memory=memory) \
+        if getattr(options, "stats", False) or trace else None
+
+    try:
+        with _captured_log() as capture:
+            out_file = write(directory, input_file, options, False, dependencies)
+    finally:
+        stats.disable()
+
+    file_stats = recorder.files if recorder else []
+    return input_file, out_file, dependencies, capture.messages, file_stats
+
+#@(_write_job)
+
+def _job_count(jobs):
+    #a value smaller than one uses all available cores
+    if not jobs or jobs < 1:
+        return os.cpu_count() or 1
+
+    return jobs
+
+#@cstart(_write_files)
+def _write_files(executor, directory, files, options):
+#@start(_write_files doc)
+    """
+.. py:method:: _write_files(executor, directory, files, options)
+
+   Writes the documentation files for a list of input files, either in the current process
+   or with the worker processes of ``executor``.
+
+   :param executor: A ``ProcessPoolExecutor`` or ``None``.
+   :param directory: The absolute path of the processed directory.
+   :param files: A list of absolute file paths.
+   :param options: Commandline options.
+   :return: An iterator of ``(input_file, generated_file, dependencies)`` tuples in the order of ``files``.
+    """
+#@include(_write_files)
+#@(_write_files doc)
+
+    if executor is None:
+        for input_file in files:
+            dependencies = set()
+            out_file = write(directory, input_file, options, dependencies=dependencies)
+            yield input_file, out_file, dependencies
+
+        return
+
+    #several files are sent to a worker at once to reduce the communication overhead
+    chunksize = max(1, len(files) // (_job_count(options.jobs) * 4))
+    directories = [directory] * len(files)
+    option_list = [options] * len(files)
+
+    #map returns the results in the order of the submitted files
+    results = executor.map(_write_job, directories, files, option_list, chunksize=chunksize)
+
+    recorder = stats.get_recorder()
+
+    for input_file, out_file, dependencies, messages, file_stats in results:
+        for level, message in messages:
+            logger.log(level, "%s", message)
+
+        if recorder:
+            recorder.add_files(file_stats)
+
+        print("\n" + create_write_string(input_file, out_file))
+        yield input_file, out_file, dependencies
+
+#@(_write_files)
+
+#@cstart(_prefilter)
+def _prefilter(files, options, skipped):
+#@start(_prefilter doc)
+    """
+.. py:method:: _prefilter(files, options, skipped)
+
+   Removes all files which cannot contain a document (see :py:func:`check_file`).
+
+   :param files: A list of absolute file paths.
+   :param options: Commandline options.
+   :param dict skipped: Counts the skipped files for each reason.
+   :return: The list of files which should be processed.
+    """
+#@include(_prefilter)
+#@(_prefilter doc)
+
+    max_size = int((getattr(options, "max_size", None) or 10) * 1024 * 1024)
+    result = []
+
+    for fname in files:
+        reason = check_file(fname, max_size)
+        if reason is None:
+            result.append(fname)
+        else:
+            logger.debug("skipped %s: %s", fname, reason)
+            skipped[reason] = skipped.get(reason, 0) + 1
+
+    return result
+
+#@(_prefilter)
+
+#@cstart(build)
+def build(directory, handled_files, options):
+#@start(build doc)
+    """
+.. py:method:: build(directory, handled_files, options)
+
+   Creates the documentation files for all handled files.
+
+   The files are processed in two passes: The source files are processed first, the
+   rst files afterwards. An rst file that has been created by the first pass is not
+   processed again.
+   If ``options.jobs`` is greater than one, each pass is distributed to a pool of
+   worker processes. The results and log messages are emitted in the order of
+   ``handled_files``, regardless of which worker finished first.
+   If ``options.incremental`` is set, files whose :py:class:`Manifest` entry is still
+   up to date and which do not include a changed file are skipped.
+   Files without a start directive, binary files and too large files are skipped before
+   they are read (see :py:func:`check_file`).
+
+   :param directory: The absolute path of the processed directory.
+   :param handled_files: A list of absolute file paths, source files before rst files.
+   :param options: Commandline options.
+   :return: A set containing the absolute paths of all created files.
+    """
+#@include(build)
+#@(build doc)
+
+    #used to store all created files: needed for daemon mode if source and output directory are the same
+    #or directory is a subdirectory of the source directory
+    created_files = set()
+
+    manifest = None
+    skipped = {}
+    up_to_date = {}
+    signatures = {}
+
+    if getattr(options, "incremental", False):
+        manifest = Manifest(manifest_path(directory, options))
+        manifest.retain(handled_files)
+        up_to_date, signatures = manifest.up_to_date_files(handled_files, options.token)
+
+    jobs = getattr(options, "jobs", 1)
+    executor = None
+
+    if jobs != 1:
+        executor = ProcessPoolExecutor(max_workers=_job_count(jobs))
+
+    #the worker processes cannot see the created files of each other,
+    #therefore the rst files are only processed after all source files were processed
+    rst_extension = ".rst"
+    sources = [ f for f in handled_files if not f.endswith(rst_extension) ]
+    rst_files = [ f for f in handled_files if f.endswith(rst_extension) ]
+
+    try:
+        for files in (sources, rst_files):
+            files = [ f for f in files if f not in created_files ]
+
+            #the documentation files of up to date files are still needed to skip created rst files
+            created_files.update(up_to_date[f] for f in files if f in up_to_date)
+            files = [ f for f in files if f not in up_to_date ]
+            files = _prefilter(files, options, skipped)
+
+            for input_file, out_file, dependencies in _write_files(executor, directory, files, options):
+                if out_file:
+                    created_files.add(out_file)
+
+                if manifest:
+                    manifest.update(input_file, signatures[input_file], out_file, dependencies)
+    finally:
+        if executor:
+            executor.shutdown()
+
+        if manifest:
+            manifest.save()
+
+    if manifest:
+        print("\n%i files are up to date" % len(up_to_date))
+
+    messages = (("no directives", "%i files without antiweb directives skipped"),
+                ("binary", "%i binary files skipped"),
+                ("too large", "%i files larger than the maximum size skipped"))
+
+    for reason, message in messages:
+        if skipped.get(reason):
+            print("\n" + message % skipped[reason])
+
+    return created_files
+
+#@(build)
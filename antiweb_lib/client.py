@@ -0,0 +1,128 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+#The client must start fast: it must not import pygments or any other antiweb module.
+import os
+import sys
+import json
+import socket
+from optparse import OptionParser
+
+#@start()
+"""
+.. _label-client:
+
+#######
+Client
+#######
+
+The client forwards the processing of a single file to a running antiweb server
+(see :ref:`Server <label-server>`). It accepts the same options as antiweb
+for a single file:
+
+::
+
+    python antiweb.py --serve /tmp/antiweb.sock &
+    python -m antiweb_lib.client --socket /tmp/antiweb.sock source.py -o docs -t token
+
+If antiweb is installed, the client can also be started with the ``antiweb-client`` command,
+e.g. ``antiweb-client --socket /tmp/antiweb.sock source.py``.
+Instead of the ``--socket`` option the environment variable ``ANTIWEB_SOCKET`` can be set.
+The client exits with ``0`` if the documentation file was generated, with ``1`` if the file
+could not be processed and with ``2`` if the server cannot be reached.
+
+@include(send_requests doc)
+"""
+
+socket_variable = "ANTIWEB_SOCKET"
+
+#@cstart(send_requests)
+def send_requests(socket_path, requests, timeout=None):
+#@start(send_requests doc)
+    """
+.. py:method:: send_requests(socket_path, requests[, timeout])
+
+   Sends requests to an antiweb server over a single connection.
+
+   :param string socket_path: The path of the socket file of the server.
+   :param requests: A sequence of request dictionaries.
+   :param timeout: The timeout of the socket operations in seconds, ``None`` to wait forever.
+   :return: A list of response dictionaries.
+   :raises OSError: If the server cannot be reached.
+    """
+#@include(send_requests)
+#@(send_requests doc)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+
+        with connection.makefile("rwb") as stream:
+            responses = []
+            for request in requests:
+                stream.write((json.dumps(request) + "\n").encode("utf-8"))
+                stream.flush()
+
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("connection closed by the antiweb server")
+
+                responses.append(json.loads(line.decode("utf-8")))
+
+    return responses
+
+#@(send_requests)
+
+def main(argv=None):
+    parser = OptionParser("usage: %prog [options] SOURCEFILE",
+                          description="Sends a source file to a running antiweb server.",
+                          version="%prog " + __version__)
+
+    parser.add_option("-s", "--socket", dest="socket", default=os.environ.get(socket_variable, ""),
+                      type="string", help="the socket file of the antiweb server "
+                                          "(default: environment variable %s)" % socket_variable)
+
+    parser.add_option("-o", "--output", dest="output", default="",
+                      type="string", help="the output filename")
+
+    parser.add_option("-t", "--token", dest="token", action="append",
+                      type="string", help="defines a token, usable by @if directives")
+
+    parser.add_option("-w", "--warnings", dest="warnings", default=True,
+                      action="store_false", help="suppresses warnings")
+
+    options, args = parser.parse_args(argv)
+
+    if len(args) != 1 or not options.socket:
+        parser.print_help()
+        return 2
+
+    #the server has another working directory
+    request = { "command" : "generate",
+                "file" : os.path.abspath(args[0]),
+                "output" : options.output and os.path.abspath(options.output),
+                "tokens" : options.token or [],
+                "warnings" : options.warnings }
+
+    try:
+        response, = send_requests(options.socket, [request])
+    except (OSError, ValueError) as e:
+        sys.stderr.write("antiweb server not available (%s): %s\n" % (options.socket, e))
+        return 2
+
+    for level, message in response.get("messages", []):
+        sys.stderr.write(message + "\n")
+
+    if "error" in response:
+        sys.stderr.write(response["error"] + "\n")
+    else:
+        print("\n" + response["message"])
+
+    return 0 if response.get("ok") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
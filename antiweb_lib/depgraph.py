@@ -0,0 +1,128 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+#@start()
+"""
+##################
+Dependency Graph
+##################
+
+A source file depends on all files it includes with a file argument of the include
+directive. The dependency graph stores these edges in reverse direction:
+for every included file it knows the source files that include it. If a file changes,
+all its transitive dependents have to be processed again.
+
+@include(DependencyGraph doc)
+"""
+
+#@cstart(DependencyGraph)
+class DependencyGraph(object):
+    #@start(DependencyGraph doc)
+    #DependencyGraph
+    #===============
+    """
+    .. py:class:: DependencyGraph([dependents])
+
+       A reverse dependency graph between absolute file paths.
+
+       :param dict dependents: A dictionary as returned by :py:meth:`to_dict`.
+    """
+    #@indent 3
+    #@include(DependencyGraph)
+    #@include(DependencyGraph.add doc)
+    #@include(DependencyGraph.remove doc)
+    #@include(DependencyGraph.files doc)
+    #@include(DependencyGraph.dependents doc)
+    #@include(DependencyGraph.to_dict doc)
+    #@(DependencyGraph doc)
+
+    def __init__(self, dependents=None):
+        #included file -> set of including files
+        self._dependents = {}
+        #including file -> set of included files
+        self._dependencies = {}
+
+        for fname, sources in (dependents or {}).items():
+            for source in sources:
+                self._add_edge(source, fname)
+
+    def _add_edge(self, source, fname):
+        self._dependents.setdefault(fname, set()).add(source)
+        self._dependencies.setdefault(source, set()).add(fname)
+
+    #@cstart(DependencyGraph.add)
+    def add(self, source, dependencies):
+        """
+        .. py:method:: add(source, dependencies)
+
+           Replaces the dependencies of a source file.
+
+           :param string source: The absolute path of the including file.
+           :param dependencies: A sequence of absolute paths of the included files.
+        """
+        self.remove(source)
+        for fname in dependencies:
+            if fname != source:
+                self._add_edge(source, fname)
+
+    #@cstart(DependencyGraph.remove)
+    def remove(self, source):
+        """
+        .. py:method:: remove(source)
+
+           Removes all dependencies of a source file.
+
+           :param string source: The absolute path of the including file.
+        """
+        for fname in self._dependencies.pop(source, ()):
+            sources = self._dependents[fname]
+            sources.discard(source)
+            if not sources:
+                del self._dependents[fname]
+
+    #@cstart(DependencyGraph.files)
+    def files(self):
+        """
+        .. py:method:: files()
+
+           :return: A set of all files, which are included by another file.
+        """
+        return set(self._dependents)
+
+    #@cstart(DependencyGraph.dependents)
+    def dependents(self, fnames):
+        """
+        .. py:method:: dependents(fnames)
+
+           Computes all files which directly or indirectly include one of ``fnames``.
+
+           :param fnames: A sequence of absolute file paths.
+           :return: A set of the absolute paths of the dependent files,
+                    ``fnames`` themselves are not contained unless they depend on each other.
+        """
+        result = set()
+        pending = list(fnames)
+
+        while pending:
+            for source in self._dependents.get(pending.pop(), ()):
+                if source not in result:
+                    result.add(source)
+                    pending.append(source)
+
+        return result
+
+    #@cstart(DependencyGraph.to_dict)
+    def to_dict(self):
+        """
+        .. py:method:: to_dict()
+
+           :return: A json serializable dictionary: included file -> sorted list of including files.
+        """
+        return { fname : sorted(sources)
+                 for fname, sources in self._dependents.items() }
+
+    #@(DependencyGraph.to_dict)
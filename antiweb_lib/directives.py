@@ -8,6 +8,9 @@ __email__ = "antiweb@freelists.org"
 import re
 import operator
 
+from antiweb_lib.subdoccache import shared_cache
+from antiweb_lib.stats import span
+
 #@start()
 """
 **********
@@ -20,6 +23,7 @@ Directives
 @include(RStart doc)
 @include(CStart doc)
 @include(End doc)
+@include(resolve_blocks doc)
 @include(Include doc)
 @include(RInclude doc)
 @include(Code doc)
@@ -29,6 +33,7 @@ Directives
 @include(Ignore doc)
 @include(Define doc)
 @include(Enifed doc)
+@include(pair_directives doc)
 @include(Subst doc)
 @include(Indent doc)
 """
@@ -245,9 +250,12 @@ class Start(NameDirective):
     #@indent 3
     #@include(Start)
     #@include(Start.has_named_end doc)
+    #@include(Start.end_line doc)
+    #@include(Start.end_directive doc)
     #@rinclude(Start.inherited attributes)
     #@include(Start.collect_block doc)
     #@include(Start.process doc)
+    #@include(Start._find_end doc)
     #@include(Start._find_matching_end doc)
     #@(Start doc)
     #Attributes
@@ -259,35 +267,78 @@ class Start(NameDirective):
        A boolean value, signalizing if the directive is
        ended by a named end directive.
     """
+    #@cstart(Start.end_line)
+    end_line = None
+    """
+    .. py:attribute:: end_line
+
+       The index of the line ending the text block within the document lines,
+       computed by :py:func:`resolve_blocks`. ``None`` if the block was not resolved.
+    """
+    #@cstart(Start.end_directive)
+    end_directive = None
+    """
+    .. py:attribute:: end_directive
+
+       The first directive of the line ending the text block, e.g. the paired end directive,
+       set by :py:func:`resolve_blocks`. ``None`` if the block ends at the end of the file
+       or at a line without directives.
+    """
     #@cstart(Start.inherited attributes)
     expression = re.compile(r"@start\((.*)\)")
     priority = 5
     #@
 
     #Methods
+    #@cstart(Start._find_end)
+    def _find_end(self, block, index):
+        """
+        .. py:method:: _find_end(block, index)
+
+           Finds the end of the text block within a compiled block. The lines of a
+           compiled block may differ from the document lines (e.g. removed by an ``@if``
+           directive), but the directive ending the block is the same object
+           (:py:attr:`end_directive`). Its line is looked up by
+           :py:meth:`ScheduledBlock.find_directive`. If the block ends at a line without
+           directives or the directive was removed, the end is searched by
+           :py:meth:`_find_matching_end`, which stops at the end: only the lines
+           of the block are scanned, which are removed anyway.
+
+           :param block: The :py:class:`ScheduledBlock` containing the start.
+           :param integer index: The index of the start line within ``block``.
+           :return: The index of the line ending the text block.
+        """
+        if self.end_directive is not None:
+            end = block.find_directive(self.end_directive)
+            if end is not None and end > index:
+                return end
+
+        return self._find_matching_end(block, index)
+
     #@cstart(Start._find_matching_end)
-    def _find_matching_end(self, block):
+    def _find_matching_end(self, block, index):
         """
-        .. py:method:: _find_matching_end(block)
+        .. py:method:: _find_matching_end(block, index)
 
-           Finds the matching end for the text block.
+           Finds the matching end for the text block by scanning the
+           following lines. The ends of the blocks in the document lines are
+           resolved in advance by :py:func:`resolve_blocks`.
 
-           :param list block: A list of lines beginning with start
-           :return: The line index of the found end.
+           :param list block: A list of lines containing the start.
+           :param integer index: The index of the start line within ``block``.
+           :return: The index of the line ending the text block.
         """
         if self.has_named_end:
             # ignore all other ending conditions and directly
             # find the matching end directive
-            for j, l in enumerate(block[1:]):
-                j += 1
-                d = l.directive
+            for j in range(index+1, len(block)):
+                d = block[j].directive
                 if isinstance(d, End) and d.name == self.name:
                     return j
 
-        start_indent = block[0].indent
-        for j, l in enumerate(block[1:]):
-            j += 1
-
+        start_indent = block[index].indent
+        for j in range(index+1, len(block)):
+            l = block[j]
             lindent = l.indent
             d = l.directive
 
@@ -322,8 +373,11 @@ class Start(NameDirective):
            See :py:meth:`Directive.collect_block`.
            The returned lines are unindented to column 0.
         """
-        end = self._find_matching_end(document.lines[index:])
-        block = document.lines[index+1:index+end]
+        end = self.end_line
+        if end is None:
+            end = self._find_matching_end(document.lines, index)
+
+        block = document.lines[index+1:end]
 
         reduce_block = list(filter(bool, block))
         if not reduce_block:
@@ -346,8 +400,8 @@ class Start(NameDirective):
            Removes all lines of the text block from
            the containing block.
         """
-        end = self._find_matching_end(block[index:])
-        del block[index:index+end]
+        end = self._find_end(block, index)
+        del block[index:end]
     #@
 
 #@cstart(RStart)
@@ -377,9 +431,9 @@ class RStart(Start):
     expression = re.compile(r"@rstart\((.*)\)")
 
     def process(self, document, block, index):
-        end = self._find_matching_end(block[index:])
+        end = self._find_end(block, index)
         line = block[index]
-        block[index:index+end] = [ line.like("<<%s>>" % self.name) ]
+        block[index:end] = [ line.like("<<%s>>" % self.name) ]
 
 
 #@cstart(CStart)
@@ -457,23 +511,104 @@ class End(NameDirective):
             self.name = mo.group(2)
 
 
-    def match(self, lines):
-        if self.name is None: return
-
-        #find the matching start and inform it for the named end
-        for l in reversed(lines[:self.line]):
-            for d in l.directives:
-                if isinstance(d, Start) and d.name == self.name:
-                    d.has_named_end = True
-                    self.start_line = d.line
-                    return
-
-
     def process(self, document, block, index):
         #completely remove the directive from the containing block
         del block[index]
 
 
+#@cstart(resolve_blocks)
+def resolve_blocks(lines):
+    #@start(resolve_blocks doc)
+    #resolve_blocks
+    #==============
+    """
+    .. py:function:: resolve_blocks(lines)
+
+       Finds the ends of all text blocks of a document in a single pass.
+       This function is called by :py:meth:`Reader._post_process`.
+
+       Every named end directive is paired with the nearest preceding
+       ``@start`` directive of the same name (:py:attr:`Start.has_named_end`).
+       The end of every text block is stored in :py:attr:`Start.end_line`, following
+       the same rules as :py:meth:`Start._find_matching_end`, and the first directive
+       of the ending line in :py:attr:`Start.end_directive`.
+
+       The blocks without an end are kept on a stack. As another ``@start`` directive
+       with the same or a smaller indentation ends a block, the indentation of the
+       blocks does not decrease from the bottom to the top of the stack. All blocks ended
+       by a line are therefore on top of the stack.
+
+       :param list lines: The :py:class:`Line` objects of a document.
+    """
+    #@indent 3
+    #@include(resolve_blocks)
+    #@(resolve_blocks doc)
+    ends = {}
+    named_ends = {}
+
+    #the blocks without an end: a list of (indentation, start)
+    open_blocks = []
+    #name -> the starts searching a named end
+    searching = {}
+    #name -> the start a named end is paired with
+    last_starts = {}
+
+    for j, l in enumerate(lines):
+        #pair the named ends with the preceding starts
+        for d in l.directives:
+            if isinstance(d, End) and d.name is not None:
+                start = last_starts.get(d.name)
+                if start is not None:
+                    start.has_named_end = True
+                    d.start_line = start.line
+
+        lindent = l.indent
+        d = l.directive
+
+        if isinstance(d, End):
+            for start in searching.pop(d.name, ()):
+                named_ends[start] = j
+
+        while open_blocks:
+            start_indent, start = open_blocks[-1]
+            if isinstance(d, End):
+                #case 4 and case 5
+                ended = ((d.name is None and lindent == start_indent)
+                         or d.start_line <= start.line)
+            else:
+                ended = False
+
+            #case 3 and case 2
+            ended = (ended or (isinstance(d, Start) and lindent == start_indent)
+                     or (lindent < start_indent and l))
+
+            if not ended:
+                break
+
+            ends[start] = j
+            open_blocks.pop()
+
+        for d in reversed(l.directives):
+            if isinstance(d, Start):
+                last_starts[d.name] = d
+
+        for d in l.directives:
+            if isinstance(d, Start):
+                open_blocks.append((lindent, d))
+                searching.setdefault(d.name, []).append(d)
+
+    #case 1: The end of the file
+    for start_indent, start in open_blocks:
+        ends[start] = len(lines)
+
+    for start, end in ends.items():
+        if start.has_named_end and start in named_ends:
+            end = named_ends[start]
+
+        start.end_line = end
+        start.end_directive = (lines[end].directive or None) if end < len(lines) else None
+
+
 #@cstart(Fi)
 class Fi(NameDirective):
     #@start(Fi doc)
@@ -528,13 +663,12 @@ class If(NameDirective):
     expression = re.compile(r"@if\((.+)\)")
     priority = 4
 
-    def process(self, document, block, index):
-        for j in range(index+1, len(block)):
-            d = block[j].directive
-            if isinstance(d, Fi) and d.name == self.name:
-                break
+    #the matching fi directive found by pair_directives (see Define.closing)
+    closing = None
 
-        else:
+    def process(self, document, block, index):
+        j = _find_closing(self, block, index, Fi, self.name)
+        if j is None:
             document.add_error(self.line, "No fi for if %s" % self.name)
             return
 
@@ -567,12 +701,29 @@ class Define(NameDirective):
     #@
     #@include(Define user)
     #@indent 3
+    #@include(Define.closing doc)
     #@include(Define)
     #@(Define doc)
 
     expression = re.compile(r"@define\((.+)\)")
     priority = 1
 
+    #@start(Define.closing doc)
+    """
+
+    .. py:attribute:: closing
+
+       The pairing of the directive found by :py:func:`pair_directives`
+       (:py:class:`If` has the same attribute):
+
+         * ``None`` if the directive was not paired. The closing directive is searched,
+           when the directive is processed.
+         * A tuple ``(offset, directive)`` of the closing directive and its
+           distance in lines.
+    """
+    #@
+    closing = None
+
     def process(self, document, block, index):
         args = self.name.split(",")
         name = args.pop(0).strip()
@@ -583,12 +734,8 @@ class Define(NameDirective):
             return
 
         #search for the matching @enifed
-        for j in range(index+1, len(block)):
-            d = block[j].directive
-            if isinstance(d, Enifed) and d.name == name:
-                break
-
-        else:
+        j = _find_closing(self, block, index, Enifed, name)
+        if j is None:
             document.add_error(self.line, "No enifed for define %s" % name)
             return
 
@@ -622,6 +769,94 @@ class Enifed(NameDirective):
     def process(self, document, block, index):
         del block[index]
 
+
+#@cstart(pair_directives)
+def pair_directives(lines):
+    #@start(pair_directives doc)
+    #pair_directives
+    #===============
+    """
+    .. py:function:: pair_directives(lines)
+
+       Pairs the ``@if`` and ``@define`` directives of a document with their
+       ``@fi`` and ``@enifed`` directives in a single pass and stores the pairs
+       in :py:attr:`Define.closing`. This function is called by
+       :py:meth:`Reader._post_process` after :py:func:`resolve_blocks`.
+
+       The pairs are only a shortcut: a directive is processed in a compiled
+       block, whose lines may differ from the document lines. Therefore the
+       closing directive is checked at its offset and searched, if it is not found there.
+       A missing closing directive is reported, when the directive is processed.
+       The lines of a nested text block are removed from the compiled block containing it,
+       so only directives of the same text block are paired.
+       When an ``@if`` is processed, all directives with a lower priority are already
+       removed from their lines. A line closes an ``@if``, if its first directive of at
+       least the same priority is a matching ``@fi``. If a ``@subst`` between the directives
+       may replace lines before the ``@if`` is processed, the pair is not stored.
+
+       :param list lines: The :py:class:`Line` objects of a document.
+    """
+    #@indent 3
+    #@include(pair_directives)
+    #@(pair_directives doc)
+    pairs = ((If, Fi), (Define, Enifed))
+
+    #(text block, closing class, name) -> a list of (directive, line index, substitutions)
+    pending = {}
+    #the number of lines with a subst directive
+    substitutions = 0
+    #the (end line, start line) of the text blocks containing the current line
+    blocks = []
+
+    for j, l in enumerate(lines):
+        while blocks and j >= blocks[-1][0]:
+            blocks.pop()
+
+        #the innermost text block of the line
+        block = blocks[-1][1] if blocks else None
+
+        if any(isinstance(d, Subst) for d in l.directives):
+            substitutions += 1
+
+        for opening_class, closing_class in pairs:
+            #the first directive, which is not processed before opening_class
+            d = next((d for d in l.directives if d.priority >= opening_class.priority), None)
+            if not isinstance(d, closing_class):
+                continue
+
+            for directive, i, count in pending.pop((block, closing_class, d.name), ()):
+                if count == substitutions or Subst.priority >= opening_class.priority:
+                    directive.closing = (j - i, d)
+
+        for d in l.directives:
+            if isinstance(d, If):
+                pending.setdefault((block, Fi, d.name), []).append((d, j, substitutions))
+
+            elif isinstance(d, Define):
+                args = d.name.split(",")
+                if len(args) == 1:
+                    pending.setdefault((block, Enifed, args[0].strip()), []).append((d, j, substitutions))
+
+            elif isinstance(d, Start) and d.end_line is not None:
+                blocks.append((d.end_line, j))
+
+
+def _find_closing(directive, block, index, closing_class, name):
+    #the index of the line closing an @if or @define directive or None
+    if directive.closing:
+        offset, closing = directive.closing
+        j = index + offset
+        if j < len(block) and block[j].directive is closing:
+            return j
+
+    for j in range(index+1, len(block)):
+        d = block[j].directive
+        if isinstance(d, closing_class) and d.name == name:
+            return j
+
+    return None
+
+
 #@cstart(Subst)
 class Subst(NameDirective):
     #@start(Subst doc)
@@ -723,11 +958,16 @@ class Include(NameDirective):
         if args:
             #a file name is given, fetch block from that file
             fname = args[0].strip()
-            subdoc = document.get_subdoc(fname)
-            if subdoc:
-                include = subdoc.get_compiled_block(name)
-            else:
-                include = None
+            with span("include", { "block" : name, "file" : fname }):
+                subdoc = document.get_subdoc(fname)
+                if not subdoc:
+                    include = None
+                elif name in subdoc.compiled_blocks:
+                    include = subdoc.blocks[name]
+                else:
+                    #sub documents are shared with documents processed by other threads
+                    with shared_cache.compile_lock:
+                        include = subdoc.get_compiled_block(name)
         else:
             include = document.get_compiled_block(name)
 
@@ -928,9 +1168,9 @@ class Indent(Directive):
 
 
     def process(self, document, block, index):
-        lines = [ l.clone().change_indent(self.indent)
-                  for l in block[index+1:] ]
-        block[index:] = lines
+        #the following lines are indented, when they are read (see ScheduledBlock.change_indent)
+        del block[index]
+        block.change_indent(index, self.indent)
 
 
 #@(Indent)
@@ -8,11 +8,14 @@ __email__ = "antiweb@freelists.org"
 import os
 import operator
 import logging
-import pygments.lexers as pm
 
-from antiweb_lib.readers.config import readers, comments
+from antiweb_lib.readers.config import create_reader
 
 from antiweb_lib.readers.Line import Line
+from antiweb_lib.parsecache import parse
+from antiweb_lib.stats import phase, get_recorder
+from antiweb_lib.subdoccache import shared_cache, subdoc_key
+from antiweb_lib.scheduler import ScheduledBlock
 
 from antiweb_lib.readers.Reader import Reader
 from antiweb_lib.readers.CReader import CReader
@@ -53,7 +56,7 @@ class Document(object):
     #========
 
     """
-    .. py:class:: Document(text, reader, fname, tokens)
+    .. py:class:: Document(text, reader, fname, tokens[, resolver])
 
        This is the mediator communicating with all other classes
        to generate rst output.
@@ -61,6 +64,8 @@ class Document(object):
        :param reader: An instance of :py:class:`Reader`.
        :param string fname: The file name of the source code.
        :param tokens: A sequence of tokens usable for the ``@if`` directive.
+       :param resolver: A callable returning the text of an included file,
+                        see :py:attr:`resolver`.
     """
 
     #@indent 3
@@ -70,14 +75,18 @@ class Document(object):
     #@include(Document.blocks_included doc)
     #@include(Document.compiled_blocks doc)
     #@include(Document.sub_documents doc)
+    #@include(Document.dependencies doc)
     #@include(Document.tokens doc)
     #@include(Document.macros doc)
     #@include(Document.fname doc)
+    #@include(Document.file_signature doc)
     #@include(Document.reader doc)
+    #@include(Document.resolver doc)
     #@include(Document.lines doc)
     #@include(Document.__init__ doc)
     #@include(Document.process doc)
     #@include(Document.get_subdoc doc)
+    #@include(Document.get_dependencies doc)
     #@include(Document.add_error doc)
     #@include(Document.check_errors doc)
     #@include(Document.collect_blocks doc)
@@ -123,6 +132,14 @@ class Document(object):
        A cache dictionary of sub documents, referenced by
        ``@include`` directives: Filename -> Document
     """
+    #@cstart(Document.dependencies)
+    dependencies = set()
+    """
+    .. py:attribute:: dependencies
+
+       A set containing the absolute paths of all files resolved
+       by ``@include`` directives of this document.
+    """
     #@cstart(Document.tokens)
     tokens = set()
     """
@@ -145,6 +162,14 @@ class Document(object):
 
        The file name of the document's source.
     """
+    #@cstart(Document.file_signature)
+    file_signature = None
+    """
+    .. py:attribute:: file_signature
+
+       The :py:func:`file_signature` of the source file, when the document was loaded
+       as a shared sub document, otherwise ``None``.
+    """
     #@cstart(Document.reader)
     reader = None
     """
@@ -152,6 +177,16 @@ class Document(object):
 
        The instance of a :py:class:`Reader` object.
     """
+    #@cstart(Document.resolver)
+    resolver = None
+    """
+    .. py:attribute:: resolver
+
+       A callable ``resolver(path)``, which returns the text of the file included with
+       the path or ``None`` if the file does not exist. The path is the included file name
+       joined to the directory of :py:attr:`fname`. The resolver is passed on to all
+       sub documents. If the resolver is ``None``, included files are read from disk.
+    """
     #@cstart(Document.lines)
     lines = []
     """
@@ -164,9 +199,9 @@ class Document(object):
 
     #Methods
     #@cstart(Document.__init__)
-    def __init__(self, text, reader, fname, tokens):
+    def __init__(self, text, reader, fname, tokens, resolver=None):
         """
-        .. py:method:: __init__(text, reader, fname, tokens)
+        .. py:method:: __init__(text, reader, fname, tokens[, resolver])
 
            The constructor.
         """
@@ -174,13 +209,18 @@ class Document(object):
         self.blocks = {}
         self.blocks_included = set()
         self.compiled_blocks = set()
+        #the blocks being compiled: name -> ScheduledBlock
+        self._compiling = {}
         self.sub_documents = {}
+        self.dependencies = set()
         self.tokens = set(tokens or [])
         self.macros = { "__file__" : os.path.split(fname)[-1],
                         "__codeprefix__" : "" }
         self.fname = fname
         self.reader = reader
-        self.lines = self.reader.process(fname, text)
+        self.resolver = resolver
+        with phase("lex"):
+            self.lines = parse(self.reader, fname, text)
 
 
     #@cstart(Document.process)
@@ -192,7 +232,8 @@ class Document(object):
             :param bool show_warnings: If ``True`` warnings are emitted.
             :return: A string representing the rst output.
         """
-        self.collect_blocks()
+        with phase("collect_blocks"):
+            self.collect_blocks()
 
         # check if there are any lines in the file and add the according error message
         if not self.lines:
@@ -203,7 +244,8 @@ class Document(object):
             self.check_errors()
 
         try:
-            text = self.get_compiled_block("")
+            with phase("compile"):
+                text = self.get_compiled_block("")
         finally:
             self.check_errors()
 
@@ -219,10 +261,11 @@ class Document(object):
                 for l, w in warnings:
                     logger.warning("  %s(line %i)", w, l)
             #@
-        text = self.reader.filter_output(text)
-        return_text = None
-        if text:
-             return_text = "\n".join(map(operator.attrgetter("text"), text))
+        with phase("filter"):
+            text = self.reader.filter_output(text)
+            return_text = None
+            if text:
+                 return_text = "\n".join(map(operator.attrgetter("text"), text))
         return return_text
     #@edoc
     #@rinclude(show warnings)
@@ -233,6 +276,8 @@ class Document(object):
         .. py:method:: get_subdoc(rpath)
 
            Tries to compile a document with the relative path rpath.
+           Sub documents are shared with all other documents of the build
+           (see :py:class:`SubDocumentCache`).
            :param string rpath: The relative path to the root
            containing document.
            :return: A :py:class:`Document` reference to the sub document.
@@ -256,9 +301,24 @@ class Document(object):
         head, tail = os.path.split(self.fname)
         fpath = os.path.join(head, rpath)
 
+        if self.resolver is not None:
+            return self._resolve_subdoc(rpath, os.path.normpath(fpath), insert_macros)
+
+        self.dependencies.add(os.path.abspath(fpath))
+
+        #@cstart(return from the shared cache if possible)
+        #sub documents without own macros get the macros of this document
+        macros = self.macros if "__macros__" in self.blocks else None
+        key = subdoc_key(fpath, self.tokens, macros)
+        doc = key and shared_cache.get(key)
+        if doc:
+            self.sub_documents[rpath] = doc
+            return doc
+        #@
+
         try:
             #print "try open", fpath
-            with open(fpath, "r") as f:
+            with phase("read"), open(fpath, "r") as f:
                 text = f.read()
         except IOError:
             doc = None
@@ -266,13 +326,17 @@ class Document(object):
 
         else:
             #parse the file
-            lexer = pm.get_lexer_for_filename(rpath)
-            single_comment_markers,  block_comment_markers = get_comment_markers(lexer.name)
-            reader = readers.get(lexer.name, Reader)(lexer, single_comment_markers,  block_comment_markers)
+            reader = create_reader(rpath)
 
-            doc = Document(text, reader, rpath, self.tokens)
-            doc.collect_blocks()
+            doc = Document(text, reader, fpath, self.tokens)
+            with phase("collect_blocks"):
+                doc.collect_blocks()
             insert_macros(doc)
+
+            if key:
+                #the key starts with the signature of the file
+                doc.file_signature = key[0]
+                shared_cache.put(key, doc)
         #@
 
         self.sub_documents[rpath] = doc
@@ -282,7 +346,57 @@ class Document(object):
     #@rinclude(return from cache if possible)
     #@rinclude(insert macros function)
     #@rinclude(read the source file)
+    #@rinclude(return from the shared cache if possible)
     #@(Document.get_subdoc)
+
+    def _resolve_subdoc(self, rpath, fpath, insert_macros):
+        #the included file is provided by the resolver: its text cannot be
+        #identified by a file stat, so it is not shared with other documents
+        self.dependencies.add(fpath)
+
+        try:
+            with phase("read"):
+                text = self.resolver(fpath)
+        except (IOError, OSError, LookupError):
+            text = None
+
+        doc = None
+        if text is None:
+            logger.error("Could not open: %s", fpath)
+        else:
+            doc = Document(text, create_reader(rpath), fpath, self.tokens, self.resolver)
+            with phase("collect_blocks"):
+                doc.collect_blocks()
+            insert_macros(doc)
+
+        self.sub_documents[rpath] = doc
+        return doc
+
+    #@cstart(Document.get_dependencies)
+    def get_dependencies(self):
+        """
+        .. py:method:: get_dependencies()
+
+           Collects the files resolved by this document and all of its
+           sub documents.
+           :return: A set of absolute file paths.
+        """
+        dependencies = set()
+        pending = [self]
+        visited = set()
+
+        while pending:
+            doc = pending.pop()
+            if id(doc) in visited:
+                continue
+
+            visited.add(id(doc))
+            dependencies.update(doc.dependencies)
+            pending.extend(filter(bool, doc.sub_documents.values()))
+
+        return dependencies
+
+
     #@cstart(Document.add_error)
     def add_error(self, line_number, text, fname=""):
         """
@@ -366,49 +480,27 @@ class Document(object):
            the compiled text block.
 
         """
-        #@cstart(find_next_directive)
-        def find_next_directive(block):
-            # returns the next available directive
-            min_line = [ (l.directives[0].priority, i)
-                         for i, l in enumerate(block) if l.directives ]
-            if not min_line:
-                return None
-
-            prio, index = min(min_line)
-            return block[index].directives.pop(0), index
-        #@(find_next_directive)
+        #the directives are only measured if the statistics are enabled
+        recorder = get_recorder()
+
+        #the directives are processed by their priority and their position
+        #(see the directive scheduler in scheduler.py).
+        #A block including itself is compiled further by the nested call.
+        scheduled = self._compiling.get(name)
+        if scheduled is None:
+            scheduled = self._compiling[name] = ScheduledBlock(block)
 
         while True:
-            directive_index = find_next_directive(block)
+            directive_index = scheduled.pop_directive()
             if not directive_index: break
             directive, index = directive_index
-            directive.process(self, block, index)
+            if recorder is None:
+                directive.process(self, scheduled, index)
+            else:
+                recorder.process_directive(self, directive, scheduled, index)
 
+        self._compiling.pop(name, None)
+        block[:] = scheduled
         self.compiled_blocks.add(name)
         return block
-    #@edoc
-    #@rinclude(find_next_directive)
     #@(Document.compile_block)
-
-#@cstart(get_comment_markers)
-
-def get_comment_markers(lexer_name):
-    #@start(get_comment_markers doc)
-    #From the map above the comment markers are retrieved via the following method:
-
-    """
-    ..  py:function:: get_comment_markers(lexer_name)
-
-        Retrieves the language specific comment markers from the comments map.
-        The comment markers of C serves as the default comment markers if the lexer name cannot be found.
-
-        :param string lexer_name: The name of the pygments lexer.
-        :return: The single and comment block markers defined by the language
-    """
-    #@indent 4
-    #@include(get_comment_markers)
-    #@(get_comment_markers doc)
-    comment_markers = comments.get(lexer_name, comments["C"])
-    single_comment_markers = comment_markers[0]
-    block_comment_markers = comment_markers[1]
-    return single_comment_markers,  block_comment_markers
@@ -0,0 +1,258 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import json
+import logging
+
+from antiweb_lib.depgraph import DependencyGraph
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+#########
+Manifest
+#########
+
+The manifest is used by incremental builds (``--incremental`` option). It is stored
+in the documentation directory and remembers for every processed source file
+its size, modification time, the used tokens, the antiweb version and the created
+documentation file. A source file whose manifest entry still matches is not processed again.
+Additionally the manifest stores the :py:class:`DependencyGraph` of the last build, so that a
+changed file invalidates all source files which include it.
+
+@include(Manifest doc)
+@include(manifest_path doc)
+"""
+
+#@cstart(Manifest)
+class Manifest(object):
+    #@start(Manifest doc)
+    #Manifest
+    #========
+    """
+    .. py:class:: Manifest(path)
+
+       The persisted state of an incremental build.
+
+       :param string path: The absolute path of the manifest file.
+    """
+    #@indent 3
+    #@include(Manifest)
+    #@include(Manifest.file_name doc)
+    #@include(Manifest.load doc)
+    #@include(Manifest.save doc)
+    #@include(Manifest.signature doc)
+    #@include(Manifest.up_to_date doc)
+    #@include(Manifest.up_to_date_files doc)
+    #@include(Manifest.update doc)
+    #@include(Manifest.retain doc)
+    #@(Manifest doc)
+
+    #@cstart(Manifest.file_name)
+    file_name = ".antiweb-manifest.json"
+    """
+    .. py:attribute:: file_name
+
+       The file name of the manifest within the documentation directory.
+    """
+    #@
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.graph = DependencyGraph()
+        #included file -> size and modification time
+        self.dependencies = {}
+        self.load()
+
+    #@cstart(Manifest.load)
+    def load(self):
+        """
+        .. py:method:: load()
+
+           Reads the manifest file. A missing or damaged file, or a file written by another
+           antiweb version results in an empty manifest.
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        if not isinstance(data, dict) or data.get("version") != __version__:
+            return
+
+        self.entries = data.get("files", {})
+        self.graph = DependencyGraph(data.get("dependents"))
+        self.dependencies = data.get("dependencies", {})
+
+    #@cstart(Manifest.save)
+    def save(self):
+        """
+        .. py:method:: save()
+
+           Writes the manifest file. The file is first written to a temporary file which
+           replaces the manifest afterwards, so an interrupted build cannot leave a damaged manifest.
+        """
+        included = self.graph.files()
+        self.dependencies = { k : v for k, v in self.dependencies.items() if k in included }
+
+        data = { "version" : __version__,
+                 "files" : self.entries,
+                 "dependents" : self.graph.to_dict(),
+                 "dependencies" : self.dependencies }
+        temp_path = self.path + ".tmp"
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "w") as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except (IOError, OSError) as e:
+            logger.error("Could not write manifest %s: %s", self.path, e)
+
+    #@cstart(Manifest.signature)
+    def signature(self, fname, tokens):
+        """
+        .. py:method:: signature(fname, tokens)
+
+           Computes the current signature of a source file.
+
+           :param string fname: The absolute path of the source file.
+           :param tokens: A sequence of tokens usable for the ``@if`` directive.
+           :return: A dictionary with the size, modification time, tokens and version, or
+                    ``None`` if the file cannot be accessed.
+        """
+        signature = self._stat(fname)
+        if signature:
+            signature["tokens"] = sorted(set(tokens or []))
+            signature["version"] = __version__
+
+        return signature
+
+    def _stat(self, fname):
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return None
+
+        return { "size" : stat.st_size, "mtime" : stat.st_mtime_ns }
+
+    #@cstart(Manifest.up_to_date)
+    def up_to_date(self, fname, signature):
+        """
+        .. py:method:: up_to_date(fname, signature)
+
+           Checks if a source file needs not to be processed again.
+
+           :param string fname: The absolute path of the source file.
+           :param signature: The current signature of the source file (see :py:meth:`signature`).
+           :return: The absolute path of the previously created documentation file if the
+                    entry still matches and the documentation file exists, ``None`` otherwise.
+        """
+        entry = self.entries.get(fname)
+        if not entry or not signature:
+            return None
+
+        for key, value in signature.items():
+            if entry.get(key) != value:
+                return None
+
+        output = entry.get("output")
+        if not output or not os.path.isfile(output):
+            return None
+
+        return output
+
+    #@cstart(Manifest.up_to_date_files)
+    def up_to_date_files(self, fnames, tokens):
+        """
+        .. py:method:: up_to_date_files(fnames, tokens)
+
+           Checks which source files need not to be processed again. A source file
+           has to be processed again if its own entry does not match, or if it directly
+           or indirectly includes a file that has changed since the last build.
+
+           :param fnames: A sequence of absolute source file paths.
+           :param tokens: A sequence of tokens usable for the ``@if`` directive.
+           :return: A tuple ``(outputs, signatures)``: ``outputs`` maps the up to date source files
+                    to their documentation files, ``signatures`` maps all source files to their
+                    current signature.
+        """
+        signatures = { f : self.signature(f, tokens) for f in fnames }
+        outputs = { f : self.up_to_date(f, signatures[f]) for f in fnames }
+
+        #the size and modification time of every included file was recorded by the last build
+        changed = set(f for f in self.graph.files()
+                      if self._stat(f) != self.dependencies.get(f))
+
+        invalid = self.graph.dependents(changed)
+        outputs = { f : output for f, output in outputs.items()
+                    if output and f not in invalid }
+
+        return outputs, signatures
+
+    #@cstart(Manifest.update)
+    def update(self, fname, signature, output, dependencies=()):
+        """
+        .. py:method:: update(fname, signature, output[, dependencies])
+
+           Records the result of processing a source file. If no documentation file was
+           created, the entry is removed, so the file will be processed again by the next build.
+
+           :param string fname: The absolute path of the source file.
+           :param signature: The signature of the source file before it was processed.
+           :param string output: The absolute path of the created documentation file or ``None``.
+           :param dependencies: The absolute paths of all files included by the source file.
+        """
+        if not output or not signature:
+            self.entries.pop(fname, None)
+            self.graph.remove(fname)
+            return
+
+        entry = dict(signature)
+        entry["output"] = output
+        self.entries[fname] = entry
+
+        self.graph.add(fname, dependencies)
+        for dependency in dependencies:
+            self.dependencies[dependency] = self._stat(dependency)
+
+    #@cstart(Manifest.retain)
+    def retain(self, fnames):
+        """
+        .. py:method:: retain(fnames)
+
+           Removes the entries of all source files which are not contained in ``fnames``
+           (e.g. deleted files).
+
+           :param fnames: A sequence of absolute source file paths.
+        """
+        fnames = set(fnames)
+
+        for fname in list(self.entries):
+            if fname not in fnames:
+                del self.entries[fname]
+                self.graph.remove(fname)
+
+    #@(Manifest.retain)
+
+#@cstart(manifest_path)
+def manifest_path(directory, options):
+    """
+.. py:method:: manifest_path(directory, options)
+
+   Returns the path of the manifest file: The manifest is stored in the documentation
+   directory given by the output option, or in the processed directory otherwise.
+
+   :param directory: The absolute path of the processed directory.
+   :param options: Commandline options.
+    """
+    return os.path.join(options.output or directory, Manifest.file_name)
+#@(manifest_path)
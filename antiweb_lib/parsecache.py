@@ -0,0 +1,300 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import stat
+import pickle
+import hashlib
+import logging
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+############
+Parse Cache
+############
+
+Lexing a source file with pygments in :py:meth:`Reader.process` is the most expensive step
+of the documentation generation. The parse cache stores the resulting list of
+:py:class:`Line` objects, together with their directives, in a cache directory
+(``--cache-dir`` option). The next time the same source text is read by the same reader,
+the lines are loaded from the cache instead of lexing the text again.
+
+The cache entries are unpickled when they are loaded, and unpickling data can execute
+arbitrary code. The cache directory must therefore not be writable by other users:
+do not use a shared directory like ``/tmp`` directly, but a directory of the user running
+antiweb, e.g. within the build directory. Before an entry is loaded, the cache checks
+that the cache directory and the entry are owned by the current user and are neither group
+nor world writable. Otherwise the entry is not loaded and a warning is logged.
+A new cache directory is created with access for the current user only.
+
+@include(ParseCache doc)
+@include(parse doc)
+@include(configure doc)
+"""
+
+#@cstart(ParseCache)
+class ParseCache(object):
+    #@start(ParseCache doc)
+    #ParseCache
+    #==========
+    """
+    .. py:class:: ParseCache(directory[, budget])
+
+       An on-disk cache of parsed source files. Each entry is a pickled list of
+       :py:class:`Line` objects, stored in its own file. The file name is a hash
+       of the source text, the reader class, the pygments lexer, the comment markers of
+       the reader and the antiweb version.
+
+       :param string directory: The cache directory.
+       :param integer budget: The maximum size of all cache files in bytes. If the budget
+                              is exceeded, the least recently used entries are removed.
+    """
+    #@indent 3
+    #@include(ParseCache)
+    #@include(ParseCache.key doc)
+    #@include(ParseCache.process doc)
+    #@include(ParseCache.evict doc)
+    #@(ParseCache doc)
+
+    suffix = ".lines"
+
+    def __init__(self, directory, budget=100*1024*1024):
+        self.directory = directory
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        #the size of all cache files, computed on the first store
+        self._size = None
+        #the untrusted paths, which were already reported
+        self._warned = set()
+
+    #@cstart(ParseCache.key)
+    def key(self, reader, text):
+        """
+        .. py:method:: key(reader, text)
+
+           :param reader: An instance of :py:class:`Reader`.
+           :param string text: The source code.
+           :return: The hash identifying the parsed lines.
+        """
+        reader_class = reader.__class__
+        h = hashlib.sha1()
+        h.update(text.encode("utf-8", "surrogatepass"))
+        h.update(("\0%s.%s\0%s\0%r\0%r\0%s" % (reader_class.__module__, reader_class.__name__,
+                                             reader.lexer.name,
+                                             reader.single_comment_markers,
+                                             reader.block_comment_markers,
+                                             __version__)).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    #@cstart(ParseCache.process)
+    def process(self, reader, fname, text):
+        """
+        .. py:method:: process(reader, fname, text)
+
+           Returns the same result as :py:meth:`Reader.process`, but loads the lines
+           from the cache if possible.
+
+           :param reader: An instance of :py:class:`Reader`.
+           :param string fname: The file name of the source code.
+           :param string text: The source code.
+           :return: A list of :py:class:`Line` objects.
+        """
+        key = self.key(reader, text)
+        lines = self._load(key)
+
+        if lines is None:
+            self.misses += 1
+            lines = reader.process(fname, text)
+            self._store(key, lines)
+
+        else:
+            self.hits += 1
+            #the same text may be cached for a different file
+            for l in lines:
+                l.fname = fname
+
+        return lines
+
+    def _trusted(self, path, st):
+        #only the current user may be able to change a file, which is unpickled
+        if not hasattr(os, "getuid"):
+            #e.g. Windows has no owner uids and permission bits
+            return True
+
+        if st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return True
+
+        if path not in self._warned:
+            self._warned.add(path)
+            logger.warning("Parse cache %s is not used: it must be owned by the current user "
+                           "and must not be writable by others", path)
+        return False
+
+    def _load(self, key):
+        path = self._path(key)
+
+        try:
+            if not self._trusted(self.directory, os.stat(self.directory)):
+                return None
+
+            #do not follow a symbolic link to a file of another user
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0))
+            with open(fd, "rb") as f:
+                if not self._trusted(path, os.fstat(f.fileno())):
+                    return None
+                data = f.read()
+        except (IOError, OSError):
+            #a missing file
+            return None
+
+        try:
+            lines = pickle.loads(data)
+        except Exception:
+            #a damaged file
+            self._remove(path)
+            return None
+
+        try:
+            #mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+
+        return lines
+
+    def _store(self, key, lines):
+        path = self._path(key)
+        temp_path = "%s.%i.tmp" % (path, os.getpid())
+
+        try:
+            data = pickle.dumps(lines, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug("Could not cache %s: %s", lines and lines[0].fname, e)
+            return
+
+        try:
+            os.makedirs(self.directory, 0o700, exist_ok=True)
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0),
+                         0o600)
+            with open(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning("Could not write parse cache %s: %s", path, e)
+            self._remove(temp_path)
+            return
+
+        if self._size is None:
+            self._size = sum(size for mtime, size, path in self._entries())
+        else:
+            self._size += len(data)
+
+        if self._size > self.budget:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(self.suffix):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            #a missing directory
+            pass
+
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    #@cstart(ParseCache.evict)
+    def evict(self):
+        """
+        .. py:method:: evict()
+
+           Removes the least recently used cache files, until the cache
+           uses at most 90% of its budget.
+        """
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        limit = self.budget * 0.9
+
+        for mtime, fsize, path in entries:
+            if size <= limit:
+                break
+
+            self._remove(path)
+            size -= fsize
+
+        self._size = size
+
+    #@(ParseCache.evict)
+
+#the parse cache used by all documents, None if caching is disabled
+_parse_cache = None
+
+#@cstart(parse)
+def parse(reader, fname, text):
+#@start(parse doc)
+    """
+.. py:method:: parse(reader, fname, text)
+
+   Parses a source file with :py:meth:`Reader.process`, using the configured
+   parse cache if there is one. This function is called by :py:class:`Document`.
+
+   :param reader: An instance of :py:class:`Reader`.
+   :param string fname: The file name of the source code.
+   :param string text: The source code.
+   :return: A list of :py:class:`Line` objects.
+    """
+#@include(parse)
+#@(parse doc)
+    if _parse_cache is None:
+        return reader.process(fname, text)
+
+    return _parse_cache.process(reader, fname, text)
+
+#@(parse)
+
+#@cstart(configure)
+def configure(options):
+#@start(configure doc)
+    """
+.. py:method:: configure(options)
+
+   Enables the parse cache if the ``--cache-dir`` option is given, or disables it otherwise.
+
+   :param options: Commandline options.
+   :return: The configured :py:class:`ParseCache` or ``None``.
+    """
+#@include(configure)
+#@(configure doc)
+    global _parse_cache
+
+    cache_dir = getattr(options, "cache_dir", None)
+    if not cache_dir:
+        _parse_cache = None
+        return None
+
+    cache_size = getattr(options, "cache_size", None) or 100
+    _parse_cache = ParseCache(os.path.abspath(cache_dir), int(cache_size * 1024 * 1024))
+    return _parse_cache
+
+#@(configure)
@@ -0,0 +1,226 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+.. _label-profiler:
+
+#########
+Profiler
+#########
+
+The ``--profile`` option runs the processing of a single file or of the whole ``-r`` run
+under a profiler. Parsing the commandline is not profiled. The files are processed in a single
+process, the ``-j`` option is ignored.
+
+After the run, the time spent in each code group is printed, followed by the functions of antiweb
+and pygments with the highest own time. The ``--profile-output`` option additionally writes
+the profile to a file:
+
+.. csv-table::
+   :header: "File Extension", "Format"
+
+   ``.folded`` or ``.collapsed``, "collapsed stacks, e.g. for flame graphs. The stacks are sampled every millisecond."
+   any other, "a pstats file of ``cProfile``, e.g. for ``python -m pstats`` or snakeviz"
+
+@include(code_groups doc)
+@include(Profiler doc)
+"""
+
+#@start(code_groups doc)
+#The functions are grouped by the path of their source file:
+
+#@code
+code_groups = (("antiweb", ("/antiweb_lib/", "/antiweb.py")),
+               ("pygments", ("/pygments/",)))
+
+#@edoc
+#All other functions (e.g. the standard library) belong to the group ``other``.
+#@(code_groups doc)
+
+collapsed_extensions = (".folded", ".collapsed")
+
+def code_group(filename):
+    path = filename.replace("\\", "/")
+
+    for group, patterns in code_groups:
+        for pattern in patterns:
+            #a directory can be anywhere in the path, a file must be at its end
+            if (pattern.endswith("/") and pattern in path) or path.endswith(pattern):
+                return group
+
+    return "other"
+
+class _StackSampler(threading.Thread):
+    #samples the stack of a thread and counts the collapsed stacks
+
+    def __init__(self, thread_id, interval=0.001):
+        super(_StackSampler, self).__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        #(file name, function name) of the innermost frame -> number of samples
+        self.functions = {}
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            if frame is not None:
+                leaf = (frame.f_code.co_filename, frame.f_code.co_name)
+                self.functions[leaf] = self.functions.get(leaf, 0) + 1
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+#@cstart(Profiler)
+class Profiler(object):
+    #@start(Profiler doc)
+    #Profiler
+    #========
+    """
+    .. py:class:: Profiler([output])
+
+       Profiles the code executed between :py:meth:`start` and :py:meth:`stop`.
+
+       :param string output: The file name of the written profile or ``None``.
+    """
+    #@indent 3
+    #@include(Profiler)
+    #@include(Profiler.report doc)
+    #@(Profiler doc)
+
+    def __init__(self, output=None):
+        self.output = output
+        self.collapsed = bool(output) and output.endswith(collapsed_extensions)
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        if self.collapsed:
+            self._sampler = _StackSampler(threading.get_ident())
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._sampler:
+            self._sampler.stop()
+        else:
+            self._profile.disable()
+
+    #@cstart(Profiler.report)
+    def report(self, limit=15):
+        """
+        .. py:method:: report([limit])
+
+           Creates the profile summary and writes the output file.
+
+           :param integer limit: The maximum number of functions listed for each group.
+           :return: The summary as a printable string.
+        """
+        if self._sampler:
+            text = self._collapsed_report(limit)
+        else:
+            text = self._pstats_report(limit)
+
+        if self.output:
+            try:
+                self._save()
+            except (IOError, OSError) as e:
+                logger.error("Could not write profile %s: %s", self.output, e)
+            else:
+                text += "\n\nprofile written to %s" % self.output
+
+        return text
+
+    #@(Profiler.report)
+
+    def _save(self):
+        if self._sampler:
+            with open(self.output, "w") as f:
+                for stack, count in sorted(self._sampler.stacks.items()):
+                    f.write("%s %i\n" % (stack, count))
+        else:
+            self._profile.dump_stats(self.output)
+
+    def _group_report(self, groups, functions, limit, unit):
+        total = sum(groups.values()) or 1
+        rows = [ "%-12s%12s%8s" % ("group", unit, "%") ]
+
+        for group in ("antiweb", "pygments", "other"):
+            value = groups.get(group, 0)
+            rows.append("%-12s%12s%7.1f%%" % (group, self._format(value, unit), 100.0 * value / total))
+
+        for group in ("antiweb", "pygments"):
+            listed = sorted(((value, name) for (g, name), value in functions.items() if g == group),
+                            reverse=True)[:limit]
+            if not listed:
+                continue
+
+            rows.append("")
+            rows.append("%s functions by own %s:" % (group, unit))
+            for value, name in listed:
+                rows.append("%12s  %s" % (self._format(value, unit), name))
+
+        return "\n".join(rows)
+
+    def _format(self, value, unit):
+        return "%.1f" % value if unit == "ms" else "%i" % value
+
+    def _pstats_report(self, limit):
+        groups = {}
+        functions = {}
+        stats = pstats.Stats(self._profile).stats
+
+        for (filename, line, name), (cc, nc, tt, ct, callers) in stats.items():
+            group = code_group(filename)
+            #the own time in milliseconds
+            tt *= 1000
+            groups[group] = groups.get(group, 0) + tt
+
+            key = (group, "%s (%s:%i)" % (name, os.path.basename(filename), line))
+            functions[key] = functions.get(key, 0) + tt
+
+        return self._group_report(groups, functions, limit, "ms")
+
+    def _collapsed_report(self, limit):
+        groups = {}
+        functions = {}
+
+        for (filename, name), count in self._sampler.functions.items():
+            group = code_group(filename)
+            groups[group] = groups.get(group, 0) + count
+
+            key = (group, "%s (%s)" % (name, os.path.basename(filename)))
+            functions[key] = functions.get(key, 0) + count
+
+        return self._group_report(groups, functions, limit, "samples")
+
+#@(Profiler)
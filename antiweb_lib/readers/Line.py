@@ -59,13 +59,6 @@ class Line(object):
     
        The integer line index of the directive within the current block.
     """
-    #@cstart(Line.text)
-    text = ""
-    """
-    .. py:attribute:: text
-    
-       A string containing the source line.
-    """
     #@cstart(Line.type)
     type = "d"
     """
@@ -88,7 +81,14 @@ class Line(object):
         """
         self.fname = fname
         self.index = index
-        self.text = text
+        #the source text shared by the clones of a line, the indentation of
+        #the source and the changes of the indentation (see Line.text).
+        #All lines get the same attributes in the same order,
+        #which keeps their instance dictionaries small.
+        self._source = text
+        self._source_indent = None
+        self._added = 0
+        self._removed = 0
         self.directives = directives
         self.type = type
 
@@ -125,8 +125,13 @@ class Line(object):
             for d in self.directives:
                 d.line = dline
 
-        return Line(self.fname, self.index, self.text,
-                    self.directives[:], self.type)
+        #the clone shares the source text and the changes of its indentation
+        line = Line(self.fname, self.index, self._source, (), self.type)
+        line._directives = self._directives[:]
+        line._source_indent = self._source_indent
+        line._added = self._added
+        line._removed = self._removed
+        return line
 
 
     #@cstart(Line.like)
@@ -153,14 +158,18 @@ class Line(object):
         """
         .. py:method:: change_indent(delta)
 
-           Changes the lines indentation.
+           Changes the lines indentation. The change is only recorded,
+           the text is changed when it is read (see :py:attr:`text`).
         """
         if delta < 0:
             delta = min(-delta, self.indent)
-            self.text = self.text[delta:]
+            #the added spaces are removed first, then the source's indentation
+            removed = max(delta - self._added, 0)
+            self._added -= delta - removed
+            self._removed += removed
 
         elif delta > 0:
-            self.text = " "*delta + self.text
+            self._added += delta
 
         return self
 
@@ -171,7 +180,8 @@ class Line(object):
 
            returns the length of the stripped :py:attr:`text`.
         """
-        return len(self.text.strip())
+        #the stripped text does not change with the indentation
+        return len(self._source.strip())
         
 
     #@cstart(Line.__repr__)
@@ -184,7 +194,49 @@ class Line(object):
         return "Line(%i, %s, %s)" % (self.index, self.text, str(self.directives))
     #@
 
+    def __getstate__(self):
+        #pickled with the built text (e.g. in the parse cache)
+        state = dict(self.__dict__)
+        for name in ("_source", "_source_indent", "_added", "_removed"):
+            state.pop(name, None)
+
+        state["text"] = self.text
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        text = state.pop("text", "")
+        self.__dict__.update(state)
+        self.text = text
+
     #Properties
+    #@cstart(Line.text)
+    @property
+    def text(self):
+        """
+        .. py:attribute:: text
+
+           A string containing the source line. A clone shares the source
+           text of its line and :py:meth:`change_indent` only records the change.
+           The text is built when it is read, e.g. for the output.
+        """
+        if self._added or self._removed:
+            self._source = " "*self._added + self._source[self._removed:]
+            if self._source_indent is not None:
+                self._source_indent += self._added - self._removed
+
+            self._added = self._removed = 0
+
+        return self._source
+
+
+    @text.setter
+    def text(self, value):
+        self._source = value
+        self._source_indent = None
+        self._added = self._removed = 0
+
+
     #@cstart(Line.indent)
     @property
     def indent(self):
@@ -193,7 +245,10 @@ class Line(object):
 
         An integer representing the line's indentation.
         """
-        return len(self.text)-len(self.text.lstrip())
+        if self._source_indent is None:
+            self._source_indent = len(self._source) - len(self._source.lstrip())
+
+        return self._source_indent + self._added - self._removed
 
 
     #@cstart(Line.sindent)
@@ -29,6 +29,9 @@ source parsing.
 @include(RstReader doc, RstReader.py)
 @include(XmlReader doc, XmlReader.py)
 @include(reader_dictionary doc, config.py)
+@include(language_cache doc, config.py)
+@include(get_language doc, config.py)
+@include(create_reader doc, config.py)
 """
 #@rstart(readers)
 #.. _readers:
@@ -163,6 +166,12 @@ class Reader(object):
             for d in l.directives:
                 d.match(self.lines)
 
+        #pair the named ends and find the ends of all text blocks
+        resolve_blocks(self.lines)
+
+        #pair the if and define directives with their closing directives
+        pair_directives(self.lines)
+
 
     #@cstart(Reader._handle_token)
     def _handle_token(self, index, token, value):
@@ -5,11 +5,17 @@ __version__ = "0.9.1"
 __maintainer__ = "antiweb team"
 __email__ = "antiweb@freelists.org"
 
+import os
+import re
+import fnmatch
+from collections import namedtuple
+
+import pygments.lexers as pm
+
 from antiweb_lib.readers.Reader import Reader
 from antiweb_lib.readers.CReader import CReader
 from antiweb_lib.readers.CSharpReader import CSharpReader
 from antiweb_lib.readers.ClojureReader import ClojureReader
-from antiweb_lib.readers.GenericReader import GenericReader
 from antiweb_lib.readers.RstReader import RstReader
 from antiweb_lib.readers.PythonReader import PythonReader
 from antiweb_lib.readers.XmlReader import XmlReader
@@ -65,3 +71,141 @@ comments = {
 "XML" : ([], (["<!--","-->"]))
 }
 #@
+
+#@cstart(get_comment_markers)
+
+def get_comment_markers(lexer_name):
+    #@start(get_comment_markers doc)
+    #From the map above the comment markers are retrieved via the following method:
+
+    """
+    ..  py:function:: get_comment_markers(lexer_name)
+
+        Retrieves the language specific comment markers from the comments map.
+        The comment markers of C serves as the default comment markers if the lexer name cannot be found.
+
+        :param string lexer_name: The name of the pygments lexer.
+        :return: The single and comment block markers defined by the language
+    """
+    #@indent 4
+    #@include(get_comment_markers)
+    #@(get_comment_markers doc)
+    comment_markers = comments.get(lexer_name, comments["C"])
+    single_comment_markers = comment_markers[0]
+    block_comment_markers = comment_markers[1]
+    return single_comment_markers,  block_comment_markers
+
+
+#@start(language_cache doc)
+#Language Resolution
+#===================
+'''
+The language of a file is resolved from its file name: the pygments lexer, the reader class
+and the comment markers. Searching the lexer in the pygments lexer registry matches the
+file name against the file name patterns of all lexers. Therefore the resolved languages are cached
+by file extension and the lexer instances are shared by all readers of a language.
+
+The lexer of a file extension or file name can be set explicitly in the override table.
+An override maps the extension (or the whole file name) to a pygments lexer alias and
+does not need to search the lexer registry at all:
+
+@code
+ ".ext" : "pygments alias",
+@edoc
+'''
+
+#@code
+lexer_overrides = {
+    ".py" : "python",
+    ".cs" : "csharp",
+    ".cpp" : "cpp",
+    ".cc" : "cpp",
+    ".rst" : "rst",
+    ".xml" : "xml"
+}
+#@
+
+Language = namedtuple("Language", "lexer reader_class single_comment_markers block_comment_markers")
+
+#the resolved languages by extension or file name
+_languages = {}
+_special_names = None
+
+def _get_special_names():
+    #Most pygments file name patterns have the form "*.ext" and depend only on the extension.
+    #Files which match one of the other patterns (e.g. "CMakeLists.txt") are cached by their name.
+    global _special_names
+
+    if _special_names is None:
+        simple = re.compile(r"\*\.[^.*?\[\]]+$")
+        patterns = [ p for lexer_info in pm.LEXERS.values() for p in lexer_info[3]
+                     if not simple.match(p) ]
+        _special_names = re.compile("|".join("(?:%s)" % fnmatch.translate(p) for p in patterns))
+
+    return _special_names
+
+#@cstart(get_language)
+def get_language(fname, alias=None):
+    #@start(get_language doc)
+    """
+    ..  py:function:: get_language(fname[, alias])
+
+        Resolves the language of a file. The result is cached.
+
+        :param string fname: The file name or path.
+        :param string alias: A pygments lexer alias (e.g. ``"python"``). If given, the
+                             language is resolved by the alias instead of the file name.
+        :return: A ``Language`` tuple ``(lexer, reader_class, single_comment_markers, block_comment_markers)``.
+        :raises pygments.util.ClassNotFound: If there is no lexer for the file name.
+    """
+    #@indent 4
+    #@include(get_language)
+    #@(get_language doc)
+    name = os.path.basename(fname)
+    extension = os.path.splitext(name)[1]
+
+    if alias:
+        key = (alias,)
+    elif name in lexer_overrides:
+        key = name
+    elif extension in lexer_overrides or (extension and not _get_special_names().match(name)):
+        key = extension
+    else:
+        key = name
+
+    try:
+        return _languages[key]
+    except KeyError:
+        pass
+
+    alias = alias or lexer_overrides.get(key)
+    lexer = pm.get_lexer_by_name(alias) if alias else pm.get_lexer_for_filename(name)
+
+    single_comment_markers, block_comment_markers = get_comment_markers(lexer.name)
+    language = Language(lexer, readers.get(lexer.name, Reader),
+                        single_comment_markers, block_comment_markers)
+
+    _languages[key] = language
+    return language
+
+#@cstart(create_reader)
+def create_reader(fname, alias=None):
+    #@start(create_reader doc)
+    """
+    ..  py:function:: create_reader(fname[, alias])
+
+        Creates a new reader for a file. Readers store the state of the processed file,
+        so each document gets its own reader, but the lexer is shared.
+
+        :param string fname: The file name or path.
+        :param string alias: A pygments lexer alias, see :py:func:`get_language`.
+        :return: An instance of :py:class:`Reader`.
+    """
+    #@indent 4
+    #@include(create_reader)
+    #@(create_reader doc)
+    language = get_language(fname, alias)
+    return language.reader_class(language.lexer, language.single_comment_markers,
+                                 language.block_comment_markers)
+
+#@(create_reader)
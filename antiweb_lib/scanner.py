@@ -0,0 +1,155 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import re
+import mmap
+import fnmatch
+
+#@start()
+"""
+########
+Scanner
+########
+
+The scanner finds all files processed by the recursive (``-r``) option.
+
+@include(ignored_directories doc)
+@include(scan doc)
+@include(check_file doc)
+"""
+
+#@start(ignored_directories doc)
+#Directories with the following names are never scanned. Additional files and
+#directories can be ignored with the ``--ignore`` option.
+
+#@code
+ignored_directories = frozenset([".git", ".hg", ".svn", "build", "node_modules", "__pycache__"])
+#@edoc
+#@(ignored_directories doc)
+
+def _is_ignored(name, relative_path, patterns):
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern):
+            return True
+
+    return False
+
+#@cstart(scan)
+def scan(directory, extensions, ignore=(), last_extension=".rst"):
+#@start(scan doc)
+    """
+.. py:function:: scan(directory, extensions[, ignore[, last_extension]])
+
+   Walks through the directory and all subdirectories and yields the absolute paths of all
+   files with one of the given extensions. Ignored directories are pruned, i.e. they are
+   not entered at all.
+
+   rst files are yielded after all other files: They might be a documentation file of a
+   file that is not yet processed.
+
+   :param string directory: The absolute path of the scanned directory.
+   :param tuple extensions: The handled file extensions.
+   :param ignore: A sequence of glob patterns. A file or directory is ignored if its name or its
+                  path relative to ``directory`` matches one of the patterns.
+   :param string last_extension: Files with this extension are yielded last.
+   :return: An iterator of absolute file paths.
+    """
+#@include(scan)
+#@(scan doc)
+
+    ignore = list(ignore or ())
+    last_files = []
+    #(absolute path, path relative to directory)
+    pending = [(directory, "")]
+
+    while pending:
+        current, relative_dir = pending.pop()
+
+        try:
+            #the iterator is exhausted by sorting, which closes it
+            entries = sorted(os.scandir(current), key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            name = entry.name
+            relative_path = os.path.join(relative_dir, name)
+
+            if entry.is_dir(follow_symlinks=False):
+                if name not in ignored_directories and \
+                   not (ignore and _is_ignored(name, relative_path, ignore)):
+                    subdirectories.append((entry.path, relative_path))
+
+            elif name.endswith(extensions) and entry.is_file() and \
+                 not (ignore and _is_ignored(name, relative_path, ignore)):
+                if name.endswith(last_extension):
+                    last_files.append(entry.path)
+                else:
+                    yield entry.path
+
+        #the subdirectories are visited in alphabetical order
+        pending.extend(reversed(subdirectories))
+
+    for fname in last_files:
+        yield fname
+
+#@(scan)
+
+#a document needs a main block, which is started by one of these directives
+re_main_block = re.compile(rb"@[cr]?start\(")
+
+#@cstart(check_file)
+def check_file(fname, max_size):
+#@start(check_file doc)
+    """
+.. py:function:: check_file(fname, max_size)
+
+   A fast check, which is done before a file is lexed: Only files which contain a
+   ``@subst(_at_)start(``, ``@subst(_at_)cstart(`` or ``@subst(_at_)rstart(`` string can
+   contain the main block of a document. The raw file content is searched for these
+   strings without decoding the file. Binary files and files larger than ``max_size`` are
+   not searched at all.
+
+   :param string fname: The absolute path of the file.
+   :param integer max_size: The maximum file size in bytes.
+   :return: ``None`` if the file should be processed, otherwise the reason why the file
+            is skipped: ``"no directives"``, ``"binary"`` or ``"too large"``.
+    """
+#@include(check_file)
+#@(check_file doc)
+
+    try:
+        with open(fname, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return "no directives"
+
+            if size > max_size:
+                return "too large"
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if m.find(b"\0", 0, 8192) >= 0:
+                    return "binary"
+
+                if not re_main_block.search(m):
+                    return "no directives"
+
+    except (IOError, OSError, ValueError):
+        #let the file be processed to report the error
+        return None
+
+    return None
+
+#@(check_file)
+
+"""
+@start(__macros__)
+@define(_at_, @)
+@end(__macros__)
+"""
@@ -0,0 +1,438 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+from heapq import heapify, heappush, heappop
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSequence
+
+#@start()
+"""
+.. _label-scheduler:
+
+####################
+Directive Scheduler
+####################
+
+:py:meth:`Document.compile_block` processes the directives of a block in the order of their
+priority. Directives with the same priority are processed from the top to the bottom of the
+block. Processing a directive changes the block: e.g. an ``@include`` replaces its line by the
+lines of the included block, which contain further directives.
+
+Searching the next directive in the whole block after each processed directive costs
+``O(D*N)`` for a block with ``D`` directives and ``N`` lines. Instead, the pending directives
+are kept in a heap ordered by ``(priority, position)``. As the indices of the lines change
+when lines are inserted or deleted, the position of a line is an *order key*: a tuple, whose
+order equals the order of the lines in the block.
+
+The keys of replaced lines are reused for the new lines. If more lines are
+inserted than replaced, the key of the last replaced line is extended for the remaining lines:
+``(5,)`` is replaced by ``(5, 0)``, ``(5, 1)``, ... which are all greater than the key of the
+previous line and smaller than the key of the next line, e.g. ``(6,)``. As no key of the block
+is a prefix of another key of the block, the extended keys cannot collide.
+
+A directive only changes its own line and the lines after it. Inserting or deleting lines
+in the middle of a python list moves all following lines, therefore the block is a *gap buffer*:
+the lines before the last changed position (the gap) are kept in one list, the lines after
+the gap in a second list, which starts at a head index. A change at the gap only moves the head,
+the free slots before the head take inserted lines. Moving the gap moves the lines in between
+from one list to the other. As the directives of a priority are processed from the top to the
+bottom, the gap moves over every line only a few times. The order keys are kept in two sorted
+lists parallel to the lines, which are changed at the gap only. The index of a key is found by
+a binary search.
+
+A heap entry ``(priority, key, count, directive)`` is outdated, if its key was removed or the
+first pending directive of the line with the key is another directive. Outdated entries are
+dropped, when they are taken from the heap. Therefore a directive, which replaces lines by lines
+with the same pending directives (e.g. by their clones), does not schedule them again: only the
+lines whose first pending directive changed are pushed.
+
+An ``@indent`` directive changes the indentation of all following lines. Cloning and
+indenting them for every ``@indent`` directive costs ``O(D*N)``, too. Instead the block
+records the change for all lines after the gap (see :py:meth:`ScheduledBlock.change_indent`).
+The change is applied to a line by :py:meth:`Line.change_indent` once, when the line is read or
+when the gap moves over it. The lines are shared with other blocks and are therefore cloned,
+when they are indented.
+The recorded changes are kept as the partial sums of their deltas. A line is changed by all
+deltas recorded after it was put behind the gap (its *epoch*).
+:py:meth:`Line.change_indent` never dedents a line below column 0, therefore the deltas
+are not simply summed up: a sequence of deltas with the sum ``s`` and the lowest partial
+sum ``m`` (at most 0) has the same effect as the two changes ``m`` and ``s - m``.
+The lowest partial sum after an epoch is found by a binary search in the stack
+of the partial sums, which are lower than all later partial sums.
+
+@include(ScheduledBlock doc)
+"""
+
+#@cstart(ScheduledBlock)
+class ScheduledBlock(MutableSequence):
+    #@start(ScheduledBlock doc)
+    #ScheduledBlock
+    #==============
+    """
+    .. py:class:: ScheduledBlock(lines)
+
+       A sequence of :py:class:`Line` objects, which is passed to the directives
+       by :py:meth:`Document.compile_block` instead of the block.
+       It supports the operations of a mutable sequence (indices, slices,
+       ``append``, ``insert``, ``pop``, ...).
+
+       The lines are returned with their pending indentation, if they are read by
+       an index, a slice or an iteration.
+
+       :param lines: The lines of the compiled block.
+
+    .. py:attribute:: inserted_lines
+                      removed_lines
+
+       The number of lines inserted into and removed from the block by
+       the directives. A replaced line counts as removed, its replacements as inserted.
+    """
+    #@indent 3
+    #@include(ScheduledBlock)
+    #@include(ScheduledBlock.pop_directive doc)
+    #@include(ScheduledBlock.find_directive doc)
+    #@include(ScheduledBlock.change_indent doc)
+    #@(ScheduledBlock doc)
+
+    def __init__(self, lines):
+        self.inserted_lines = 0
+        self.removed_lines = 0
+        self._count = 0
+        self._reset(list(lines))
+
+    def _reset(self, lines):
+        #the lines before the gap and their keys
+        self._before = []
+        self._before_keys = []
+        #the lines after the gap, their keys and epochs start at the head
+        self._after = lines
+        self._after_keys = [ (i,) for i in range(len(lines)) ]
+        self._epochs = [ 0 ] * len(lines)
+        self._head = 0
+        #the first element of the keys of appended lines
+        self._top = len(lines)
+        #the partial sums of the recorded indentation changes and the stack of the
+        #indices of the partial sums, which are lower than all later partial sums
+        self._sums = [ 0 ]
+        self._minima = [ 0 ]
+        #directive -> the key of the line it was scheduled for (see find_directive)
+        self._directive_keys = {}
+        self._heap = []
+
+        for key, line in zip(self._after_keys, lines):
+            if line.directives:
+                self._count += 1
+                directive = line.directives[0]
+                self._heap.append((directive.priority, key, self._count, directive))
+                self._directive_keys[directive] = key
+
+        heapify(self._heap)
+
+    def _push(self, key, line):
+        if line.directives:
+            self._count += 1
+            directive = line.directives[0]
+            heappush(self._heap, (directive.priority, key, self._count, directive))
+            self._directive_keys[directive] = key
+
+    def _index(self, key):
+        #the current index of the line with the key or None
+        keys = self._before_keys
+        if keys and key <= keys[-1]:
+            index = bisect_left(keys, key)
+            return index if keys[index] == key else None
+
+        keys = self._after_keys
+        slot = bisect_left(keys, key, self._head)
+        if slot < len(keys) and keys[slot] == key:
+            return len(self._before) + slot - self._head
+
+        return None
+
+    def _raw(self, index):
+        #the line at the index without its pending indentation
+        if index < len(self._before):
+            return self._before[index]
+
+        return self._after[self._head + index - len(self._before)]
+
+    def _indented(self, slot):
+        #applies the pending indentation to the line in the slot after the gap
+        line = self._after[slot]
+        epoch = self._epochs[slot]
+        last = len(self._sums) - 1
+        if epoch == last:
+            return line
+
+        sums = self._sums
+        lowest = min(sums[self._minima[bisect_right(self._minima, epoch)]] - sums[epoch], 0)
+        total = sums[last] - sums[epoch]
+        if lowest or total:
+            line = line.clone().change_indent(lowest).change_indent(total - lowest)
+            self._after[slot] = line
+
+        self._epochs[slot] = last
+        return line
+
+    def _reserve(self, count):
+        #makes room for count lines before the head
+        if self._head >= count:
+            return
+
+        #at least doubles the room, so the copies are amortized by the inserted lines
+        room = max(count - self._head, len(self._after) - self._head)
+        self._after[:0] = [ None ] * room
+        self._after_keys[:0] = [ None ] * room
+        self._epochs[:0] = [ 0 ] * room
+        self._head += room
+
+    def _move_gap(self, index):
+        before = self._before
+        head = self._head
+        shift = index - len(before)
+
+        if shift > 0:
+            #the lines before the gap have no pending indentation
+            last = len(self._sums) - 1
+            epochs = self._epochs
+            for slot in range(head, head + shift):
+                if epochs[slot] != last:
+                    self._indented(slot)
+
+            before.extend(self._after[head:head+shift])
+            self._before_keys.extend(self._after_keys[head:head+shift])
+            self._head = head + shift
+
+        elif shift < 0:
+            self._reserve(-shift)
+            head = self._head + shift
+            self._after[head:self._head] = before[shift:]
+            self._after_keys[head:self._head] = self._before_keys[shift:]
+            self._epochs[head:self._head] = [ len(self._sums) - 1 ] * -shift
+            del before[shift:]
+            del self._before_keys[shift:]
+            self._head = head
+
+    def _replace(self, start, stop, lines):
+        #replaces the lines start:stop by lines
+        self.removed_lines += stop - start
+        self.inserted_lines += len(lines)
+
+        if start == len(self):
+            #an insertion at the end: the gap is not moved
+            keys = [ (self._top + i,) for i in range(len(lines)) ]
+            self._top += len(lines)
+            self._after.extend(lines)
+            self._after_keys.extend(keys)
+            self._epochs.extend([ len(self._sums) - 1 ] * len(lines))
+            for key, line in zip(keys, lines):
+                self._push(key, line)
+            return
+
+        self._move_gap(start)
+        removed = stop - start
+        if not removed:
+            #an insertion before a line: the line gets a new key, too
+            removed, lines = 1, lines + [ self._indented(self._head) ]
+
+        if len(lines) > removed:
+            self._reserve(len(lines) - removed)
+
+        head = self._head
+        old_lines = self._after[head:head+removed]
+        keys = self._after_keys[head:head+removed]
+
+        if len(lines) <= removed:
+            #the new lines get the keys of the first or of the last replaced lines,
+            #whichever have the same pending directives (e.g. if the lines after
+            #a removed line are replaced by their clones)
+            offset = 0
+            first = next((i for i, line in enumerate(lines) if line.directives), None)
+            if first is not None and not _scheduled(old_lines[first], lines[first]) \
+                    and _scheduled(old_lines[first + removed - len(lines)], lines[first]):
+                offset = removed - len(lines)
+
+            keys = keys[offset:offset+len(lines)]
+            old_lines = old_lines[offset:offset+len(lines)]
+        else:
+            last = keys.pop()
+            keys.extend(last + (i,) for i in range(len(lines) - removed + 1))
+            old_lines.pop()
+
+        head += removed - len(lines)
+        self._after[head:head+len(lines)] = lines
+        self._after_keys[head:head+len(lines)] = keys
+        self._epochs[head:head+len(lines)] = [ len(self._sums) - 1 ] * len(lines)
+        self._head = head
+
+        for i, (key, line) in enumerate(zip(keys, lines)):
+            if line.directives and not (i < len(old_lines) and _scheduled(old_lines[i], line)):
+                self._push(key, line)
+
+    def _range(self, index):
+        #the replaced range or None for an extended slice
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return None
+            return start, max(start, stop)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return index, index + 1
+
+    def _change_all(self, change, removed, inserted):
+        #changes a list of all lines, e.g. for an extended slice
+        lines = list(self)
+        change(lines)
+        self.removed_lines += removed
+        self.inserted_lines += inserted
+        self._reset(lines)
+
+    def __len__(self):
+        return len(self._before) + len(self._after) - self._head
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ self[i] for i in range(*index.indices(len(self))) ]
+
+        start, stop = self._range(index)
+        if start < len(self._before):
+            return self._before[start]
+
+        return self._indented(self._head + start - len(self._before))
+
+    def __setitem__(self, index, value):
+        lines = list(value) if isinstance(index, slice) else [ value ]
+        replaced = self._range(index)
+        if replaced is None:
+            def change(all_lines):
+                all_lines[index] = lines
+            self._change_all(change, len(range(*index.indices(len(self)))), len(lines))
+        else:
+            self._replace(replaced[0], replaced[1], lines)
+
+    def __delitem__(self, index):
+        replaced = self._range(index)
+        if replaced is None:
+            def change(all_lines):
+                del all_lines[index]
+            self._change_all(change, len(range(*index.indices(len(self)))), 0)
+        else:
+            self._replace(replaced[0], replaced[1], [])
+
+    def __iter__(self):
+        for line in self._before:
+            yield line
+
+        for slot in range(self._head, len(self._after)):
+            yield self._indented(slot)
+
+    def insert(self, index, line):
+        length = len(self)
+        if index < 0:
+            index = max(index + length, 0)
+
+        index = min(index, length)
+        self._replace(index, index, [ line ])
+
+    def extend(self, lines):
+        self[len(self):] = lines
+
+    def clear(self):
+        del self[:]
+
+    def reverse(self):
+        self._change_all(list.reverse, len(self), len(self))
+
+    #@cstart(ScheduledBlock.pop_directive)
+    def pop_directive(self):
+        """
+        .. py:method:: pop_directive()
+
+           Removes the next directive to process from its line. The next directive
+           of the line is scheduled at once, i.e. a nested :py:meth:`Document.compile_block`
+           of the same block, which is called while the directive is processed,
+           processes it, too.
+
+           :return: A tuple ``(directive, index)`` or ``None`` if all directives were processed.
+        """
+        heap = self._heap
+        while heap:
+            priority, key, count, directive = heappop(heap)
+            index = self._index(key)
+            if index is None:
+                continue
+
+            line = self._raw(index)
+            if not line.directives or line.directives[0] is not directive:
+                continue
+
+            #the directive is removed from the indented line
+            line = self[index]
+            line.directives.pop(0)
+            self._push(key, line)
+            return directive, index
+
+        return None
+
+    #@cstart(ScheduledBlock.find_directive)
+    def find_directive(self, directive):
+        """
+        .. py:method:: find_directive(directive)
+
+           Finds a line by its next pending directive in ``O(log N)``.
+
+           :param directive: A :py:class:`Directive` object.
+           :return: The index of the line, whose first pending directive is ``directive``,
+                    or ``None`` if there is no such line.
+        """
+        key = self._directive_keys.get(directive)
+        index = None if key is None else self._index(key)
+        if index is None:
+            return None
+
+        line = self._raw(index)
+        if line.directives and line.directives[0] is directive:
+            return index
+
+        return None
+
+    #@cstart(ScheduledBlock.change_indent)
+    def change_indent(self, start, delta):
+        """
+        .. py:method:: change_indent(start, delta)
+
+           Changes the indentation of the lines from ``start`` to the end of the block
+           like :py:meth:`Line.change_indent`. The lines are cloned and indented,
+           when they are read from the block. Lines inserted later are not changed.
+
+           :param integer start: The index of the first line to change.
+           :param integer delta: The change of the indentation.
+        """
+        if start >= len(self):
+            return
+
+        self._move_gap(start)
+        sums = self._sums
+        sums.append(sums[-1] + delta)
+
+        minima = self._minima
+        while minima and sums[minima[-1]] >= sums[-1]:
+            minima.pop()
+        minima.append(len(sums) - 1)
+
+    #@(ScheduledBlock.change_indent)
+
+#@(ScheduledBlock)
+
+def _scheduled(old_line, line):
+    #True if the heap entry of old_line is valid for line at the same key
+    return bool(old_line.directives and line.directives
+                and old_line.directives[0] is line.directives[0])
@@ -0,0 +1,250 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import sys
+import copy
+import json
+import stat
+import errno
+import socket
+import logging
+import socketserver
+
+from antiweb_lib.write import write, create_write_string
+from antiweb_lib.build import _captured_log
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+.. _label-server:
+
+#######
+Server
+#######
+
+Starting antiweb imports pygments and creates the lexers, which takes much longer than
+processing a small file. If antiweb is called many times (e.g. by a build script),
+a server process (``--serve`` option) can process the files instead. The server keeps the
+cached languages, sub documents and the parse cache between the requests.
+The files are sent to the server by a thin client (see :ref:`Client <label-client>`).
+
+The server listens on a Unix domain socket. A request is a JSON object in a single line,
+the server answers every request with a JSON object in a single line.
+Several requests can be sent over the same connection. The requests are processed
+one after another.
+
+.. csv-table::
+   :header: "Request", "Response"
+
+   ``{"command": "generate", "file": "/src/x.py", "output": "/doc/x.rst", "tokens": ["a"], "warnings": true}``, ``{"ok": true, "output": "/doc/x.rst", "message": "Generated ...", "messages": [[30, "..."]]}``
+   ``{"command": "ping"}``, ``{"ok": true, "version": "0.9.1"}``
+   ``{"command": "shutdown"}``, ``{"ok": true}``
+
+The paths of a generate request must be absolute. ``output``, ``tokens`` and ``warnings`` are
+optional and have the same meaning as the commandline options ``-o``, ``-t`` and ``-w``.
+``messages`` contains the log level and the text of all messages logged while processing the file.
+An invalid request, or a file, whose processing raised an exception,
+is answered with ``{"ok": false, "error": "..."}``.
+With the ``--stats`` or ``--trace`` option the statistics of all requests are written
+when the server stops.
+
+@include(AntiwebServer doc)
+@include(serve doc)
+"""
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            request = {}
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+
+                response = self.server.process_request_data(request)
+            except ValueError as e:
+                response = { "ok" : False, "error" : str(e) }
+            except Exception as e:
+                #e.g. a request with a value of a wrong type
+                response = { "ok" : False, "error" : "%s: %s" % (e.__class__.__name__, e) }
+
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+            if request.get("command") == "shutdown":
+                return
+
+
+#@cstart(AntiwebServer)
+class AntiwebServer(socketserver.UnixStreamServer):
+    #@start(AntiwebServer doc)
+    #AntiwebServer
+    #=============
+    """
+    .. py:class:: AntiwebServer(socket_path, options)
+
+       A server processing antiweb requests on a Unix domain socket.
+       A socket file left by a stopped server is replaced. If a server is still listening
+       on the socket, or the path is not a socket, an :py:class:`OSError` is raised.
+
+       :param string socket_path: The path of the socket file.
+       :param options: Commandline options, used as default for all requests.
+    """
+    #@indent 3
+    #@include(AntiwebServer)
+    #@include(AntiwebServer.process_request_data doc)
+    #@(AntiwebServer doc)
+
+    def __init__(self, socket_path, options):
+        self.options = options
+        self.socket_path = socket_path
+        self.shutdown_requested = False
+        #the socket file is only removed, if it was created by the server
+        self._bound = False
+
+        self._remove_stale_socket()
+        super(AntiwebServer, self).__init__(socket_path, _RequestHandler)
+
+    def server_bind(self):
+        super(AntiwebServer, self).server_bind()
+        self._bound = True
+
+    def server_close(self):
+        super(AntiwebServer, self).server_close()
+        if not self._bound:
+            return
+
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    def _remove_stale_socket(self):
+        #removes a socket file left by a server that was not stopped correctly,
+        #raises an OSError if the path is used otherwise
+        socket_path = self.socket_path
+        try:
+            mode = os.lstat(socket_path).st_mode
+        except FileNotFoundError:
+            return
+
+        if not stat.S_ISSOCK(mode):
+            raise OSError(errno.EEXIST, "the path exists and is not a socket", socket_path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            #nobody listens on the socket
+            os.remove(socket_path)
+            return
+        finally:
+            probe.close()
+
+        raise OSError(errno.EADDRINUSE, "a server is already listening on the socket", socket_path)
+
+    #@cstart(AntiwebServer.process_request_data)
+    def process_request_data(self, request):
+        """
+        .. py:method:: process_request_data(request)
+
+           Processes a single request.
+
+           :param dict request: The decoded JSON request.
+           :return: The response as a dictionary.
+        """
+        command = request.get("command")
+
+        if command == "ping":
+            return { "ok" : True, "version" : __version__ }
+
+        if command == "shutdown":
+            self.shutdown_requested = True
+            return { "ok" : True }
+
+        if command == "generate":
+            return self._generate(request)
+
+        return { "ok" : False, "error" : "unknown command: %s" % command }
+
+    #@(AntiwebServer.process_request_data)
+
+    def _generate(self, request):
+        input_file = request.get("file")
+        output = request.get("output") or ""
+
+        if not input_file or not os.path.isabs(input_file) or (output and not os.path.isabs(output)):
+            return { "ok" : False, "error" : "file and output must be absolute paths" }
+
+        if not os.path.isfile(input_file):
+            return { "ok" : False, "error" : "file not found: %s" % input_file }
+
+        options = copy.copy(self.options)
+        options.output = output
+        options.token = request.get("tokens") or None
+        options.warnings = request.get("warnings", True)
+        options.recursive = False
+
+        with _captured_log() as capture:
+            try:
+                out_file = write(os.path.dirname(input_file), input_file, options, False)
+            except SystemExit:
+                #the documentation directory could not be created
+                out_file = None
+            except Exception as e:
+                #the server must keep running, e.g. if a reader fails on a file
+                return { "ok" : False,
+                         "error" : "%s: %s" % (e.__class__.__name__, e),
+                         "messages" : capture.messages }
+
+        return { "ok" : bool(out_file),
+                 "output" : out_file,
+                 "message" : create_write_string(input_file, out_file),
+                 "messages" : capture.messages }
+
+#@(AntiwebServer)
+
+#@cstart(serve)
+def serve(socket_path, options):
+#@start(serve doc)
+    """
+.. py:method:: serve(socket_path, options)
+
+   Processes requests until a shutdown request is received or the process is interrupted.
+
+   :param string socket_path: The path of the socket file.
+   :param options: Commandline options, used as default for all requests.
+    """
+#@include(serve)
+#@(serve doc)
+
+    try:
+        server = AntiwebServer(os.path.abspath(socket_path), options)
+    except OSError as e:
+        logger.error("\nError: The server could not be started: %s", e)
+        sys.exit(1)
+
+    print("\n------- antiweb server listening on %s -------" % server.socket_path)
+
+    try:
+        #each connection is handled completely before the next one is accepted
+        while not server.shutdown_requested:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    print("\n------- antiweb server stopped -------")
+
+#@(serve)
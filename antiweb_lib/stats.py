@@ -0,0 +1,727 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import json
+import time
+import logging
+import linecache
+import threading
+import tracemalloc
+from time import perf_counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    #not available on Windows
+    resource = None
+
+logger = logging.getLogger('antiweb')
+
+#@start()
+"""
+.. _label-stats:
+
+###########
+Statistics
+###########
+
+The ``--stats`` option measures how long each phase of the documentation generation takes,
+for every file and for the whole build. After the build a summary table is printed,
+the ``--stats-json`` option additionally writes all measurements to a JSON file.
+
+The following phases are measured:
+
+.. csv-table::
+   :header: "Phase", "Measured Code"
+
+   walk, the directory scan of the ``-r`` option
+   read, reading the source file and included files
+   lex, :py:meth:`Reader.process` (or loading the lines from the parse cache)
+   collect_blocks, :py:meth:`Document.collect_blocks`
+   compile, :py:meth:`Document.compile_block` and the directives
+   filter, :py:meth:`Reader.filter_output`
+   write, writing the documentation file
+
+The phases are nested, e.g. an included file is read and lexed while a block is compiled.
+The time of a nested phase is not contained in the time of the enclosing phase.
+
+The ``--trace`` option writes a trace of the build in the trace event format, which can be
+opened by trace viewers like ``chrome://tracing`` or Perfetto. The trace contains a span
+for every processed file, every phase and every loaded sub document. The spans are shown
+per process and thread, so idle workers and slow files are easily found.
+
+Additionally every processed directive is counted. For every directive class (e.g. ``Include``
+or ``Indent``) the number of processed directives, their time and the number of lines they
+cloned into or removed from the compiled block are reported. The time of a directive does not
+contain the time of directives processed inside it, e.g. the directives of an included block,
+but it contains the phases inside it, e.g. reading and lexing an included file.
+
+The ``--memory`` option (implies ``--stats``) traces the memory allocations of antiweb with
+``tracemalloc``. For every file the peak of the traced memory is measured relative to the memory
+at the start of the file, in total and for each phase. When a file is compiled, the code lines
+of antiweb allocating the most memory are recorded (e.g. cloning lines for an ``@include``).
+The summary contains the distribution of the peaks per file, the largest allocation sites and
+the maximum resident set size of the build process and of the largest worker process.
+A worker process needs about its resident set size plus the peak of the largest file, which
+gives the upper limit of the ``-j`` option for the available memory. The allocation sites in
+``parsecache.py`` and ``subdoccache.py`` show the memory held by the caches.
+The memory tracing slows down the processing, the durations are therefore not comparable
+to a build without ``--memory``. ``tracemalloc`` measures the whole process, if several threads
+process files at the same time, their allocations are mixed. Before Python 3.9 the peak of
+``tracemalloc`` cannot be reset: only a phase reaching a new peak of the process gets its exact
+peak, the peak of any other phase is approximated by the traced memory at its end.
+
+@include(phase doc)
+@include(span doc)
+@include(BuildStats doc)
+@include(enable doc)
+@include(write_trace doc)
+"""
+
+phases = ("walk", "read", "lex", "collect_blocks", "compile", "filter", "write")
+
+#the statistics of the current build, None if the statistics are disabled
+_recorder = None
+class _NoPhase(object):
+    #the context manager used if the statistics are disabled (contextlib.nullcontext needs Python 3.7)
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+_no_phase = _NoPhase()
+#the thread id of the trace events: the id of the operating system, if available (Python 3.8)
+_thread_id = getattr(threading, "get_native_id", threading.get_ident)
+
+class FileStats(object):
+    #the measurements of a single file, sent from worker processes to the build process
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.lines = 0
+        self.phases = {}
+        #directive class -> count, seconds, cloned and removed lines
+        self.directives = {}
+        #the trace events of the file
+        self.spans = []
+        #peak, phase peaks and allocation sites in bytes, if the memory is traced
+        self.memory = None
+        self.memory_base = 0
+
+    def to_dict(self):
+        result = { "file" : self.fname, "lines" : self.lines, "phases" : self.phases,
+                   "directives" : self.directives }
+        if self.memory is not None:
+            result["memory"] = self.memory
+
+        return result
+
+
+def _allocation_sites(limit):
+    #the lines of antiweb holding the most traced memory
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [ tracemalloc.Filter(True, "*%santiweb_lib%s*" % (os.sep, os.sep)),
+          tracemalloc.Filter(True, "*%santiweb.py" % os.sep),
+          #the measurements themselves
+          tracemalloc.Filter(False, __file__) ])
+
+    sites = []
+    for statistic in snapshot.statistics("lineno")[:limit]:
+        frame = statistic.traceback[0]
+        sites.append({ "site" : "%s:%i" % (os.path.basename(frame.filename), frame.lineno),
+                       "code" : linecache.getline(frame.filename, frame.lineno).strip(),
+                       "size" : statistic.size,
+                       "count" : statistic.count })
+
+    return sites
+
+def _mb(size):
+    return size / (1024.0 * 1024.0)
+
+def _percentile(values, percent):
+    #nearest rank percentile of a sorted list
+    if not values:
+        return 0.0
+
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+#@cstart(BuildStats)
+class BuildStats(object):
+    #@start(BuildStats doc)
+    #BuildStats
+    #==========
+    """
+    .. py:class:: BuildStats([trace[, memory]])
+
+       Collects the phase durations of a build. Every thread measures its own nested phases.
+
+       :param bool trace: If ``True``, a trace event is recorded for every file, phase and span.
+       :param bool memory: If ``True``, the memory allocations are traced (see :py:meth:`stop`).
+
+       .. py:attribute:: files
+
+          A list of the measurements of all processed files. Each file has the
+          attributes ``fname``, ``lines``, ``phases`` (a dictionary: phase -> seconds)
+          and ``directives`` (a dictionary: directive class -> ``count``, ``seconds``,
+          ``cloned`` and ``removed``).
+
+       .. py:attribute:: phases
+
+          A dictionary of phase durations not belonging to a file (e.g. ``walk``).
+
+       .. py:attribute:: directives
+
+          A dictionary of directive counters not belonging to a file.
+
+       .. py:attribute:: memory_phases
+
+          A dictionary of the memory peaks of phases not belonging to a file.
+
+       .. py:attribute:: directive_hooks
+
+          A list of callables, which are called after each processed directive with the
+          arguments ``(document, directive, seconds, cloned, removed)``. The hooks are only
+          called in the process of the recorder, not in the worker processes of the ``-j`` option.
+
+       .. py:attribute:: spans
+
+          A list of the trace events not belonging to a file.
+    """
+    #@indent 3
+    #@include(BuildStats)
+    #@include(BuildStats.file doc)
+    #@include(BuildStats.process_directive doc)
+    #@include(BuildStats.stop doc)
+    #@include(BuildStats.summary doc)
+    #@include(BuildStats.report doc)
+    #@(BuildStats doc)
+
+    #the number of allocation sites recorded for each file
+    allocation_limit = 10
+
+    def __init__(self, trace=False, memory=False):
+        self.files = []
+        self.phases = {}
+        self.spans = []
+        self.directives = {}
+        self.directive_hooks = []
+        self.memory_phases = {}
+        self.trace = trace
+        self.memory = memory
+        #tracemalloc is only stopped by the recorder which started it
+        self._tracing = memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+        #the peak of tracemalloc at the last phase change (before Python 3.9)
+        self._last_peak = 0
+        self.start = perf_counter()
+        #trace events of different processes need a common time base
+        self._wall_start = time.time()
+        self._local = threading.local()
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "stack"):
+            #a stack of [phase name, resume time, start time] and the current file
+            state.stack = []
+            state.file = None
+            #a stack of [own seconds, resume time] of the processed directives
+            state.directives = []
+
+        return state
+
+    def _add_span(self, state, name, category, start, end, args=None):
+        event = { "name" : name,
+                  "cat" : category,
+                  "ph" : "X",
+                  "ts" : (self._wall_start + start - self.start) * 1e6,
+                  "dur" : (end - start) * 1e6,
+                  "pid" : os.getpid(),
+                  "tid" : _thread_id() }
+        if args:
+            event["args"] = args
+
+        (state.file.spans if state.file is not None else self.spans).append(event)
+
+    def _memory_segment(self, state):
+        #the peak since the last phase change belongs to the running phase
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        else:
+            #the peak cannot be reset before Python 3.9: only a new peak
+            #of the process was reached within the segment
+            if peak > self._last_peak:
+                self._last_peak = peak
+            else:
+                peak = current
+
+        memory = state.file.memory if state.file is not None else None
+        peak -= state.file.memory_base if state.file is not None else 0
+
+        if memory is not None:
+            memory["peak"] = max(memory["peak"], peak)
+
+        if state.stack:
+            name = state.stack[-1][0]
+            target = memory["phases"] if memory is not None else self.memory_phases
+            target[name] = max(target.get(name, 0), peak)
+
+        return current
+
+    def _add(self, state, name, seconds):
+        target = state.file.phases if state.file is not None else self.phases
+        target[name] = target.get(name, 0.0) + seconds
+
+    def enter(self, name):
+        state = self._state()
+        if self.memory:
+            self._memory_segment(state)
+
+        now = perf_counter()
+
+        if state.stack:
+            #the enclosing phase is paused
+            parent = state.stack[-1]
+            self._add(state, parent[0], now - parent[1])
+
+        state.stack.append([name, now, now])
+
+    def exit(self):
+        state = self._state()
+        now = perf_counter()
+
+        if self.memory:
+            self._memory_segment(state)
+            if state.stack[-1][0] == "compile" and state.file is not None \
+                    and "compile" not in [ s[0] for s in state.stack[:-1] ]:
+                #the compiled blocks of the file are still alive
+                state.file.memory["allocations"] = _allocation_sites(self.allocation_limit)
+
+            #the time of the snapshot is not measured
+            now = perf_counter()
+
+        name, resumed, start = state.stack.pop()
+        self._add(state, name, now - resumed)
+
+        if self.trace:
+            self._add_span(state, name, "phase", start, now)
+
+        if state.stack:
+            state.stack[-1][1] = now
+
+    #@cstart(BuildStats.file)
+    @contextmanager
+    def file(self, fname):
+        """
+        .. py:method:: file(fname)
+
+           A context manager: all phases measured inside belong to the file ``fname``.
+        """
+        state = self._state()
+        if self.memory:
+            base = self._memory_segment(state)
+
+        previous, state.file = state.file, FileStats(fname)
+        if self.memory:
+            state.file.memory = { "peak" : 0, "phases" : {}, "allocations" : [] }
+            state.file.memory_base = base
+
+        start = perf_counter()
+
+        try:
+            yield state.file
+        finally:
+            if self.memory:
+                self._memory_segment(state)
+
+            if self.trace:
+                self._add_span(state, os.path.basename(fname), "file", start, perf_counter(),
+                               { "file" : fname, "lines" : state.file.lines })
+
+            self.files.append(state.file)
+            state.file = previous
+
+    #@(BuildStats.file)
+
+    #@cstart(BuildStats.process_directive)
+    def process_directive(self, document, directive, block, index):
+        """
+        .. py:method:: process_directive(document, directive, block, index)
+
+           Processes a directive of a compiled block and measures it.
+           Called by :py:meth:`Document.compile_block` if the statistics are enabled.
+           The cloned and removed lines are counted by the :py:class:`ScheduledBlock`.
+        """
+        state = self._state()
+        inserted, removed = block.inserted_lines, block.removed_lines
+        start = now = perf_counter()
+
+        if state.directives:
+            parent = state.directives[-1]
+            parent[0] += now - parent[1]
+
+        entry = [0.0, now]
+        state.directives.append(entry)
+
+        try:
+            directive.process(document, block, index)
+        finally:
+            now = perf_counter()
+            state.directives.pop()
+            if state.directives:
+                state.directives[-1][1] = now
+
+        seconds = entry[0] + now - entry[1]
+        cloned = block.inserted_lines - inserted
+        removed = block.removed_lines - removed
+
+        name = directive.__class__.__name__
+        target = state.file.directives if state.file is not None else self.directives
+        counter = target.get(name)
+        if counter is None:
+            counter = target[name] = { "count" : 0, "seconds" : 0.0, "cloned" : 0, "removed" : 0 }
+
+        counter["count"] += 1
+        counter["seconds"] += seconds
+        counter["cloned"] += cloned
+        counter["removed"] += removed
+
+        if self.trace:
+            self._add_span(state, name, "directive", start, now,
+                           { "file" : document.fname, "line" : directive.line })
+
+        for hook in self.directive_hooks:
+            hook(document, directive, seconds, cloned, removed)
+
+    #@(BuildStats.process_directive)
+
+    @contextmanager
+    def span(self, name, args=None):
+        #a trace event, which is not measured as a phase
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._add_span(self._state(), name, "span", start, perf_counter(), args)
+
+    def count_lines(self, lines):
+        state = self._state()
+        if state.file is not None:
+            state.file.lines += lines
+
+    def add_files(self, files):
+        #measurements of worker processes
+        self.files.extend(files)
+
+    #@cstart(BuildStats.stop)
+    def stop(self):
+        """
+        .. py:method:: stop()
+
+           Stops tracing the memory allocations, if this recorder started the tracing.
+           Called by :py:meth:`disable`.
+        """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+        self.memory = False
+
+    #@(BuildStats.stop)
+
+    #@cstart(BuildStats.summary)
+    def summary(self):
+        """
+        .. py:method:: summary()
+
+           :return: A json serializable dictionary with the aggregated durations of every phase
+                    (``total``, ``p50``, ``p95`` and ``max`` in seconds), the aggregated counters
+                    of every directive class (``count``, ``seconds``, ``max`` seconds of a file,
+                    ``cloned`` and ``removed``), the throughput and the measurements of all files.
+                    If the memory was traced, ``memory`` contains the distribution of the file
+                    peaks (``p50``, ``p95`` and ``max`` in bytes), the largest peak of every phase,
+                    the largest allocation sites of all files and the maximum resident set size
+                    (``max_rss`` and ``max_worker_rss`` in bytes, if available).
+        """
+        wall = perf_counter() - self.start
+        line_count = sum(f.lines for f in self.files)
+
+        summary = {}
+        for name in phases:
+            values = [ f.phases[name] for f in self.files if name in f.phases ]
+            if name in self.phases:
+                values.append(self.phases[name])
+
+            values.sort()
+            total = sum(values)
+
+            summary[name] = { "total" : total,
+                              "p50" : _percentile(values, 50),
+                              "p95" : _percentile(values, 95),
+                              "max" : values[-1] if values else 0.0 }
+
+        directives = {}
+        for counters in [ f.directives for f in self.files ] + [ self.directives ]:
+            for name, counter in counters.items():
+                total = directives.setdefault(name, { "count" : 0, "seconds" : 0.0, "max" : 0.0,
+                                                      "cloned" : 0, "removed" : 0 })
+                for key in ("count", "seconds", "cloned", "removed"):
+                    total[key] += counter[key]
+
+                total["max"] = max(total["max"], counter["seconds"])
+
+        result = { "wall" : wall,
+                   "files" : len(self.files),
+                   "lines" : line_count,
+                   "files_per_second" : len(self.files) / wall if wall else 0.0,
+                   "lines_per_second" : line_count / wall if wall else 0.0,
+                   "phases" : summary,
+                   "directives" : directives,
+                   "file_stats" : [ f.to_dict() for f in self.files ] }
+
+        memory_files = [ f.memory for f in self.files if f.memory is not None ]
+        if memory_files or self.memory_phases:
+            result["memory"] = self._memory_summary(memory_files)
+
+        return result
+
+    def _memory_summary(self, memory_files):
+        peaks = sorted(m["peak"] for m in memory_files)
+
+        memory_phases = dict(self.memory_phases)
+        #the largest size of every allocation site over all files
+        sites = {}
+        for memory in memory_files:
+            for name, peak in memory["phases"].items():
+                memory_phases[name] = max(memory_phases.get(name, 0), peak)
+
+            for site in memory["allocations"]:
+                known = sites.get(site["site"])
+                if known is None or known["size"] < site["size"]:
+                    sites[site["site"]] = site
+
+        summary = { "p50" : _percentile(peaks, 50),
+                    "p95" : _percentile(peaks, 95),
+                    "max" : peaks[-1] if peaks else 0,
+                    "phases" : memory_phases,
+                    "allocations" : sorted(sites.values(), key=lambda s: -s["size"])
+                                          [:self.allocation_limit] }
+
+        if resource is not None:
+            #ru_maxrss is given in kilobytes on Linux
+            summary["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            summary["max_worker_rss"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+        return summary
+
+    #@cstart(BuildStats.report)
+    def report(self, summary=None):
+        """
+        .. py:method:: report([summary])
+
+           :param summary: A dictionary returned by :py:meth:`summary`.
+           :return: The summary as a printable table, the durations are given in milliseconds.
+                    The directive classes are sorted by their total time.
+        """
+        summary = summary or self.summary()
+        rows = ["%-16s%12s%12s%12s%12s" % ("phase", "total", "p50", "p95", "max")]
+
+        for name in phases:
+            values = summary["phases"][name]
+            rows.append("%-16s%12.1f%12.3f%12.3f%12.3f"
+                        % (name, values["total"] * 1000, values["p50"] * 1000,
+                           values["p95"] * 1000, values["max"] * 1000))
+
+        directives = summary.get("directives")
+        if directives:
+            rows.append("")
+            rows.append("%-16s%12s%12s%12s%12s%12s"
+                        % ("directive", "count", "total", "max", "cloned", "removed"))
+
+            for name, values in sorted(directives.items(), key=lambda i: -i[1]["seconds"]):
+                rows.append("%-16s%12i%12.1f%12.3f%12i%12i"
+                            % (name, values["count"], values["seconds"] * 1000,
+                               values["max"] * 1000, values["cloned"], values["removed"]))
+
+        memory = summary.get("memory")
+        if memory:
+            rows.append("")
+            rows.append("memory peak per file: p50 %.2f MB, p95 %.2f MB, max %.2f MB"
+                        % (_mb(memory["p50"]), _mb(memory["p95"]), _mb(memory["max"])))
+            rows.append("memory peak per phase: "
+                        + ", ".join("%s %.2f MB" % (name, _mb(memory["phases"][name]))
+                                    for name in phases if name in memory["phases"]))
+
+            if "max_rss" in memory:
+                rows.append("max resident set size: %.1f MB, largest worker %.1f MB"
+                            % (_mb(memory["max_rss"]), _mb(memory["max_worker_rss"])))
+
+            if memory["allocations"]:
+                rows.append("")
+                rows.append("%-28s%12s%10s  %s" % ("allocation site", "KB", "blocks", "code"))
+                for site in memory["allocations"]:
+                    rows.append("%-28s%12.1f%10i  %s" % (site["site"], site["size"] / 1024.0,
+                                                         site["count"], site["code"]))
+
+        rows.append("")
+        rows.append("%i files, %i lines in %.3f s: %.1f files/s, %.0f lines/s"
+                    % (summary["files"], summary["lines"], summary["wall"],
+                       summary["files_per_second"], summary["lines_per_second"]))
+
+        return "\n".join(rows)
+
+    #@(BuildStats.report)
+
+#@(BuildStats)
+
+#@cstart(phase)
+def phase(name):
+#@start(phase doc)
+    """
+.. py:method:: phase(name)
+
+   Returns a context manager which measures a phase. If the statistics are disabled,
+   the context manager does nothing.
+
+   :param string name: One of the phase names.
+    """
+#@include(phase)
+#@(phase doc)
+
+    recorder = _recorder
+    if recorder is None:
+        return _no_phase
+
+    return _measure(recorder, name)
+
+@contextmanager
+def _measure(recorder, name):
+    recorder.enter(name)
+    try:
+        yield
+    finally:
+        recorder.exit()
+
+#@(phase)
+
+#@cstart(span)
+def span(name, args=None):
+#@start(span doc)
+    """
+.. py:method:: span(name[, args])
+
+   Returns a context manager which records a trace event, e.g. for loading a sub document.
+   If tracing is disabled, the context manager does nothing.
+
+   :param string name: The name of the event.
+   :param dict args: Additional json serializable values shown by the trace viewer.
+    """
+#@include(span)
+#@(span doc)
+
+    recorder = _recorder
+    if recorder is None or not recorder.trace:
+        return _no_phase
+
+    return recorder.span(name, args)
+
+#@(span)
+
+def count_lines(lines):
+    #adds the lines of a processed document to the current file
+    if _recorder is not None:
+        _recorder.count_lines(lines)
+
+def file(fname):
+    #the measurements inside the context belong to fname
+    if _recorder is None:
+        return _no_phase
+
+    return _recorder.file(fname)
+
+def get_recorder():
+    return _recorder
+
+#@cstart(enable)
+def enable(recorder=None, trace=False, memory=False):
+#@start(enable doc)
+    """
+.. py:method:: enable([recorder[, trace[, memory]]])
+
+   Enables the statistics.
+
+   :param recorder: The :py:class:`BuildStats` used to collect the measurements. ``None``
+                    creates a new one.
+   :param bool trace: If a new :py:class:`BuildStats` is created: record trace events.
+   :param bool memory: If a new :py:class:`BuildStats` is created: trace the memory allocations.
+   :return: The enabled :py:class:`BuildStats`.
+    """
+#@include(enable)
+#@(enable doc)
+
+    global _recorder
+    _recorder = recorder or BuildStats(trace, memory)
+    return _recorder
+
+#@(enable)
+
+def disable():
+    global _recorder
+    if _recorder is not None:
+        _recorder.stop()
+
+    _recorder = None
+
+def write_report(recorder, json_file=None):
+    #prints the summary table and writes the JSON file
+    summary = recorder.summary()
+    print("\n" + recorder.report(summary))
+
+    if json_file:
+        try:
+            with open(json_file, "w") as f:
+                json.dump(summary, f, indent=2, sort_keys=True)
+        except (IOError, OSError) as e:
+            logger.error("Could not write statistics %s: %s", json_file, e)
+
+#@cstart(write_trace)
+def write_trace(recorder, trace_file):
+#@start(write_trace doc)
+    """
+.. py:method:: write_trace(recorder, trace_file)
+
+   Writes all trace events of a build in the JSON trace event format.
+
+   :param recorder: The :py:class:`BuildStats` of the build.
+   :param string trace_file: The file name of the trace.
+    """
+#@include(write_trace)
+#@(write_trace doc)
+
+    events = list(recorder.spans)
+    for file_stats in recorder.files:
+        events.extend(file_stats.spans)
+
+    #the processes are named in the trace viewer
+    main_pid = os.getpid()
+    for pid in sorted(set(e["pid"] for e in events) | set([main_pid])):
+        events.append({ "name" : "process_name", "ph" : "M", "pid" : pid, "tid" : 0,
+                        "args" : { "name" : "antiweb" if pid == main_pid else "worker %i" % pid } })
+
+    try:
+        with open(trace_file, "w") as f:
+            json.dump({ "traceEvents" : events, "displayTimeUnit" : "ms" }, f)
+    except (IOError, OSError) as e:
+        logger.error("Could not write trace %s: %s", trace_file, e)
+
+#@(write_trace)
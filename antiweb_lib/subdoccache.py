@@ -0,0 +1,233 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import threading
+from collections import OrderedDict
+
+#@start()
+"""
+######################
+Sub Document Cache
+######################
+
+A file included by an ``@include`` directive with a file argument is loaded as a
+sub document by :py:meth:`Document.get_subdoc`. If many documents include the same file,
+the sub document cache ensures that the file is read, lexed and its blocks are collected
+only once per build. All including documents share the same sub document, whose compiled
+blocks are only read (see :py:class:`Include`).
+
+A cached sub document is only returned, if its file and all files it included so far are
+unchanged: The compiled blocks of a sub document contain the text of its own sub documents.
+Every sub document loaded from disk records the signature of its file
+(see :py:func:`file_signature`), which is checked for the whole tree of sub documents,
+before a cached document is returned.
+
+@include(SubDocumentCache doc)
+@include(subdoc_key doc)
+@include(file_signature doc)
+"""
+
+#@cstart(SubDocumentCache)
+class SubDocumentCache(object):
+    #@start(SubDocumentCache doc)
+    #SubDocumentCache
+    #================
+    """
+    .. py:class:: SubDocumentCache([budget])
+
+       A least recently used cache of sub documents. The cache can be used by
+       several threads: The blocks of a cached sub document must only be compiled
+       while :py:attr:`compile_lock` is held.
+
+       :param integer budget: The estimated maximum memory size of all cached
+                              documents in bytes. If the budget is exceeded,
+                              the least recently used documents are removed.
+    """
+    #@indent 3
+    #@include(SubDocumentCache)
+    #@include(SubDocumentCache.get doc)
+    #@include(SubDocumentCache.put doc)
+    #@include(SubDocumentCache.clear doc)
+    #@include(SubDocumentCache.lock doc)
+    #@include(SubDocumentCache.compile_lock doc)
+    #@(SubDocumentCache doc)
+
+    def __init__(self, budget=64*1024*1024):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        #key -> (document, estimated size)
+        self._entries = OrderedDict()
+        #@cstart(SubDocumentCache.lock)
+        self.lock = threading.RLock()
+        """
+        .. py:attribute:: lock
+
+           A reentrant lock, which protects the cache entries. It is only held
+           within :py:meth:`get`, :py:meth:`put` and :py:meth:`clear`, the sub documents
+           are loaded without it.
+        """
+        #@cstart(SubDocumentCache.compile_lock)
+        self.compile_lock = threading.RLock()
+        """
+        .. py:attribute:: compile_lock
+
+           A reentrant lock, which must be held while a block of a cached document is
+           compiled for the first time, as the block is compiled in place. Blocks already
+           compiled are only read and need no lock. A single lock is used for all
+           documents: a block of a sub document may include a block of another
+           sub document and vice versa, which could deadlock with a lock per document.
+        """
+        #@
+
+    def __len__(self):
+        return len(self._entries)
+
+    #@cstart(SubDocumentCache.get)
+    def get(self, key):
+        """
+        .. py:method:: get(key)
+
+           :param key: A key returned by :py:func:`subdoc_key`.
+           :return: The cached :py:class:`Document` or ``None``. A document is removed
+                    from the cache, if one of the files it included has changed.
+        """
+        with self.lock:
+            try:
+                document, size = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            if not _is_current(document, set()):
+                del self._entries[key]
+                self.size -= size
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return document
+
+    #@cstart(SubDocumentCache.put)
+    def put(self, key, document):
+        """
+        .. py:method:: put(key, document)
+
+           Stores a sub document and removes the least recently used documents
+           if the budget is exceeded.
+
+           :param key: A key returned by :py:func:`subdoc_key`.
+           :param document: The :py:class:`Document` to cache.
+        """
+        #an estimation: the line texts and about 200 bytes for each line object
+        size = sum(len(l.text) + 200 for l in document.lines)
+
+        with self.lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+
+            self._entries[key] = (document, size)
+            self.size += size
+
+            while self.size > self.budget and len(self._entries) > 1:
+                key, (document, size) = self._entries.popitem(last=False)
+                self.size -= size
+
+    #@cstart(SubDocumentCache.clear)
+    def clear(self):
+        """
+        .. py:method:: clear()
+
+           Removes all cached documents.
+        """
+        with self.lock:
+            self._entries.clear()
+            self.size = 0
+
+    #@(SubDocumentCache.clear)
+
+#@cstart(subdoc_key)
+def subdoc_key(fpath, tokens, macros):
+#@start(subdoc_key doc)
+    """
+.. py:function:: subdoc_key(fpath, tokens, macros)
+
+   Computes the cache key of a sub document. Different paths to the same
+   file (e.g. ``../x.py`` and ``x.py``) result in the same key. The key starts with
+   the :py:func:`file_signature` of the file, so a changed file is loaded again.
+
+   :param string fpath: The path of the included file.
+   :param tokens: A set of tokens usable for the ``@if`` directive.
+   :param macros: The macros inserted into the sub document or ``None``.
+   :return: A hashable key or ``None`` if the file cannot be accessed.
+    """
+#@include(subdoc_key)
+#@(subdoc_key doc)
+    signature = file_signature(fpath)
+    if signature is None:
+        return None
+
+    if macros is not None:
+        #macros are either inline substitutions or lists of lines
+        macros = tuple(sorted((name, value if isinstance(value, str)
+                               else tuple(l.text for l in value))
+                              for name, value in macros.items()
+                              if name != "__file__"))
+
+    return (signature, frozenset(tokens), macros)
+
+#@(subdoc_key)
+
+#@cstart(file_signature)
+def file_signature(fpath):
+#@start(file_signature doc)
+    """
+.. py:function:: file_signature(fpath)
+
+   :param string fpath: The path of a file.
+   :return: A tuple of the real path, the modification time and the size of the file
+            or ``None`` if the file cannot be accessed.
+    """
+#@include(file_signature)
+#@(file_signature doc)
+    real_path = os.path.realpath(fpath)
+
+    try:
+        stat = os.stat(real_path)
+    except OSError:
+        return None
+
+    return (real_path, stat.st_mtime_ns, stat.st_size)
+
+#@(file_signature)
+
+def _is_current(document, checked):
+    #checks the file signatures of the document and its sub documents
+    if id(document) in checked:
+        return True
+    checked.add(id(document))
+
+    signature = getattr(document, "file_signature", None)
+    if signature is not None and file_signature(signature[0]) != signature:
+        return False
+
+    #the sub documents may be extended by another thread compiling the document
+    for rpath, subdoc in list(getattr(document, "sub_documents", {}).items()):
+        if subdoc is None:
+            #an included file, which could not be read before
+            if os.path.exists(os.path.join(os.path.dirname(document.fname), rpath)):
+                return False
+        elif not _is_current(subdoc, checked):
+            return False
+
+    return True
+
+#the sub document cache shared by all documents of a build
+shared_cache = SubDocumentCache()
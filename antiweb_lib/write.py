@@ -6,15 +6,15 @@ __maintainer__ = "antiweb team"
 __email__ = "antiweb@freelists.org"
 
 import os
+import shutil
+import locale
 import logging
 import sys
-import pygments.lexers as pm
 
-from antiweb_lib.readers.Reader import Reader
+from antiweb_lib.document import Document, WebError
 
-from antiweb_lib.document import Document, WebError, get_comment_markers
-
-from antiweb_lib.readers.config import readers
+from antiweb_lib.readers.config import create_reader
+from antiweb_lib import stats
 
 logger = logging.getLogger('antiweb')
 
@@ -29,9 +29,11 @@ This module is the mediator for all writing-related classes and modules
 """
 
 #@include(write_documentation)
+#@include(generate_from_text doc)
 #@include(_create_out_file_name doc)
 #@include(_create_doc_directory doc)
 #@include(_process_file doc)
+#@include(_write_if_changed doc)
 #@include(create_write_string doc)
 
 #@cstart(_create_out_file_name)
@@ -80,9 +82,9 @@ def _create_out_file_name(directory, input_file):
 #@(_create_out_file_name)
 
 #@cstart(generate)
-def generate(fname, tokens, show_warnings=False):
+def generate(fname, tokens, show_warnings=False, dependencies=None):
     """
-    ..  py:function:: generate(fname, tokens, warnings)
+    ..  py:function:: generate(fname, tokens, warnings[, dependencies])
 
         Generates a rst file from a source file.
 
@@ -90,25 +92,60 @@ def generate(fname, tokens, show_warnings=False):
         :param list tokens: A list of string tokens, used for @if directives.
         :param bool show_warnings: Warnings will be written
                                    via the logging module.
+        :param set dependencies: If given, the absolute paths of all files included
+                                 by the source file are added to this set.
         :return: The generated documentation content as a string - None if an error occurred
     """
     try:
-        with open(fname, "r") as f:
+        with stats.phase("read"), open(fname, "r") as f:
             text = f.read()
     except IOError as e:
         logger.error("I/O error : " + e.strerror)
         return None
 
-    lexer = pm.get_lexer_for_filename(fname)
-    #get the language specific comment markers based on the pygments lexer name
-    single_comment_markers,  block_comment_markers = get_comment_markers(lexer.name)
-    #initialise a new Reader based on the pygments lexer name
-    reader = readers.get(lexer.name, Reader)(lexer, single_comment_markers, block_comment_markers)
-
-    document = Document(text, reader, fname, tokens)
-    return document.process(show_warnings, fname)
+    return generate_from_text(text, fname, tokens, show_warnings, dependencies=dependencies)
 #@(generate)
 
+#@cstart(generate_from_text)
+def generate_from_text(text, fname, tokens=None, show_warnings=False, language=None,
+                       resolver=None, dependencies=None):
+#@start(generate_from_text doc)
+    """
+.. py:method:: generate_from_text(text, fname[, tokens[, show_warnings[, language[, resolver[, dependencies]]]]])
+
+    Generates a rst file from source code in memory. Together with a ``resolver`` no file is
+    read, e.g. to preview the documentation of an unsaved file in an editor.
+    The parse cache is only used if it has been configured (``--cache-dir`` option).
+
+    :param string text: The source code.
+    :param string fname: The file name of the source code. It does not need to exist, but
+                         its extension determines the language if ``language`` is not given,
+                         and its directory is used to resolve included files.
+    :param list tokens: A list of string tokens, used for @if directives.
+    :param bool show_warnings: Warnings will be written via the logging module.
+    :param string language: A pygments lexer alias, e.g. ``"python"``.
+    :param resolver: A callable returning the text of an included file or ``None``
+                     (see :py:attr:`Document.resolver`), e.g. the ``get`` method of a dictionary
+                     mapping paths to texts. If ``None``, included files are read from disk.
+    :param set dependencies: If given, the paths of all files included
+                             by the source code are added to this set.
+    :return: The generated documentation content as a string - None if an error occurred
+    """
+#@include(generate_from_text)
+#@(generate_from_text doc)
+
+    #initialise a new Reader based on the cached language of the file
+    reader = create_reader(fname, language)
+
+    document = Document(text, reader, fname, tokens, resolver)
+    stats.count_lines(len(document.lines))
+    try:
+        return document.process(show_warnings, fname)
+    finally:
+        if dependencies is not None:
+            dependencies.update(document.get_dependencies())
+#@(generate_from_text)
+
 #@cstart(_create_doc_directory)
 
 def _create_doc_directory(out_file):
@@ -133,16 +170,17 @@ def _create_doc_directory(out_file):
 #@(_create_doc_directory)
 
 #@cstart(_process_file)
-def _process_file(in_file, out_file, token, warnings):
+def _process_file(in_file, out_file, token, warnings, dependencies=None):
 #@start(_process_file doc)
     """
-.. py:method:: _process_file(in_file, out_file, token, warnings)
+.. py:method:: _process_file(in_file, out_file, token, warnings[, dependencies])
 
     If no output name was declared, the input name will be given.
 
     :param in_file: The path to the input file.
     :param out_file: The path to the output file.
     :param token: Passes on the tokens which the user set.
+    :param dependencies: A set which collects the files included by the input file.
     :return: The boolean could_write indicates if the file could be written.
     """
 #@include(_process_file)
@@ -152,11 +190,12 @@ def _process_file(in_file, out_file, token, warnings):
 
     could_write = False
     try:
-        text_output = generate(in_file, token, warnings)
-        if text_output:
-            with open(out_file, "w") as f:
-                f.write(text_output)
-            could_write = True
+        with stats.file(in_file):
+            text_output = generate(in_file, token, warnings, dependencies)
+            if text_output:
+                with stats.phase("write"):
+                    _write_if_changed(out_file, text_output)
+                could_write = True
     except WebError as e:
         logger.error("\nErrors:")
         for l, d in e.error_list:
@@ -166,6 +205,66 @@ def _process_file(in_file, out_file, token, warnings):
     return could_write
 #@(_process_file)
 
+#@cstart(_write_if_changed)
+def _write_if_changed(out_file, text):
+#@start(_write_if_changed doc)
+    """
+.. py:method:: _write_if_changed(out_file, text)
+
+    Writes the text to the output file, if the file content differs from the text.
+    An unchanged file keeps its modification time, so tools like sphinx-autobuild
+    do not render it again. The file content is compared with the encoded text
+    byte by byte, so a file differing only in its line endings is written again.
+    A changed file is written to a temporary file first, which gets the permissions
+    of the output file and then replaces it.
+
+    :param out_file: The path to the output file.
+    :param text: The output text.
+    :return: ``True`` if the file has been written.
+    """
+#@include(_write_if_changed)
+#@(_write_if_changed doc)
+
+    #the bytes written by open(out_file, "w")
+    data = text.replace("\n", os.linesep).encode(locale.getpreferredencoding(False))
+    if _has_content(out_file, data):
+        return False
+
+    temp_file = "%s.%i.tmp" % (out_file, os.getpid())
+    try:
+        with open(temp_file, "wb") as f:
+            f.write(data)
+        if os.path.exists(out_file):
+            shutil.copymode(out_file, temp_file)
+        os.replace(temp_file, out_file)
+    except:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    return True
+#@(_write_if_changed)
+
+def _has_content(fname, data):
+    #compares the file with the bytes chunk by chunk
+    chunk_size = 64*1024
+    position = 0
+
+    try:
+        with open(fname, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return position == len(data)
+
+                if data[position:position+len(chunk)] != chunk:
+                    return False
+
+                position += len(chunk)
+
+    except IOError:
+        return False
+
 #@start(write_documentation)
 
 #Writing the documentation files
@@ -179,7 +278,7 @@ def _process_file(in_file, out_file, token, warnings):
 #@(write_documentation)
 
 #@start(write)
-def write(working_dir, input_file, options, print_message=True):
+def write(working_dir, input_file, options, print_message=True, dependencies=None):
 #@start(write doc)
     """
 .. py:method:: write(working_dir, input_file, options)
@@ -190,6 +289,7 @@ def write(working_dir, input_file, options, print_message=True):
    :param input_file: Contains the absolute path of the currently processed file.
    :param options: Commandline options.
    :param print_message: Indicates whether a log message should be printed for the processed input file.
+   :param dependencies: If given, a set which collects the absolute paths of all files included by the input file.
    :return: the absolute path of the generated output file or None if an error occurred
     """
 #@(write doc)
@@ -275,7 +375,7 @@ def write(working_dir, input_file, options, print_message=True):
 #If processing is successful, ''could_write'' is set to ''True''.
 
 #@code
-    could_write = _process_file(input_file, out_file, options.token, options.warnings)
+    could_write = _process_file(input_file, out_file, options.token, options.warnings, dependencies)
 
     generated_file = None
 
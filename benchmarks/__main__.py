@@ -0,0 +1,20 @@
+import sys
+
+from benchmarks import runner, scaling, compare
+
+#the commands of "python -m benchmarks COMMAND [options]"
+commands = { "run" : runner.main,
+             "scaling" : scaling.main,
+             "compare" : compare.main }
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] not in commands:
+        sys.stderr.write("usage: python -m benchmarks {%s} [options]\n" % ",".join(sorted(commands)))
+        return 2
+
+    return commands[argv[0]](argv[1:])
+
+if __name__ == "__main__":
+    sys.exit(main())
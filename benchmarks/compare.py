@@ -0,0 +1,197 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import sys
+import json
+import math
+import statistics
+from optparse import OptionParser
+
+#@start()
+"""
+.. _label-compare:
+
+####################
+Benchmark Comparison
+####################
+
+The ``compare`` command compares the results of a benchmark run
+(see :ref:`Benchmarks <label-benchmarks>`) with a baseline, e.g. in a build before merging
+changes to the reader, the document or the directives. The run times depend on the machine,
+therefore no baseline is shipped: it is created on the same machine before the changes
+and passed explicitly:
+
+::
+
+    python -m benchmarks run -o baseline.json
+    ...
+    python -m benchmarks run -o results.json
+    python -m benchmarks compare results.json baseline.json
+
+Both files must be created on the same machine with the same Python version; the command
+warns if the environments differ. The comparison needs no network access.
+
+For every benchmark and stage the medians of the run times are compared. The run times
+of a stage vary between runs, therefore the allowed slowdown of a stage depends on its noise:
+A stage regresses if its median is slower by more than the ``--threshold`` (default 10%)
+and by more than ``--noise-factor`` (default 3) times the combined noise of both runs.
+The noise of a run is the median absolute deviation of its run times (scaled to a standard
+deviation) relative to their median. In contrast to the standard deviation, it is not inflated
+by single outliers, e.g. a run interrupted by another process.
+
+The command prints a table of all deltas and exits with ``1`` if a stage regressed,
+with ``2`` if a file cannot be read and with ``0`` otherwise.
+Benchmarks missing in one of the files are reported, but do not fail the comparison.
+
+@include(compare doc)
+"""
+
+#@cstart(compare)
+def compare(baseline, results, threshold=0.1, noise_factor=3.0, stage_names=None):
+#@start(compare doc)
+    """
+.. py:method:: compare(baseline, results[, threshold[, noise_factor[, stage_names]]])
+
+   Compares the results of two benchmark runs.
+
+   :param dict baseline: The results of the baseline run.
+   :param dict results: The results of the new run.
+   :param float threshold: The minimal relative slowdown of a regression.
+   :param float noise_factor: The factor of the combined noise, which a regression must exceed.
+   :param stage_names: The compared stages, ``None`` for all.
+   :return: A list of dictionaries with the keys ``benchmark``, ``stage``, ``baseline`` and
+            ``new`` (median seconds or ``None`` if missing), ``delta`` (relative change of
+            the median), ``limit`` (allowed relative slowdown) and ``status``
+            (``ok``, ``faster``, ``regressed`` or ``missing``).
+    """
+#@include(compare)
+#@(compare doc)
+
+    rows = []
+    base_benchmarks = baseline.get("benchmarks", {})
+    new_benchmarks = results.get("benchmarks", {})
+
+    for name in sorted(set(base_benchmarks) | set(new_benchmarks)):
+        base_stages = base_benchmarks.get(name, {}).get("stages", {})
+        new_stages = new_benchmarks.get(name, {}).get("stages", {})
+
+        for stage in sorted(set(base_stages) | set(new_stages)):
+            if stage_names and stage not in stage_names:
+                continue
+
+            base, new = base_stages.get(stage), new_stages.get(stage)
+            row = { "benchmark" : name, "stage" : stage,
+                    "baseline" : base and base["median"], "new" : new and new["median"],
+                    "delta" : None, "limit" : None, "status" : "missing" }
+            rows.append(row)
+
+            if not base or not new or not base["median"]:
+                continue
+
+            noise = math.sqrt(_noise(base) ** 2 + _noise(new) ** 2)
+            row["delta"] = new["median"] / base["median"] - 1
+            row["limit"] = max(threshold, noise_factor * noise)
+
+            if row["delta"] > row["limit"]:
+                row["status"] = "regressed"
+            elif row["delta"] < -row["limit"]:
+                row["status"] = "faster"
+            else:
+                row["status"] = "ok"
+
+    return rows
+
+#@(compare)
+
+#scales the median absolute deviation to the standard deviation of a normal distribution
+mad_factor = 1.4826
+
+def _noise(values):
+    #the robust standard deviation relative to the median
+    median = values["median"]
+    if not median:
+        return 0.0
+
+    runs = values.get("runs")
+    if not runs:
+        #e.g. an older or a hand written baseline without the run times
+        return values.get("stdev", 0.0) / median
+
+    return mad_factor * statistics.median(abs(r - median) for r in runs) / median
+
+def format_rows(rows):
+    lines = [ "%-40s%-16s%12s%12s%9s%9s  %s"
+              % ("benchmark", "stage", "base ms", "new ms", "delta", "limit", "status") ]
+
+    for row in rows:
+        base = "-" if row["baseline"] is None else "%.2f" % (row["baseline"] * 1000)
+        new = "-" if row["new"] is None else "%.2f" % (row["new"] * 1000)
+        delta = "-" if row["delta"] is None else "%+.1f%%" % (row["delta"] * 100)
+        limit = "-" if row["limit"] is None else "%.1f%%" % (row["limit"] * 100)
+        lines.append("%-40s%-16s%12s%12s%9s%9s  %s"
+                     % (row["benchmark"], row["stage"], base, new, delta, limit, row["status"]))
+
+    return "\n".join(lines)
+
+def _environment_differences(baseline, results):
+    base_env = baseline.get("environment", {})
+    new_env = results.get("environment", {})
+    return [ key for key in ("python", "implementation", "platform", "pygments")
+             if base_env.get(key) != new_env.get(key) ]
+
+def _load(fname):
+    with open(fname, "r") as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = OptionParser("usage: %prog compare [options] RESULTS BASELINE",
+                          description="Compares benchmark results with a baseline and fails "
+                                      "if a stage regressed.")
+
+    parser.add_option("-t", "--threshold", dest="threshold", default=0.1,
+                      type="float", help="the minimal relative slowdown of a regression "
+                                         "(default: %default)")
+
+    parser.add_option("-n", "--noise-factor", dest="noise_factor", default=3.0,
+                      type="float", help="a regression must exceed the combined noise "
+                                         "times this factor (default: %default)")
+
+    parser.add_option("-s", "--stage", dest="stages", action="append",
+                      type="string", help="compares only a stage (can be repeated)")
+
+    options, args = parser.parse_args(argv)
+
+    if len(args) == 1:
+        sys.stderr.write("a baseline is required: create it with "
+                         "'python -m benchmarks run -o baseline.json' before the changes\n")
+        return 2
+
+    if len(args) != 2:
+        parser.print_help()
+        return 2
+
+    results_file, baseline_file = args
+
+    try:
+        results = _load(results_file)
+        baseline = _load(baseline_file)
+    except (IOError, OSError, ValueError) as e:
+        sys.stderr.write("cannot read benchmark results: %s\n" % e)
+        return 2
+
+    for key in _environment_differences(baseline, results):
+        sys.stderr.write("warning: the %s of the baseline differs from the results\n" % key)
+
+    rows = compare(baseline, results, options.threshold, options.noise_factor, options.stages)
+    print(format_rows(rows))
+
+    regressed = [ row for row in rows if row["status"] == "regressed" ]
+    if regressed:
+        print("\n%i of %i stages regressed" % (len(regressed), len(rows)))
+        return 1
+
+    return 0
@@ -0,0 +1,254 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import random
+
+#@start()
+"""
+.. _label-corpus:
+
+#################
+Synthetic Corpus
+#################
+
+The benchmarks process generated source files, so the numbers are reproducible and the shape
+of the sources can be varied independently of each other. The generator is deterministic:
+the same parameters (including the seed) always create the same files.
+
+A generated file consists of a main block, which includes the root blocks of the file,
+optionally a ``__macros__`` block and trees of nested ``@start`` blocks. Every block contains
+a few document lines and a code section with filler code, so the generated documentation
+resembles a real one.
+
+@include(languages doc)
+@include(CorpusSpec doc)
+@include(generate_source doc)
+@include(generate_corpus doc)
+"""
+
+#@start(languages doc)
+#The generator supports the following languages. A language is defined by its file extension,
+#a function wrapping a line into a comment and a function creating a line of code:
+
+#@code
+languages = {
+    "python" : (".py", lambda text: "#" + text, lambda i: "x_%i = compute(%i)" % (i, i)),
+    "c" : (".c", lambda text: "//" + text, lambda i: "int x_%i = compute(%i);" % (i, i)),
+    "cpp" : (".cpp", lambda text: "//" + text, lambda i: "auto x_%i = compute(%i);" % (i, i)),
+    "csharp" : (".cs", lambda text: "//" + text, lambda i: "var x_%i = Compute(%i);" % (i, i)),
+    "xml" : (".xml", lambda text: "<!-- %s -->" % text, lambda i: '<item id="%i"/>' % i),
+    "rst" : (".rst", lambda text: ".. " + text, lambda i: "Text line %i of the document." % i),
+}
+
+#@edoc
+#@(languages doc)
+
+#the filler words of the document lines
+_words = ("block", "line", "directive", "document", "include", "macro", "source", "text",
+          "reader", "compile", "output", "index")
+
+#@cstart(CorpusSpec)
+class CorpusSpec(object):
+    #@start(CorpusSpec doc)
+    #CorpusSpec
+    #==========
+    """
+    .. py:class:: CorpusSpec([language[, lines[, blocks[, depth[, fanout[, cross_files[, macro_density[, files[, seed]]]]]]]]])
+
+       The parameters of a generated corpus.
+
+       :param string language: A key of ``languages``.
+       :param integer lines: The approximate number of lines of each file.
+       :param integer blocks: The number of ``@start`` blocks in each file.
+       :param integer depth: The nesting depth of the block trees. A block of depth ``n``
+                             contains and includes its child blocks of depth ``n+1``.
+       :param integer fanout: The number of child blocks of a block.
+       :param integer cross_files: The number of root blocks of other files included
+                                   by the main block of each file.
+       :param float macro_density: The fraction of document lines containing a ``@subst`` directive.
+       :param integer files: The number of generated files.
+       :param integer seed: The seed of the random generator.
+    """
+    #@indent 3
+    #@include(CorpusSpec)
+    #@include(CorpusSpec.name doc)
+    #@include(CorpusSpec.to_dict doc)
+    #@(CorpusSpec doc)
+
+    def __init__(self, language="python", lines=1000, blocks=10, depth=1, fanout=0,
+                 cross_files=0, macro_density=0.0, files=1, seed=0):
+        if language not in languages:
+            raise ValueError("unknown language: %s" % language)
+
+        self.language = language
+        self.lines = lines
+        self.blocks = blocks
+        self.depth = max(1, depth)
+        self.fanout = fanout
+        self.cross_files = cross_files
+        self.macro_density = macro_density
+        self.files = max(1, files)
+        self.seed = seed
+
+    #@cstart(CorpusSpec.to_dict)
+    def to_dict(self):
+        """
+        .. py:method:: to_dict()
+
+           :return: The parameters as a json serializable dictionary.
+        """
+        return dict(self.__dict__)
+
+    #@(CorpusSpec.to_dict)
+
+    #@cstart(CorpusSpec.name)
+    @property
+    def name(self):
+        """
+        .. py:attribute:: name
+
+           A short name of the spec, used to identify a benchmark.
+        """
+        return "%s-l%i-b%i-d%i-f%i-x%i-m%g-n%i" % (self.language, self.lines, self.blocks,
+                                                   self.depth, self.fanout, self.cross_files,
+                                                   self.macro_density, self.files)
+
+    #@(CorpusSpec.name)
+
+#@(CorpusSpec)
+
+def _file_name(spec, file_index):
+    return "bench_%i%s" % (file_index, languages[spec.language][0])
+
+def _block_trees(spec):
+    #a list of (name, children) trees with spec.blocks blocks in total
+    count = [0]
+
+    def tree(depth):
+        name = "b%i" % count[0]
+        count[0] += 1
+        children = []
+        if depth < spec.depth:
+            for i in range(spec.fanout):
+                if count[0] >= spec.blocks:
+                    break
+                children.append(tree(depth + 1))
+
+        return name, children
+
+    roots = []
+    while count[0] < spec.blocks:
+        roots.append(tree(1))
+
+    return roots
+
+#@cstart(generate_source)
+def generate_source(spec, file_index=0):
+#@start(generate_source doc)
+    """
+.. py:method:: generate_source(spec[, file_index])
+
+   Generates the source code of a single file of a corpus.
+
+   :param spec: A :py:class:`CorpusSpec`.
+   :param integer file_index: The index of the file in the corpus. The cross file includes
+                              reference the following files of the corpus.
+   :return: The source code as a string.
+    """
+#@include(generate_source)
+#@(generate_source doc)
+
+    extension, comment, code = languages[spec.language]
+    rnd = random.Random("%i-%i" % (spec.seed, file_index))
+    macros = [ "m%i" % i for i in range(4) ] if spec.macro_density else []
+
+    roots = _block_trees(spec)
+    #every block gets the same share of the lines, a block has about 6 lines of directives
+    filler = max(1, (spec.lines - 10 - 6 * spec.blocks) // max(1, spec.blocks * 2))
+    counter = [0]
+
+    def doc_line():
+        text = " ".join(rnd.choice(_words) for i in range(8))
+        if macros and rnd.random() < spec.macro_density:
+            text += " @subst(%s)" % rnd.choice(macros)
+        return comment(text)
+
+    def block(name, children, indent):
+        prefix = " " * indent
+        lines = [ prefix + comment("@start(%s)" % name),
+                  prefix + comment("Block %s" % name) ]
+        lines.extend(prefix + doc_line() for i in range(filler))
+        lines.extend(prefix + comment("@include(%s)" % child) for child, grandchildren in children)
+
+        for child, grandchildren in children:
+            lines.extend(block(child, grandchildren, indent + 4))
+
+        lines.append(prefix + comment("@code"))
+        for i in range(filler):
+            counter[0] += 1
+            lines.append(prefix + code(counter[0]))
+
+        lines.append(prefix + comment("@edoc"))
+        lines.append(prefix + comment("@(%s)" % name))
+        return lines
+
+    lines = [ comment("@start()"), comment("Benchmark file %i" % file_index), "" ]
+    lines.extend(comment("@include(%s)" % name) for name, children in roots)
+
+    if spec.files > 1 and roots:
+        for i in range(spec.cross_files):
+            other = (file_index + 1 + i) % spec.files
+            if other == file_index:
+                break
+            lines.append(comment("@include(b0, %s)" % _file_name(spec, other)))
+
+    lines.append("")
+
+    if macros:
+        lines.append(comment("@start(__macros__)"))
+        for name in macros:
+            lines.extend([ comment("@define(%s)" % name),
+                           comment("macro %s of @subst(__file__)" % name),
+                           comment("@enifed(%s)" % name) ])
+        lines.append(comment("@(__macros__)"))
+        lines.append("")
+
+    for name, children in roots:
+        lines.extend(block(name, children, 0))
+        lines.append("")
+
+    return "\n".join(lines) + "\n"
+
+#@(generate_source)
+
+#@cstart(generate_corpus)
+def generate_corpus(spec, directory):
+#@start(generate_corpus doc)
+    """
+.. py:method:: generate_corpus(spec, directory)
+
+   Writes the files of a corpus.
+
+   :param spec: A :py:class:`CorpusSpec`.
+   :param string directory: The directory of the generated files.
+   :return: A list of the absolute paths of the generated files.
+    """
+#@include(generate_corpus)
+#@(generate_corpus doc)
+
+    paths = []
+    for i in range(spec.files):
+        path = os.path.abspath(os.path.join(directory, _file_name(spec, i)))
+        with open(path, "w") as f:
+            f.write(generate_source(spec, i))
+
+        paths.append(path)
+
+    return paths
+
+#@(generate_corpus)
@@ -0,0 +1,271 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import gc
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import statistics
+from time import perf_counter
+from optparse import OptionParser, Values
+
+import pygments
+
+from antiweb_lib.document import Document
+from antiweb_lib.readers.config import create_reader
+from antiweb_lib.subdoccache import shared_cache
+from antiweb_lib.write import write
+
+from benchmarks.corpus import CorpusSpec, generate_corpus, languages
+
+#@start()
+"""
+.. _label-benchmarks:
+
+###########
+Benchmarks
+###########
+
+The benchmarks measure the processing stages of antiweb on a synthetic corpus
+(see :ref:`Synthetic Corpus <label-corpus>`):
+
+::
+
+    python -m benchmarks run -o results.json
+    python -m benchmarks run --quick --language python
+
+@include(stages doc)
+
+Before every run the garbage collector is run and disabled for the measurement, the
+sub document cache is cleared, so every run does the same work. The parse cache is not used.
+The results are written as JSON: the environment (antiweb, Python and pygments version,
+platform) and for every benchmark the corpus parameters, the number of lines and for
+every stage the ``min``, ``median``, ``mean`` and ``stdev`` of the run times in seconds.
+``lines_per_second`` is computed from the median of the ``write`` stage.
+
+@include(default_specs doc)
+@include(run_benchmark doc)
+@include(run_suite doc)
+"""
+
+#@start(stages doc)
+#The following stages are measured for the first file of each corpus:
+
+#.. csv-table::
+#   :header: "Stage", "Measured Code"
+
+#   process, :py:meth:`Reader.process` of a new reader
+#   collect_blocks, :py:meth:`Document.collect_blocks` of a lexed document
+#   compile_block, :py:meth:`Document.compile_block` of the main block (including all sub documents)
+#   write, :py:meth:`write` of the file (end to end)
+#@(stages doc)
+
+stages = ("process", "collect_blocks", "compile_block", "write")
+
+#@cstart(default_specs)
+def default_specs(quick=False):
+#@start(default_specs doc)
+    """
+.. py:method:: default_specs([quick])
+
+   :param bool quick: If ``True``, smaller corpora are used, e.g. for a smoke test.
+   :return: The list of :py:class:`CorpusSpec` objects of the standard benchmark suite:
+            every language with the same shape, followed by variations of the python corpus.
+    """
+#@include(default_specs)
+#@(default_specs doc)
+
+    scale = 10 if quick else 1
+    specs = [ CorpusSpec(language, lines=2000 // scale, blocks=20) for language in sorted(languages) ]
+
+    specs.extend([
+        CorpusSpec("python", lines=20000 // scale, blocks=20),
+        CorpusSpec("python", lines=5000 // scale, blocks=500 // scale),
+        CorpusSpec("python", lines=5000 // scale, blocks=121, depth=5, fanout=3),
+        CorpusSpec("python", lines=2000 // scale, blocks=20, cross_files=3, files=4),
+        CorpusSpec("python", lines=2000 // scale, blocks=20, macro_density=0.5),
+    ])
+
+    return specs
+
+#@(default_specs)
+
+def _options(output):
+    return Values({ "output" : output, "recursive" : False, "token" : None, "warnings" : False })
+
+def _measure(func, setup, repeat):
+    runs = []
+    for i in range(repeat):
+        argument = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = perf_counter()
+            func(argument)
+            runs.append(perf_counter() - start)
+        finally:
+            gc.enable()
+
+    return { "min" : min(runs),
+             "median" : statistics.median(runs),
+             "mean" : statistics.mean(runs),
+             "stdev" : statistics.stdev(runs) if len(runs) > 1 else 0.0,
+             "runs" : runs }
+
+def _stage_functions(fname, text, out_dir):
+    #(setup, measured function) of every stage
+
+    def new_document(collect=False):
+        shared_cache.clear()
+        document = Document(text, create_reader(fname), fname, [])
+        if collect:
+            document.collect_blocks()
+        return document
+
+    def new_reader():
+        return create_reader(fname)
+
+    def cleared():
+        shared_cache.clear()
+        return os.path.dirname(fname)
+
+    options = _options(out_dir)
+    return {
+        "process" : (new_reader, lambda reader: reader.process(fname, text)),
+        "collect_blocks" : (new_document, lambda document: document.collect_blocks()),
+        "compile_block" : (lambda: new_document(True),
+                           lambda document: document.compile_block("", document.blocks[""])),
+        "write" : (cleared, lambda directory: write(directory, fname, options, False)),
+    }
+
+#@cstart(run_benchmark)
+def run_benchmark(spec, repeat=5, stage_names=stages):
+#@start(run_benchmark doc)
+    """
+.. py:method:: run_benchmark(spec[, repeat[, stage_names]])
+
+   Generates the corpus of a spec in a temporary directory and measures the stages.
+
+   :param spec: A :py:class:`CorpusSpec`.
+   :param integer repeat: The number of runs of each stage.
+   :param stage_names: The measured stages.
+   :return: A json serializable dictionary with the results.
+    """
+#@include(run_benchmark)
+#@(run_benchmark doc)
+
+    directory = tempfile.mkdtemp(prefix="antiweb_bench_")
+    try:
+        fname = generate_corpus(spec, directory)[0]
+        with open(fname, "r") as f:
+            text = f.read()
+
+        out_dir = os.path.join(directory, "doc")
+        functions = _stage_functions(fname, text, out_dir)
+
+        result = { "spec" : spec.to_dict(),
+                   "lines" : len(text.splitlines()),
+                   "stages" : {} }
+
+        for name in stage_names:
+            setup, func = functions[name]
+            result["stages"][name] = _measure(func, setup, repeat)
+
+        if "write" in result["stages"]:
+            median = result["stages"]["write"]["median"]
+            result["lines_per_second"] = result["lines"] / median if median else 0.0
+
+        return result
+    finally:
+        shared_cache.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+#@(run_benchmark)
+
+def environment():
+    return { "antiweb" : __version__,
+             "python" : platform.python_version(),
+             "implementation" : platform.python_implementation(),
+             "platform" : platform.platform(),
+             "pygments" : pygments.__version__ }
+
+#@cstart(run_suite)
+def run_suite(specs, repeat=5, progress=None):
+#@start(run_suite doc)
+    """
+.. py:method:: run_suite(specs[, repeat[, progress]])
+
+   Runs the benchmarks of several specs.
+
+   :param specs: A sequence of :py:class:`CorpusSpec` objects.
+   :param integer repeat: The number of runs of each stage.
+   :param progress: A callable called with the name and the result of every finished benchmark.
+   :return: A json serializable dictionary with the environment and a dictionary of
+            the results by benchmark name.
+    """
+#@include(run_suite)
+#@(run_suite doc)
+
+    results = { "environment" : environment(),
+                "repeat" : repeat,
+                "benchmarks" : {} }
+
+    for spec in specs:
+        result = run_benchmark(spec, repeat)
+        results["benchmarks"][spec.name] = result
+        if progress:
+            progress(spec.name, result)
+
+    return results
+
+#@(run_suite)
+
+def format_result(name, result):
+    stage_times = "  ".join("%s %8.2f ms" % (stage, values["median"] * 1000)
+                            for stage, values in result["stages"].items())
+    return "%-40s %7i lines  %s" % (name, result["lines"], stage_times)
+
+def main(argv=None):
+    parser = OptionParser("usage: %prog run [options]",
+                          description="Runs the antiweb benchmarks on a synthetic corpus.")
+
+    parser.add_option("-o", "--output", dest="output", default="",
+                      type="string", help="writes the results to a JSON file (default: stdout)")
+
+    parser.add_option("-r", "--repeat", dest="repeat", default=5,
+                      type="int", help="the number of runs of each stage (default: 5)")
+
+    parser.add_option("-l", "--language", dest="languages", action="append",
+                      type="choice", choices=sorted(languages),
+                      help="runs only the benchmarks of a language (can be repeated)")
+
+    parser.add_option("--quick", dest="quick", action="store_true",
+                      help="uses smaller corpora")
+
+    options, args = parser.parse_args(argv)
+    if args or options.repeat < 1:
+        parser.print_help()
+        return 2
+
+    specs = default_specs(options.quick)
+    if options.languages:
+        specs = [ s for s in specs if s.language in options.languages ]
+
+    progress = lambda name, result: sys.stderr.write(format_result(name, result) + "\n")
+    results = run_suite(specs, options.repeat, progress)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    return 0
@@ -0,0 +1,330 @@
+__author__ = "Michael Reithinger, Philipp Rathmanner, Lukas Tanner, Philipp Grandits, and Christian Eitner"
+__copyright__ = "Copyright 2017, antiweb team"
+__license__ = "GPL"
+__version__ = "0.9.1"
+__maintainer__ = "antiweb team"
+__email__ = "antiweb@freelists.org"
+
+import os
+import sys
+import json
+import math
+import shutil
+import tempfile
+from optparse import OptionParser, Values
+
+from antiweb_lib import parsecache
+from antiweb_lib.subdoccache import shared_cache
+
+from benchmarks.runner import environment, _stage_functions, _measure, stages
+
+#@start()
+"""
+.. _label-scaling:
+
+###################
+Scaling Benchmarks
+###################
+
+The scaling benchmarks detect processing stages, whose run time grows faster than the size
+of the input, e.g. by accidentally scanning a whole block for every line. Every pattern is
+generated with 1k, 10k, 100k and 1M lines. For every stage the growth exponent ``k`` of
+``time = c * lines ** k`` is fitted over the sizes. A linear stage has an exponent of about
+``1``, a quadratic one of about ``2``. If the exponent of a stage exceeds its bound,
+the command exits with ``1``:
+
+::
+
+    python -m benchmarks scaling -o scaling.json
+    python -m benchmarks scaling --sizes 1000,10000,100000 --bound 1.3 --stage-bound compile_block=1.5
+
+@include(patterns doc)
+
+The stages are the stages of the benchmarks (see :ref:`Benchmarks <label-benchmarks>`),
+by default ``process``, ``collect_blocks`` and ``compile_block``. Lexing a file with
+a million lines takes more than a minute, therefore the lexed lines are stored in a
+parse cache in a temporary directory, so only the ``process`` stage itself lexes the file.
+If the next size of a stage is expected to take longer than ``--max-seconds`` (extrapolated
+from the last two sizes), the larger sizes are skipped for this stage; the exponent is fitted
+over the measured sizes.
+Runs faster than a millisecond are dominated by noise and are not used for the fit.
+
+@include(fit_exponent doc)
+@include(run_scaling doc)
+"""
+
+#@start(patterns doc)
+#The following patterns are generated (python sources), each stressing a different code path:
+
+#.. csv-table::
+#   :header: "Pattern", "Source"
+
+#   blocks, "sequential blocks with named ends, all included by the main block"
+#   nested, "blocks without a named end, nested in the main block"
+#   directives, "a single block, every second line contains a ``@subst`` directive"
+#   indent, "a single code block with an ``@indent`` directive every 10 lines"
+#@(patterns doc)
+
+def _pattern_blocks(lines):
+    count = max(1, lines // 10)
+    source = [ "#@start()", "#Main" ]
+    source.extend("#@include(b%i)" % i for i in range(count))
+
+    for i in range(count):
+        source.extend([ "#@cstart(b%i)" % i, "def f_%i():" % i ]
+                      + [ "    x = %i" % j for j in range(6) ]
+                      + [ "#@(b%i)" % i, "" ])
+
+    return source
+
+def _pattern_nested(lines):
+    count = max(1, lines // 10)
+    source = [ "#@start()", "#Main" ]
+
+    for i in range(count):
+        source.extend([ "    #@start(b%i)" % i ]
+                      + [ "    #text %i" % j for j in range(7) ]
+                      + [ "    #@", "#text" ])
+
+    return source
+
+def _pattern_directives(lines):
+    source = [ "#@start()" ]
+    for i in range(max(1, lines // 2)):
+        source.extend([ "#text @subst(__file__)", "#text" ])
+
+    return source
+
+def _pattern_indent(lines):
+    source = [ "#@start()", "#@code" ]
+    for i in range(max(1, lines // 10)):
+        source.append("#@indent %i" % (i % 2 * 2 - 1))
+        source.extend("x_%i = %i" % (i, j) for j in range(9))
+
+    source.append("#@edoc")
+    return source
+
+patterns = { "blocks" : _pattern_blocks,
+             "nested" : _pattern_nested,
+             "directives" : _pattern_directives,
+             "indent" : _pattern_indent }
+
+default_sizes = (1000, 10000, 100000, 1000000)
+default_stages = ("process", "collect_blocks", "compile_block")
+
+#the fastest run used for fitting the exponent
+min_seconds = 0.001
+
+#@cstart(fit_exponent)
+def fit_exponent(sizes, seconds):
+#@start(fit_exponent doc)
+    """
+.. py:method:: fit_exponent(sizes, seconds)
+
+   Fits the exponent ``k`` of ``seconds = c * sizes ** k`` by a least squares fit of the logarithms.
+
+   :param sizes: A sequence of input sizes.
+   :param seconds: A sequence of the run times of the sizes.
+   :return: The exponent or ``None`` if less than two runs take at least a millisecond.
+    """
+#@include(fit_exponent)
+#@(fit_exponent doc)
+
+    points = [ (math.log(n), math.log(s)) for n, s in zip(sizes, seconds) if s >= min_seconds ]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, y in points) / len(points)
+    mean_y = sum(y for x, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, y in points)
+    if not variance:
+        return None
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+#@(fit_exponent)
+
+def _expected_seconds(points, size):
+    #extrapolates the run time of the next size, at least linearly
+    last_size, last_seconds = points[-1]
+    exponent = fit_exponent(*zip(*points[-2:])) if len(points) > 1 else None
+    return last_seconds * (float(size) / last_size) ** max(1.0, exponent or 1.0)
+
+def _measure_sizes(pattern, sizes, stage_names, repeat, max_seconds, directory, progress):
+    #stage -> list of (size, seconds)
+    measured = dict((name, []) for name in stage_names)
+    skipped = set()
+
+    for index, size in enumerate(sizes):
+        active = [ name for name in stage_names if name not in skipped ]
+        if not active:
+            break
+
+        fname = os.path.join(directory, "%s_%i.py" % (pattern, size))
+        text = "\n".join(patterns[pattern](size)) + "\n"
+        with open(fname, "w") as f:
+            f.write(text)
+
+        functions = _stage_functions(fname, text, os.path.join(directory, "doc"))
+        for name in active:
+            setup, func = functions[name]
+            #large inputs are measured once
+            runs = repeat if size < 100000 else 1
+            seconds = _measure(func, setup, runs)["min"]
+            measured[name].append((size, seconds))
+
+            if progress:
+                progress(pattern, name, size, seconds)
+
+            if index + 1 < len(sizes) and _expected_seconds(measured[name], sizes[index + 1]) > max_seconds:
+                skipped.add(name)
+
+        os.remove(fname)
+        shared_cache.clear()
+
+    return measured
+
+#@cstart(run_scaling)
+def run_scaling(pattern_names=None, sizes=default_sizes, stage_names=default_stages, bound=1.2,
+                stage_bounds=None, repeat=3, max_seconds=120.0, progress=None):
+#@start(run_scaling doc)
+    """
+.. py:method:: run_scaling([pattern_names[, sizes[, stage_names[, bound[, stage_bounds[, repeat[, max_seconds[, progress]]]]]]]])
+
+   Measures the stages of the patterns for all sizes and fits the exponents.
+
+   :param pattern_names: The measured patterns, ``None`` for all.
+   :param sizes: A sequence of the number of lines of the generated sources.
+   :param stage_names: The measured stages.
+   :param float bound: The largest allowed exponent.
+   :param dict stage_bounds: The largest allowed exponents of single stages (stage -> bound).
+   :param integer repeat: The number of runs of each stage and size below 100k lines,
+                          the fastest run is used.
+   :param float max_seconds: If the next size is expected to take longer, the larger sizes
+                             of the stage are skipped.
+   :param progress: A callable called with the pattern, stage, size and seconds of every measurement.
+   :return: A json serializable dictionary. ``ok`` is ``False`` if an exponent exceeds its bound.
+    """
+#@include(run_scaling)
+#@(run_scaling doc)
+
+    stage_bounds = stage_bounds or {}
+    results = { "environment" : environment(),
+                "sizes" : list(sizes),
+                "patterns" : {},
+                "ok" : True }
+
+    directory = tempfile.mkdtemp(prefix="antiweb_scaling_")
+    #the lexed lines of the documents are loaded from the parse cache
+    cache = Values({ "cache_dir" : os.path.join(directory, "cache"), "cache_size" : 16384 })
+    parsecache.configure(cache)
+
+    try:
+        for pattern in pattern_names or sorted(patterns):
+            measured = _measure_sizes(pattern, sizes, stage_names, repeat, max_seconds,
+                                      directory, progress)
+            pattern_result = results["patterns"][pattern] = {}
+
+            for name, points in measured.items():
+                exponent = fit_exponent([ p[0] for p in points ], [ p[1] for p in points ])
+                stage_bound = stage_bounds.get(name, bound)
+                ok = exponent is None or exponent <= stage_bound
+
+                pattern_result[name] = { "sizes" : [ p[0] for p in points ],
+                                         "seconds" : [ p[1] for p in points ],
+                                         "exponent" : exponent,
+                                         "bound" : stage_bound,
+                                         "ok" : ok }
+                results["ok"] = results["ok"] and ok
+    finally:
+        parsecache.configure(Values())
+        shared_cache.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+#@(run_scaling)
+
+def format_results(results):
+    rows = [ "%-12s%-16s%10s%8s  %s" % ("pattern", "stage", "exponent", "bound", "") ]
+    for pattern, stage_results in sorted(results["patterns"].items()):
+        for name, values in sorted(stage_results.items()):
+            exponent = values["exponent"]
+            rows.append("%-12s%-16s%10s%8.2f  %s"
+                        % (pattern, name, "-" if exponent is None else "%.2f" % exponent,
+                           values["bound"], "ok" if values["ok"] else "FAILED"))
+
+    return "\n".join(rows)
+
+def _parse_stage_bounds(parser, values):
+    stage_bounds = {}
+    for value in values or []:
+        name, sep, number = value.partition("=")
+        if name not in stages or not sep:
+            parser.error("invalid stage bound: %s" % value)
+
+        try:
+            stage_bounds[name] = float(number)
+        except ValueError:
+            parser.error("invalid stage bound: %s" % value)
+
+    return stage_bounds
+
+def main(argv=None):
+    parser = OptionParser("usage: %prog scaling [options]",
+                          description="Fits the growth exponents of the processing stages "
+                                      "and fails if an exponent exceeds its bound.")
+
+    parser.add_option("-o", "--output", dest="output", default="",
+                      type="string", help="writes the results to a JSON file")
+
+    parser.add_option("-p", "--pattern", dest="patterns", action="append",
+                      type="choice", choices=sorted(patterns),
+                      help="measures only a pattern (can be repeated)")
+
+    parser.add_option("-s", "--stage", dest="stages", action="append",
+                      type="choice", choices=list(stages),
+                      help="measures only a stage (can be repeated, default: %s)" % ", ".join(default_stages))
+
+    parser.add_option("--sizes", dest="sizes", default=",".join(map(str, default_sizes)),
+                      type="string", help="comma separated numbers of lines (default: %default)")
+
+    parser.add_option("-b", "--bound", dest="bound", default=1.2,
+                      type="float", help="the largest allowed exponent (default: %default)")
+
+    parser.add_option("--stage-bound", dest="stage_bounds", action="append",
+                      type="string", help="the largest allowed exponent of a stage, e.g. write=1.3")
+
+    parser.add_option("-r", "--repeat", dest="repeat", default=3,
+                      type="int", help="the number of runs below 100k lines (default: %default)")
+
+    parser.add_option("--max-seconds", dest="max_seconds", default=120.0,
+                      type="float", help="skips the larger sizes of a stage, if a run is expected "
+                                         "to take longer (default: %default)")
+
+    options, args = parser.parse_args(argv)
+
+    try:
+        sizes = sorted(set(int(s) for s in options.sizes.split(",")))
+    except ValueError:
+        parser.error("invalid sizes: %s" % options.sizes)
+
+    if args or len(sizes) < 2 or options.repeat < 1:
+        parser.print_help()
+        return 2
+
+    stage_bounds = _parse_stage_bounds(parser, options.stage_bounds)
+
+    progress = lambda pattern, name, size, seconds: \
+        sys.stderr.write("%-12s%-16s%9i lines %10.2f ms\n" % (pattern, name, size, seconds * 1000))
+
+    results = run_scaling(options.patterns, sizes, options.stages or default_stages,
+                          options.bound, stage_bounds, options.repeat, options.max_seconds, progress)
+
+    print(format_results(results))
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    return 0 if results["ok"] else 1
@@ -27,6 +27,7 @@ setup(
     author_email='antiweb@freelists.org',
     description='antiweb literate programming tool',
     install_requires=requires,
+    python_requires='>=3.5',
     zip_safe=True,
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -41,6 +42,9 @@ setup(
     ],
     platforms='any',
     scripts=['antiweb.py'],
+    entry_points={
+        'console_scripts': ['antiweb-client = antiweb_lib.client:main'],
+    },
     py_modules=['antisphinx'],
-    packages=find_packages(exclude=['tests']), 
+    packages=find_packages(exclude=['tests', 'benchmarks']), 
 )
@@ -111,6 +111,13 @@ class TestAntiWeb(unittest.TestCase):
         self.assertEqual(t1, t2)
 
 
+    def test_dependencies(self):
+        data_dir = DataDir("test")
+        dependencies = set()
+        generate(data_dir.get_path("other_file.c"), None, False, dependencies)
+        self.assertEqual(dependencies, set([os.path.abspath(data_dir.get_path("block1.c"))]))
+
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+import sys
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from tests.testutil import DataDir
+
+sys.path.append("..")
+
+#the asyncio interface requires Python 3.7
+if sys.version_info >= (3, 7):
+    from antiweb_lib.aio import agenerate, agenerate_many
+from antiweb_lib.document import WebError
+from antiweb_lib.write import generate
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "the asyncio interface requires Python 3.7")
+class Test_Aio(unittest.TestCase):
+
+    def setUp(self):
+        data_dir = DataDir("test")
+        self.files = [ data_dir.get_path(f) for f in ("block1.c", "block2.c", "other_file.c", "iftest2.c") ]
+
+    def test_agenerate(self):
+        dependencies = set()
+        text = asyncio.run(agenerate(self.files[2], dependencies=dependencies))
+        self.assertEqual(text, generate(self.files[2], None))
+        self.assertEqual(len(dependencies), 1)
+
+        with self.assertRaises(WebError):
+            asyncio.run(agenerate("x.py", text="#@start()\n#@include(missing)\n"))
+
+    def collect(self, executor, limit=None):
+        async def run():
+            results = []
+            async for result in agenerate_many(self.files * 3, executor=executor, limit=limit):
+                results.append(result)
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(sorted(r.fname for r in results), sorted(self.files * 3))
+        for result in results:
+            self.assertEqual(result.text, generate(result.fname, None))
+
+    def test_threads(self):
+        with ThreadPoolExecutor(4) as executor:
+            self.collect(executor, limit=3)
+
+    def test_processes(self):
+        with ProcessPoolExecutor(2) as executor:
+            self.collect(executor)
+
+    def test_cancel(self):
+        async def run():
+            async for result in agenerate_many(self.files, limit=1):
+                return result
+
+        self.assertTrue(asyncio.run(run()).ok)
+
+
+if __name__ == "__main__":
+    unittest.main()
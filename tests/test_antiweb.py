@@ -4,10 +4,12 @@
 import unittest
 from unittest.mock import patch
 from antiweb import main
+from antiweb_lib.write import _write_if_changed
 from antiweb_lib.readers.GenericReader import GenericReader
 import sys
 import os
 import shutil
+import json
 from tests.testutil import TempDir
 from tests.testutil import DataDir
 import time
@@ -120,6 +122,45 @@ class Test_Antiweb(unittest.TestCase):
         with patch.object(sys, 'argv', self.test_args):
             self.functional(self.source_dir, "small_testfile.rst", compare_path_small_testfile, main())
 
+    def test_antiweb_unchanged_output(self):
+        compare_path_small_testfile = self.data_dir.get_path("small_testfile.rst")
+        created_file = self.temp_dir.get_path(self.source_dir, "small_testfile.rst")
+        self.test_args = ['antiweb.py', self.destination_path]
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional(self.source_dir, "small_testfile.rst", compare_path_small_testfile, main())
+            os.utime(created_file, (0, 0))
+
+            #the unchanged output file is not written again
+            self.assertTrue(main())
+            self.assertEqual(os.stat(created_file).st_mtime, 0)
+
+            with open(self.destination_path) as f:
+                text = f.read()
+            with open(self.destination_path, "w") as f:
+                f.write(text.replace("test_area text", "changed text"))
+
+            self.assertTrue(main())
+            self.assertNotEqual(os.stat(created_file).st_mtime, 0)
+            self.assertFalse([ f for f in os.listdir(self.temp_dir.get_path(self.source_dir))
+                               if f.endswith(".tmp") ])
+
+    def test_write_if_changed(self):
+        out_file = self.temp_dir.get_path("written.rst")
+        self.assertTrue(_write_if_changed(out_file, "a\nb\n"))
+        self.assertFalse(_write_if_changed(out_file, "a\nb\n"))
+
+        #a file differing only in its line endings is written again
+        with open(out_file, "wb") as f:
+            f.write(b"a\r\nb\r\n" if os.linesep == "\n" else b"a\nb\n")
+        self.assertTrue(_write_if_changed(out_file, "a\nb\n"))
+        self.assertFalse(_write_if_changed(out_file, "a\nb\n"))
+
+        #the replaced file keeps its permissions
+        os.chmod(out_file, 0o640)
+        self.assertTrue(_write_if_changed(out_file, "c\n"))
+        self.assertEqual(os.stat(out_file).st_mode & 0o777, 0o640)
+
     def test_antiweb_relative_path(self):
         compare_path_small_testfile = self.data_dir.get_path("small_testfile.rst")
         self.test_args = ['antiweb.py', self.temp_dir.get_relative_path(self.destination_path)]
@@ -155,6 +196,77 @@ class Test_Antiweb(unittest.TestCase):
         with patch.object(sys, 'argv', self.test_args):
             self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
 
+    def test_antiweb_r_o_jobs(self):
+        compare_path_small_testfile = self.data_dir.get_path("docs","small_testfile.rst")
+        self.test_args = ['antiweb.py', "-o", self.temp_dir.get_path(self.doc_dir), "-r", "-j", "2",
+                          self.temp_dir.get_path()]
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
+
+    def test_antiweb_r_o_incremental(self):
+        compare_path_small_testfile = self.data_dir.get_path("docs","small_testfile.rst")
+        self.test_args = ['antiweb.py', "-o", self.temp_dir.get_path(self.doc_dir), "-r", "-i",
+                          self.temp_dir.get_path()]
+        created_file = self.temp_dir.get_path(self.doc_dir, "small_testfile.rst")
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
+            self.assertTrue(os.path.isfile(self.temp_dir.get_path(self.doc_dir, ".antiweb-manifest.json")))
+
+            #an unchanged source file is not processed again
+            os.remove(created_file)
+            with open(created_file, "w") as f:
+                f.write("unchanged")
+
+            self.assertTrue(main())
+            with open(created_file) as f:
+                self.assertEqual(f.read(), "unchanged")
+
+            #a changed source file is processed again
+            with open(self.destination_path, "a") as f:
+                f.write("\n")
+
+            self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
+
+    def test_antiweb_r_o_stats(self):
+        compare_path_small_testfile = self.data_dir.get_path("docs","small_testfile.rst")
+        stats_file = self.temp_dir.get_path("stats.json")
+        self.test_args = ['antiweb.py', "-o", self.temp_dir.get_path(self.doc_dir), "-r",
+                          "--stats-json", stats_file, self.temp_dir.get_path()]
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
+
+        with open(stats_file) as f:
+            summary = json.load(f)
+
+        self.assertEqual(summary["files"], 1)
+        self.assertEqual(summary["file_stats"][0]["file"], self.destination_path)
+        self.assertGreater(summary["lines"], 0)
+        for phase in ("walk", "read", "lex", "collect_blocks", "compile", "filter", "write"):
+            self.assertGreater(summary["phases"][phase]["total"], 0)
+
+    def test_antiweb_r_o_trace(self):
+        compare_path_small_testfile = self.data_dir.get_path("docs","small_testfile.rst")
+        trace_file = self.temp_dir.get_path("trace.json")
+        self.test_args = ['antiweb.py', "-o", self.temp_dir.get_path(self.doc_dir), "-r", "-j", "2",
+                          "--trace", trace_file, self.temp_dir.get_path()]
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional(self.doc_dir, "small_testfile.rst", compare_path_small_testfile, main())
+
+        with open(trace_file) as f:
+            events = json.load(f)["traceEvents"]
+
+        names = set(e["name"] for e in events)
+        for name in ("small_testfile.py", "walk", "read", "lex", "compile", "write", "process_name"):
+            self.assertIn(name, names)
+
+        #the file was processed by a worker process
+        file_event, = [ e for e in events if e.get("cat") == "file" ]
+        self.assertNotEqual(file_event["pid"], os.getpid())
+
     def test_antiweb_r_o_relative_path(self):
         compare_path_small_testfile = self.data_dir.get_path( "docs", "small_testfile.rst")
 
@@ -245,10 +357,12 @@ class Test_Antiweb(unittest.TestCase):
             for line in lines:
                 print(line)
 
-            #the last_line should always contain information about the ignored change of the created file
+            #the last_line should always contain information about the ignored change of the created file:
+            #the output is written to a temporary file, which replaces the created file (see _write_if_changed),
+            #so watchdog reports the change as a move to the created file instead of a modification
             last_line = lines[-1]
 
-            expected_info = "Ignored change: " + created_file + " [modified]\n"
+            expected_info = "Ignored change: " + created_file + " [moved]\n"
 
             self.assertTrue(last_line.__contains__(expected_info))
             self.assertEqual(antiweb_output, ["new_text"])
@@ -363,6 +477,13 @@ class Test_Antiweb_rst(unittest.TestCase):
         with patch.object(sys, 'argv', self.test_args):
             self.functional(self.doc_dir, "ein_rst_docs.rst", compare_path_small_testfile, main())
 
+    def test_antiweb_rst_r_jobs(self):
+        compare_path_small_testfile = self.data_dir.get_path( "docs", "ein_rst.rst")
+        self.test_args = ['antiweb.py', "-r", "-j", "2", self.temp_dir.get_path()]
+
+        with patch.object(sys, 'argv', self.test_args):
+            self.functional("", "ein_rst_docs.rst", compare_path_small_testfile, main())
+
     def test_antiweb_rst_r(self):
         compare_path_small_testfile = self.data_dir.get_path("ein_rst_docs.rst")
         self.test_args = ['antiweb.py', "-r", self.temp_dir.get_path()]
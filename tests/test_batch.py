@@ -0,0 +1,56 @@
+import sys
+import unittest
+from tests.testutil import DataDir, TempDir
+
+sys.path.append("..")
+
+from antiweb_lib.batch import generate_many
+from antiweb_lib.write import generate
+
+
+class Test_Batch(unittest.TestCase):
+
+    def setUp(self):
+        data_dir = DataDir("test")
+        self.files = [ data_dir.get_path(f) for f in ("block1.c", "block2.c", "iftest1.c", "named_end.c") ]
+
+        self.temp_dir = TempDir()
+        self.failing = self.temp_dir.get_path("failing.py")
+        with open(self.failing, "w") as f:
+            f.write("#@start()\n#@include(missing)\n")
+
+    def tearDown(self):
+        self.temp_dir.remove_tempdir()
+
+    def test_serial(self):
+        results = list(generate_many(self.files))
+        self.assertEqual([ r.fname for r in results ], self.files)
+
+        for result in results:
+            self.assertTrue(result.ok)
+            self.assertEqual(result.text, generate(result.fname, None))
+            self.assertIn("total", result.timings)
+
+    def test_errors(self):
+        result, = generate_many([self.failing], show_warnings=True)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.errors[0][1], "Cannot find text block: missing")
+
+        result, = generate_many([self.failing + ".missing"])
+        self.assertFalse(result.ok)
+        self.assertTrue(result.messages)
+
+    def test_jobs(self):
+        results = sorted(generate_many(self.files + [self.failing], jobs=2), key=lambda r: r.fname)
+        expected = sorted(self.files + [self.failing])
+        self.assertEqual([ r.fname for r in results ], expected)
+
+        for result in results:
+            if result.fname == self.failing:
+                self.assertFalse(result.ok)
+            else:
+                self.assertEqual(result.text, generate(result.fname, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import sys
+import json
+import unittest
+
+sys.path.append("..")
+
+from antiweb_lib.write import generate_from_text
+from benchmarks.corpus import CorpusSpec, generate_source, generate_corpus, languages
+from benchmarks import runner, scaling, compare
+from tests.testutil import TempDir
+
+
+def _results(runs):
+    #benchmark results with a single benchmark and stage
+    return { "benchmarks" : { "b" : { "stages" : { "write" : {
+                 "median" : sorted(runs)[len(runs) // 2], "stdev" : 0.0, "runs" : runs } } } } }
+
+
+class Test_Benchmarks(unittest.TestCase):
+
+    def test_generate_source(self):
+        spec = CorpusSpec("python", lines=500, blocks=13, depth=3, fanout=3, macro_density=0.5)
+        text = generate_source(spec)
+
+        #the generator is deterministic
+        self.assertEqual(text, generate_source(spec))
+        self.assertNotEqual(text, generate_source(CorpusSpec("python", lines=500, blocks=13, depth=3,
+                                                             fanout=3, macro_density=0.5, seed=1)))
+
+        self.assertEqual(text.count("#@start("), 13 + 2)
+        self.assertIn("    #@start(b1)", text)
+        self.assertIn("        #@start(b2)", text)
+        self.assertIn("@subst(m", text)
+        self.assertAlmostEqual(len(text.splitlines()), 500, delta=50)
+
+    def test_languages(self):
+        temp_dir = TempDir()
+        self.addCleanup(temp_dir.remove_tempdir)
+
+        for language in languages:
+            spec = CorpusSpec(language, lines=200, blocks=7, depth=2, fanout=2,
+                              cross_files=1, macro_density=0.2, files=2)
+            fname = generate_corpus(spec, temp_dir.get_path())[0]
+
+            with open(fname) as f:
+                output = generate_from_text(f.read(), fname)
+
+            #all blocks of the file and the included block of the other file are in the output
+            for block in ("Block b0", "Block b6", "macro m"):
+                self.assertIn(block, output, language)
+            self.assertEqual(output.count("Block b0"), 2, language)
+
+    def test_run_benchmark(self):
+        result = runner.run_benchmark(CorpusSpec("c", lines=100, blocks=5), repeat=2)
+
+        self.assertEqual(set(result["stages"]), set(runner.stages))
+        self.assertEqual(len(result["stages"]["write"]["runs"]), 2)
+        self.assertGreater(result["lines_per_second"], 0)
+        self.assertEqual(result["spec"]["language"], "c")
+
+    def test_fit_exponent(self):
+        sizes = [1000, 10000, 100000]
+        self.assertAlmostEqual(scaling.fit_exponent(sizes, [ 1e-8 * n * n for n in sizes ]), 2.0)
+        self.assertAlmostEqual(scaling.fit_exponent(sizes, [ 1e-5 * n for n in sizes ]), 1.0)
+        #runs below a millisecond are not used
+        self.assertIsNone(scaling.fit_exponent(sizes, [ 1e-8 * n for n in sizes ]))
+
+    def test_run_scaling(self):
+        results = scaling.run_scaling(["directives"], (500, 1000), ("process", "compile_block"),
+                                      bound=5, stage_bounds={ "process" : 0.1 }, repeat=1)
+
+        stage_results = results["patterns"]["directives"]
+        self.assertEqual(stage_results["compile_block"]["sizes"], [500, 1000])
+        self.assertEqual(stage_results["compile_block"]["bound"], 5)
+        self.assertTrue(stage_results["compile_block"]["ok"])
+        #lexing is linear, more than the bound of 0.1
+        self.assertFalse(stage_results["process"]["ok"])
+        self.assertFalse(results["ok"])
+        self.assertIn("FAILED", scaling.format_results(results))
+
+    def test_compare(self):
+        baseline = _results([1.0, 1.01, 0.99, 1.0, 1.02])
+
+        row, = compare.compare(baseline, _results([1.2, 1.21, 1.19, 1.2, 1.2]))
+        self.assertEqual(row["status"], "regressed")
+        self.assertAlmostEqual(row["delta"], 0.2)
+
+        row, = compare.compare(baseline, _results([1.05, 1.04, 1.05, 1.06, 1.05]))
+        self.assertEqual(row["status"], "ok")
+
+        row, = compare.compare(baseline, _results([0.5, 0.5, 0.5, 0.5, 0.5]))
+        self.assertEqual(row["status"], "faster")
+
+        #a noisy run needs a larger slowdown
+        row, = compare.compare(baseline, _results([1.2, 0.9, 1.5, 1.0, 1.4]))
+        self.assertEqual(row["status"], "ok")
+        self.assertGreater(row["limit"], 0.2)
+
+        rows = compare.compare(baseline, { "benchmarks" : {} })
+        self.assertEqual(rows[0]["status"], "missing")
+
+        #a baseline with only the medians
+        baseline = { "benchmarks" : { "b" : { "stages" : { "write" : { "median" : 1.0 } } } } }
+        row, = compare.compare(baseline, _results([1.2] * 5))
+        self.assertEqual(row["status"], "regressed")
+
+    def test_compare_main(self):
+        temp_dir = TempDir()
+        self.addCleanup(temp_dir.remove_tempdir)
+
+        files = {}
+        for name, runs in (("base", [1.0] * 5), ("same", [1.01] * 5), ("slow", [1.5] * 5)):
+            files[name] = temp_dir.get_path(name + ".json")
+            with open(files[name], "w") as f:
+                json.dump(_results(runs), f)
+
+        self.assertEqual(compare.main([files["same"], files["base"]]), 0)
+        self.assertEqual(compare.main([files["slow"], files["base"]]), 1)
+        self.assertEqual(compare.main([files["slow"], temp_dir.get_path("missing.json")]), 2)
+        #there is no default baseline
+        self.assertEqual(compare.main([files["same"]]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
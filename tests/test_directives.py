@@ -0,0 +1,145 @@
+import os
+import sys
+import unittest
+from tests.testutil import DataDir
+
+sys.path.append("..")
+
+from antiweb_lib.directives import Start
+from antiweb_lib.document import WebError
+from antiweb_lib.readers.config import create_reader
+from antiweb_lib.write import generate_from_text
+
+
+def _parse(fname, text):
+    return create_reader(fname).process(fname, text)
+
+
+def _starts(lines):
+    return [ (i, d) for i, l in enumerate(lines) for d in l.directives if isinstance(d, Start) ]
+
+
+class Test_Directives(unittest.TestCase):
+
+    def test_resolve_blocks(self):
+        lines = _parse("test.py", "\n".join([
+            "#@start()",               #0
+            "#@include(a)",            #1
+            "    #@start(a)",          #2
+            "    #a",                  #3
+            "        #@start(b)",      #4
+            "        #b",              #5
+            "    #@(a)",               #6
+            "#@start(c)",              #7
+            "#c",                      #8
+            "    #@start(d)",          #9
+            "    #d",                  #10
+            "    #@",                  #11
+            "#c",                      #12
+            "#@cstart(e)",             #13
+            "x = 1",                   #14
+            "def f():",                #15
+            "    #@start(f)",          #16
+            "    #f",                  #17
+            "x = 2" ]))
+
+        ends = dict((d.name, d.end_line) for i, d in _starts(lines))
+        self.assertEqual(ends, { "" : 7, "a" : 6, "b" : 6, "c" : 13, "d" : 11,
+                                 "e" : 19, "f" : 18 })
+
+        #the directive ending the block, None for the end of the file and a line without directives
+        self.assertIs(lines[2].directive.end_directive, lines[6].directive)
+        self.assertIs(lines[9].directive.end_directive, lines[11].directive)
+        self.assertIs(lines[0].directive.end_directive, lines[7].directive)
+        self.assertIsNone(lines[16].directive.end_directive)
+        self.assertIsNone(lines[13].directive.end_directive)
+
+        self.assertTrue(lines[2].directive.has_named_end)
+        self.assertFalse(lines[4].directive.has_named_end)
+        self.assertEqual(lines[6].directive.start_line, 2)
+
+    def test_same_as_scan(self):
+        data_dir = DataDir("test")
+        for name in sorted(os.listdir(data_dir.get_path())):
+            if not name.endswith(".c"):
+                continue
+
+            with open(data_dir.get_path(name)) as f:
+                lines = _parse(name, f.read())
+
+            for index, start in _starts(lines):
+                self.assertEqual(start.end_line, start._find_matching_end(lines, index),
+                                 "%s: %r" % (name, start))
+
+    def test_nested_block_with_if(self):
+        #the @if removes lines of the nested block, before the block is removed
+        text = "\n".join([ "#@start()", "#doc", "    #@start(b)", "    #@if(x)", "    #hidden",
+                           "    #@fi(x)", "    #b", "    #@", "#tail", "#@include(b)", "" ])
+        output = generate_from_text(text, "test.py")
+        self.assertEqual(output.split(), ["doc", "tail", "b"])
+
+    def test_pair_directives(self):
+        lines = _parse("test.py", "\n".join([
+            "#@if(a)",                 #0
+            "#@if(b)",                 #1
+            "#@fi(b)",                 #2
+            "#@fi(a)",                 #3
+            "#@if(c)",                 #4
+            "#@subst(m)",              #5
+            "#@fi(c)",                 #6
+            "#@define(m)",             #7
+            "#@subst(x)",              #8
+            "#@enifed(m)",             #9
+            "#@define(n, inline)",     #10
+            "#@if(d)" ]))
+
+        self.assertEqual(lines[0].directive.closing, (3, lines[3].directive))
+        self.assertEqual(lines[1].directive.closing, (1, lines[2].directive))
+        #the substitution may change the lines before the @if is processed
+        self.assertIsNone(lines[4].directive.closing)
+        self.assertEqual(lines[7].directive.closing, (2, lines[9].directive))
+        self.assertIsNone(lines[10].directive.closing)
+        self.assertIsNone(lines[11].directive.closing)
+
+    def test_pair_nested_blocks(self):
+        lines = _parse("test.py", "\n".join([
+            "#@start(a)",              #0
+            "#@if(y)",                 #1
+            "#@start(b)",              #2
+            "#@fi(y)",                 #3
+            "#@(b)",                   #4
+            "#@fi(y)",                 #5
+            "#@(a)" ]))                #6
+
+        #the lines of block b are not part of the enclosing block
+        self.assertEqual(lines[1].directive.closing, (4, lines[5].directive))
+
+    def test_recursive_include(self):
+        #the nested compile of the block continues the compile of the including block
+        text = "\n".join([ "#@start()", "#@include(a)", "", "#@start(a)", "#@indent 2",
+                           "#@include(a)", "#@include(missing)", "#@(a)", "" ])
+        with self.assertRaises(WebError) as cm:
+            generate_from_text(text, "test.py")
+
+        errors = [ text for line, text in cm.exception.error_list ]
+        self.assertEqual(errors, ["Cannot find text block: missing"])
+
+    def test_unclosed_reported(self):
+        #the @fi is part of the nested block b
+        text = "\n".join([ "#@start()", "#doc", "#@if(y)", "#shown if y",
+                           "#@start(b)", "#@fi(y)", "#@(b)", "#tail", "" ])
+        with self.assertRaises(WebError) as cm:
+            generate_from_text(text, "test.py")
+
+        errors = [ text for line, text in cm.exception.error_list ]
+        self.assertEqual(errors, ["No fi for if y"])
+
+    def test_unclosed_not_compiled(self):
+        #only directives of compiled blocks are reported
+        text = "\n".join([ "#use @if(debug) to hide code", "#@start()", "#text",
+                           "#@start(unused)", "#@if(a)", "#@define(M)", "#@", "" ])
+        self.assertIn("text", generate_from_text(text, "test.py"))
+
+
+if __name__ == "__main__":
+    unittest.main()
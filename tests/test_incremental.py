@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import time
+from antiweb import main
+from antiweb_lib.depgraph import DependencyGraph
+from tests.testutil import TempDir
+
+sys.path.append("..")
+
+
+class Test_DependencyGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = DependencyGraph()
+        self.graph.add("a.py", ["b.py", "c.py"])
+        self.graph.add("b.py", ["c.py"])
+        self.graph.add("d.py", ["a.py"])
+
+    def test_dependents(self):
+        self.assertEqual(self.graph.dependents(["c.py"]), set(["a.py", "b.py", "d.py"]))
+        self.assertEqual(self.graph.dependents(["a.py"]), set(["d.py"]))
+        self.assertEqual(self.graph.dependents(["d.py"]), set())
+
+    def test_replace(self):
+        self.graph.add("a.py", ["b.py"])
+        self.assertEqual(self.graph.dependents(["c.py"]), set(["b.py", "a.py", "d.py"]))
+
+        self.graph.remove("b.py")
+        self.graph.remove("a.py")
+        self.assertEqual(self.graph.dependents(["c.py"]), set())
+        self.assertEqual(self.graph.files(), set(["a.py"]))
+
+    def test_persistence(self):
+        graph = DependencyGraph(self.graph.to_dict())
+        self.assertEqual(graph.to_dict(), self.graph.to_dict())
+        self.assertEqual(graph.dependents(["c.py"]), set(["a.py", "b.py", "d.py"]))
+
+
+class Test_Incremental(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        self.write_source("main.py", "#@start()\n#main\n#@include(common doc, common.py)\n")
+        self.write_source("other.py", "#@start()\n#other\n")
+        self.write_source("common.py", "#@start()\n#@include(common doc)\n#@start(common doc)\n#common 1\n")
+        self.test_args = ['antiweb.py', "-r", "-i", "-o", self.temp_dir.get_path("docs"),
+                          self.temp_dir.get_path()]
+
+    def write_source(self, name, text):
+        with open(self.temp_dir.get_path(name), "w") as f:
+            f.write(text)
+
+    def output_mtimes(self):
+        return { name : os.stat(self.temp_dir.get_path("docs", name)).st_mtime_ns
+                 for name in ("main.rst", "other.rst", "common.rst") }
+
+    def test_include_invalidation(self):
+        with patch.object(sys, 'argv', self.test_args):
+            self.assertTrue(main())
+            before = self.output_mtimes()
+
+            time.sleep(0.01)
+            self.write_source("common.py", "#@start()\n#@include(common doc)\n#@start(common doc)\n#common 2\n")
+            self.assertTrue(main())
+            after = self.output_mtimes()
+
+        self.assertNotEqual(before["main.rst"], after["main.rst"])
+        self.assertNotEqual(before["common.rst"], after["common.rst"])
+        self.assertEqual(before["other.rst"], after["other.rst"])
+
+        with open(self.temp_dir.get_path("docs", "main.rst")) as f:
+            self.assertIn("common 2", f.read())
+
+    def tearDown(self):
+        self.temp_dir.remove_tempdir()
+
+
+if __name__ == '__main__':
+    unittest.main()
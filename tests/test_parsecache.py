@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+from tests.testutil import DataDir, TempDir
+
+sys.path.append("..")
+
+from antiweb_lib import parsecache
+from antiweb_lib.parsecache import ParseCache
+from antiweb_lib.readers.config import create_reader
+from antiweb_lib.write import generate
+
+
+class Options(object):
+    def __init__(self, cache_dir, cache_size=None):
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+
+
+class Test_ParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        self.data_dir = DataDir("test")
+
+    def tearDown(self):
+        parsecache.configure(None)
+        self.temp_dir.remove_tempdir()
+
+    def cache_files(self):
+        return [ f for f in os.listdir(self.temp_dir.get_path()) if f.endswith(ParseCache.suffix) ]
+
+    def test_cached_output(self):
+        cache = parsecache.configure(Options(self.temp_dir.get_path()))
+
+        for name in ("block1.c", "code_prefix.c", "complex_macro.c", "named_end.c"):
+            fname = self.data_dir.get_path(name)
+            uncached = generate(fname, None)
+            self.assertEqual(generate(fname, None), uncached)
+
+        self.assertEqual(cache.misses, 4)
+        self.assertEqual(cache.hits, 4)
+        self.assertEqual(len(self.cache_files()), 4)
+
+        #a new cache object loads the entries from disk
+        cache = parsecache.configure(Options(self.temp_dir.get_path()))
+        generate(self.data_dir.get_path("block1.c"), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_eviction(self):
+        cache = parsecache.configure(Options(self.temp_dir.get_path()))
+        for name in ("block1.c", "block2.c", "block3.c"):
+            generate(self.data_dir.get_path(name), None)
+
+        sizes = [ os.path.getsize(self.temp_dir.get_path(f)) for f in self.cache_files() ]
+        cache.budget = sum(sizes) - 1
+        cache.evict()
+        self.assertEqual(len(self.cache_files()), 2)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "no owner uids")
+    def test_untrusted_entries(self):
+        cache_dir = self.temp_dir.get_path()
+        fname = self.data_dir.get_path("block1.c")
+        cache = parsecache.configure(Options(cache_dir))
+        generate(fname, None)
+        entry = self.temp_dir.get_path(self.cache_files()[0])
+        self.assertEqual(os.stat(entry).st_mode & 0o777, 0o600)
+
+        #an entry writable by others is not loaded
+        os.chmod(entry, 0o666)
+        with self.assertLogs("antiweb", "WARNING"):
+            generate(fname, None)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        #a cache directory writable by others is not used
+        generate(fname, None)
+        self.assertEqual(cache.hits, 1)
+        os.chmod(cache_dir, 0o777)
+        with self.assertLogs("antiweb", "WARNING"):
+            generate(fname, None)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_key(self):
+        cache = ParseCache(self.temp_dir.get_path())
+        java, js = create_reader("a.java"), create_reader("a.js")
+
+        #both languages use the generic reader with the comment markers of C
+        self.assertIs(java.__class__, js.__class__)
+        self.assertEqual(java.block_comment_markers, js.block_comment_markers)
+        self.assertNotEqual(cache.key(java, "int x;"), cache.key(js, "int x;"))
+        self.assertEqual(cache.key(java, "int x;"), cache.key(create_reader("b.java"), "int x;"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import pstats
+import unittest
+from tests.testutil import TempDir, DataDir
+
+sys.path.append("..")
+
+from antiweb_lib.profiler import Profiler, code_group
+from antiweb_lib.write import generate
+
+
+class Test_Profiler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        self.source = DataDir("test").get_path("other_file.c")
+
+    def tearDown(self):
+        self.temp_dir.remove_tempdir()
+
+    def test_code_group(self):
+        self.assertEqual(code_group(os.path.join("x", "antiweb_lib", "document.py")), "antiweb")
+        self.assertEqual(code_group("/x/antiweb.py"), "antiweb")
+        self.assertEqual(code_group("/site-packages/pygments/lexer.py"), "pygments")
+        self.assertEqual(code_group("/usr/lib/python3/os.py"), "other")
+        self.assertEqual(code_group("~"), "other")
+
+    def test_pstats(self):
+        output = self.temp_dir.get_path("profile.prof")
+        profiler = Profiler(output)
+        profiler.start()
+        generate(self.source, None)
+        profiler.stop()
+
+        report = profiler.report()
+        self.assertIn("antiweb functions by own ms", report)
+        self.assertIn("compile_block", report)
+        self.assertTrue(pstats.Stats(output).stats)
+
+    def test_collapsed(self):
+        output = self.temp_dir.get_path("profile.folded")
+        profiler = Profiler(output)
+        profiler.start()
+        for i in range(20):
+            generate(self.source, None)
+        profiler.stop()
+
+        profiler.report()
+        with open(output) as f:
+            lines = f.read().splitlines()
+
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import sys
+import pickle
+import unittest
+import pygments.lexers as pm
+
+sys.path.append("..")
+
+from antiweb_lib.readers import config
+from antiweb_lib.readers.config import get_language, create_reader
+from antiweb_lib.readers.Reader import Reader
+from antiweb_lib.readers.Line import Line
+from antiweb_lib.readers.PythonReader import PythonReader
+from antiweb_lib.readers.CSharpReader import CSharpReader
+
+
+class Test_Readers(unittest.TestCase):
+
+    def test_same_as_pygments(self):
+        for fname in ("a.py", "b.cs", "c.cpp", "d.cc", "e.rst", "f.xml", "g.c", "h.clj",
+                      "CMakeLists.txt", "notes.txt", "Makefile"):
+            self.assertEqual(get_language(fname).lexer.name, pm.get_lexer_for_filename(fname).name)
+
+    def test_cache(self):
+        language = get_language("/x/y/a.py")
+        self.assertIs(get_language("b.py"), language)
+        self.assertIs(language.reader_class, PythonReader)
+        self.assertIs(get_language("x.cs").reader_class, CSharpReader)
+        self.assertIs(get_language("x.txt").reader_class, Reader)
+        #a special file name does not share the language of its extension
+        self.assertIsNot(get_language("CMakeLists.txt"), get_language("x.txt"))
+
+    def test_create_reader(self):
+        r1 = create_reader("a.py")
+        r2 = create_reader("b.py")
+        self.assertIsNot(r1, r2)
+        self.assertIs(r1.lexer, r2.lexer)
+        self.assertEqual(r1.single_comment_markers, ["#"])
+
+    def test_override(self):
+        config.lexer_overrides[".foo"] = "python"
+        try:
+            self.assertIs(get_language("a.foo").reader_class, PythonReader)
+        finally:
+            del config.lexer_overrides[".foo"]
+            config._languages.pop(".foo", None)
+
+    def test_line_indent(self):
+        line = Line("a.py", 0, "\f  text ")
+
+        #the clones share the source text until the text is read
+        clone = line.clone().change_indent(4).clone().change_indent(-5).clone().change_indent(2)
+        self.assertEqual(clone.indent, 4)
+        self.assertEqual(len(clone), 4)
+        self.assertIs(clone._source, line._source)
+        self.assertEqual(clone.text, "    text ")
+        self.assertEqual(line.text, "\f  text ")
+
+        #the same results as changing the text at once
+        text = line.text
+        for delta in (4, -5, 2):
+            text = text[min(-delta, len(text) - len(text.lstrip())):] if delta < 0 else " "*delta + text
+        self.assertEqual(clone.text, text)
+
+        clone = line.clone().change_indent(-1)
+        self.assertEqual(clone.like("x").text, "  x")
+        self.assertEqual(pickle.loads(pickle.dumps(clone)).text, "  text ")
+
+        clone.text = "  new"
+        self.assertEqual(clone.clone().change_indent(1).text, "   new")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+from tests.testutil import TempDir
+
+sys.path.append("..")
+
+from antiweb_lib.scanner import scan, check_file
+
+
+class Test_Scanner(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        for name in ("a.py", "b.rst", "c.txt", os.path.join("sub", "d.cs"), os.path.join("sub", "e.rst"),
+                     os.path.join(".git", "f.py"), os.path.join("build", "g.py"),
+                     os.path.join("node_modules", "x", "h.py"), os.path.join("generated", "i.py")):
+            path = self.temp_dir.get_path(name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            with open(path, "w") as f:
+                f.write("")
+
+    def tearDown(self):
+        self.temp_dir.remove_tempdir()
+
+    def scan(self, ignore=()):
+        directory = self.temp_dir.get_path()
+        return [ os.path.relpath(f, directory) for f in scan(directory, (".py", ".cs", ".rst"), ignore) ]
+
+    def test_scan(self):
+        self.assertEqual(self.scan(), ["a.py", os.path.join("generated", "i.py"), os.path.join("sub", "d.cs"),
+                                       "b.rst", os.path.join("sub", "e.rst")])
+
+    def test_ignore(self):
+        self.assertEqual(self.scan(["generated", "*.cs"]), ["a.py", "b.rst", os.path.join("sub", "e.rst")])
+        self.assertEqual(self.scan([os.path.join("sub", "*")]), ["a.py", os.path.join("generated", "i.py"), "b.rst"])
+
+    def write(self, name, content):
+        path = self.temp_dir.get_path(name)
+        with open(path, "wb") as f:
+            f.write(content)
+
+        return path
+
+    def test_check_file(self):
+        self.assertIsNone(check_file(self.write("a.py", b"#@start()\n\"\"\"x\"\"\""), 1000))
+        self.assertIsNone(check_file(self.write("b.rst", b".. @rstart()\nx"), 1000))
+        self.assertIsNone(check_file(self.write("c.cs", b"//@cstart(x)\n"), 1000))
+        self.assertEqual(check_file(self.write("a.py", b"print('no directive')\n"), 1000), "no directives")
+        self.assertEqual(check_file(self.write("a.py", b""), 1000), "no directives")
+        self.assertEqual(check_file(self.write("a.py", b"#@start()\n\0\1"), 1000), "binary")
+        self.assertEqual(check_file(self.write("a.py", b"#@start()\n" + b"x" * 1000), 1000), "too large")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import sys
+import random
+import unittest
+
+sys.path.append("..")
+
+from antiweb_lib.directives import Directive
+from antiweb_lib.readers.Line import Line
+from antiweb_lib.scheduler import ScheduledBlock
+
+
+class Splice(Directive):
+    #records its processing and applies a change to the block
+    def __init__(self, name, priority, change=None):
+        super(Splice, self).__init__(0)
+        self.name = name
+        self.priority = priority
+        self.change = change
+
+    def process(self, document, block, index):
+        document.append(self.name)
+        if self.change:
+            self.change(block, index)
+
+
+def _line(text, *directives):
+    return Line("test", 0, text, list(directives))
+
+
+def _reference_order(block):
+    #the order of the former linear search: the first line with the lowest priority
+    order = []
+    while True:
+        lines = [ (line.directives[0].priority, i) for i, line in enumerate(block) if line.directives ]
+        if not lines:
+            return order
+
+        priority, index = min(lines)
+        directive = block[index].directives.pop(0)
+        directive.process(order, block, index)
+
+
+def _scheduled_order(block):
+    order = []
+    scheduled = ScheduledBlock(block)
+    while True:
+        next_directive = scheduled.pop_directive()
+        if next_directive is None:
+            break
+
+        directive, index = next_directive
+        directive.process(order, scheduled, index)
+
+    block[:] = scheduled
+    return order
+
+
+class Test_Scheduler(unittest.TestCase):
+
+    def check(self, make_block):
+        reference = make_block()
+        scheduled = make_block()
+        self.assertEqual(_scheduled_order(scheduled), _reference_order(reference))
+        self.assertEqual([ l.text for l in scheduled ], [ l.text for l in reference ])
+
+    def test_priority_order(self):
+        def make_block():
+            return [ _line("a", Splice("a", 10)),
+                     _line("b", Splice("b1", 5), Splice("b2", 10)),
+                     _line("c"),
+                     _line("d", Splice("d", 2)),
+                     _line("e", Splice("e", 5)) ]
+
+        block = make_block()
+        self.assertEqual(_scheduled_order(block), ["d", "b1", "e", "a", "b2"])
+        self.check(make_block)
+
+    def test_inserted_directives(self):
+        def include(block, index):
+            #like an include: replaces the line by lines with directives
+            block[index:index+1] = [ _line("i1", Splice("i1", 2)), _line("i2"),
+                                     _line("i3", Splice("i3", 10)) ]
+
+        def make_block():
+            return [ _line("a", Splice("a", 10)),
+                     _line("b", Splice("b", 5, include)),
+                     _line("c", Splice("c", 10)) ]
+
+        self.assertEqual(_scheduled_order(make_block()), ["b", "i1", "a", "i3", "c"])
+        self.check(make_block)
+
+    def test_removed_lines(self):
+        def remove_next(block, index):
+            del block[index:index+2]
+
+        def make_block():
+            return [ _line("a", Splice("a", 10)),
+                     _line("b", Splice("b", 5, remove_next)),
+                     _line("c", Splice("c", 2)),
+                     _line("d", Splice("d", 10)) ]
+
+        #c is processed before b removes it
+        self.assertEqual(_scheduled_order(make_block()), ["c", "b", "a", "d"])
+
+        def make_block():
+            return [ _line("a", Splice("a", 10)),
+                     _line("b", Splice("b", 5, remove_next)),
+                     _line("c", Splice("c", 10)),
+                     _line("d", Splice("d", 10)) ]
+
+        self.assertEqual(_scheduled_order(make_block()), ["b", "a", "d"])
+        self.check(make_block)
+
+    def test_list_operations(self):
+        block = ScheduledBlock([ _line(str(i), Splice(str(i), 10)) for i in range(5) ])
+
+        block.insert(0, _line("x", Splice("x", 10)))
+        block.append(_line("y", Splice("y", 10)))
+        block[2] = _line("z", Splice("z", 10))
+        del block[-2]
+        block.extend([ _line("w", Splice("w", 1)) ])
+        block[::2] = block[::2]
+        self.assertEqual((block.inserted_lines, block.removed_lines), (8, 6))
+
+        texts = []
+        while True:
+            next_directive = block.pop_directive()
+            if next_directive is None:
+                break
+
+            directive, index = next_directive
+            texts.append(block[index].text)
+
+        self.assertEqual(texts, ["w", "x", "0", "z", "2", "3", "y"])
+        keys = block._before_keys + block._after_keys[block._head:]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_find_directive(self):
+        directives = [ Splice(str(i), 10) for i in range(5) ]
+        block = ScheduledBlock([ _line(str(i), d) for i, d in enumerate(directives) ])
+
+        del block[1]
+        block[0:1] = [ _line("x"), _line("y") ]
+        self.assertEqual(block.find_directive(directives[3]), 3)
+        self.assertIsNone(block.find_directive(directives[1]))
+
+        #a processed directive is not pending anymore
+        self.assertEqual(block.pop_directive(), (directives[2], 2))
+        self.assertIsNone(block.find_directive(directives[2]))
+        self.assertEqual(block.find_directive(directives[4]), 4)
+
+    def test_cloned_lines(self):
+        def clone_tail(block, index):
+            #like the former @indent: replaces the line and the following lines by their clones
+            block[index:] = [ l.clone() for l in block[index+1:] ]
+
+        scheduled = ScheduledBlock([ _line(str(i), Splice(str(i), 10, clone_tail))
+                                     for i in range(100) ])
+        order = []
+        while True:
+            next_directive = scheduled.pop_directive()
+            if next_directive is None:
+                break
+
+            directive, index = next_directive
+            directive.process(order, scheduled, index)
+
+        self.assertEqual(order, [ str(i) for i in range(100) ])
+        #the clones have the same pending directives, they are not scheduled again
+        self.assertEqual(len(scheduled._heap), 0)
+        self.assertEqual(scheduled._count, 100)
+
+    def test_random_splices(self):
+        def make_change(rnd, depth):
+            def change(block, index):
+                kind = rnd.choice(["replace", "insert", "delete", "append", "pop", "clone",
+                                   "indent", "like"])
+                if kind == "replace":
+                    block[index:index+1] = make_lines(rnd, depth + 1, rnd.randint(0, 3))
+                elif kind == "insert":
+                    block[index+1:index+1] = make_lines(rnd, depth + 1, rnd.randint(1, 3))
+                elif kind == "delete":
+                    del block[index:index+rnd.randint(1, 3)]
+                elif kind == "append":
+                    block.extend(make_lines(rnd, depth + 1, 1))
+                elif kind == "clone":
+                    #like the former @indent: replaces the following lines by their clones
+                    block[index:] = [ l.clone() for l in block[index+1:] ]
+                elif kind == "indent":
+                    delta = rnd.choice([-8, -2, 2, 4])
+                    if isinstance(block, ScheduledBlock):
+                        del block[index]
+                        block.change_indent(index, delta)
+                    else:
+                        block[index:] = [ l.clone().change_indent(delta) for l in block[index+1:] ]
+                elif kind == "like":
+                    #reads the indentation of the line
+                    block[index] = block[index].like("like")
+                else:
+                    block.pop(index)
+            return change
+
+        def make_lines(rnd, depth, count):
+            lines = []
+            for i in range(count):
+                directives = [ Splice("%i.%i" % (depth, rnd.randint(0, 10**6)),
+                                      rnd.choice([1, 2, 4, 5, 10]),
+                                      make_change(rnd, depth) if depth < 4 and rnd.random() < 0.5 else None)
+                               for j in range(rnd.randint(0, 2)) ]
+                lines.append(_line(rnd.choice(["", "  ", "    ", "\t"]) + "line", *directives))
+            return lines
+
+        for seed in range(100):
+            self.check(lambda: make_lines(random.Random(seed), 0, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import socket
+import sys
+import shutil
+import threading
+import unittest
+from unittest.mock import patch
+from optparse import Values
+from tests.testutil import TempDir, DataDir
+
+sys.path.append("..")
+
+from antiweb_lib.server import AntiwebServer
+from antiweb_lib.client import send_requests, main as client_main
+from antiweb_lib.write import generate
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "unix sockets are required")
+class Test_Server(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        data_dir = DataDir("test")
+        for name in ("other_file.c", "block1.c"):
+            shutil.copy(data_dir.get_path(name), self.temp_dir.get_path(name))
+
+        self.socket_path = self.temp_dir.get_path("antiweb.sock")
+        options = Values({ "output" : "", "token" : None, "warnings" : True, "recursive" : False })
+        self.server = AntiwebServer(self.socket_path, options)
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        while not self.server.shutdown_requested:
+            self.server.handle_request()
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            send_requests(self.socket_path, [{ "command" : "shutdown" }], timeout=10)
+
+        self.thread.join()
+        self.server.server_close()
+        self.temp_dir.remove_tempdir()
+
+    def test_requests(self):
+        source = self.temp_dir.get_path("other_file.c")
+        output = self.temp_dir.get_path("docs", "other.rst")
+
+        responses = send_requests(self.socket_path, [{ "command" : "ping" },
+                                                     { "command" : "generate", "file" : source, "output" : output },
+                                                     { "command" : "generate", "file" : "relative.c" },
+                                                     { "command" : "unknown" }], timeout=10)
+
+        self.assertEqual([ r["ok"] for r in responses ], [True, True, False, False])
+        self.assertEqual(responses[1]["output"], output)
+
+        with open(output) as f:
+            self.assertEqual(f.read(), generate(source, None))
+
+    def test_failed_request(self):
+        source = self.temp_dir.get_path("other_file.c")
+        with patch("antiweb_lib.server.write", side_effect=RuntimeError("reader failed")):
+            response, = send_requests(self.socket_path, [{ "command" : "generate", "file" : source }],
+                                      timeout=10)
+
+        self.assertEqual(response["ok"], False)
+        self.assertEqual(response["error"], "RuntimeError: reader failed")
+
+        #a file name of a wrong type
+        response, = send_requests(self.socket_path, [{ "command" : "generate", "file" : 5 }], timeout=10)
+        self.assertEqual(response["ok"], False)
+
+        #the server keeps running
+        self.assertTrue(send_requests(self.socket_path, [{ "command" : "ping" }], timeout=10)[0]["ok"])
+
+    def test_client(self):
+        source = self.temp_dir.get_path("other_file.c")
+        self.assertEqual(client_main(["-s", self.socket_path, source]), 0)
+        self.assertTrue(os.path.isfile(self.temp_dir.get_path("other_file.rst")))
+
+        self.assertEqual(client_main(["-s", self.socket_path, self.temp_dir.get_path("missing.c")]), 1)
+        self.assertEqual(client_main(["-s", self.temp_dir.get_path("no.sock"), source]), 2)
+
+    def test_socket_path(self):
+        options = Values({})
+
+        #the socket of the running server is kept
+        with self.assertRaises(OSError):
+            AntiwebServer(self.socket_path, options)
+        self.assertTrue(send_requests(self.socket_path, [{ "command" : "ping" }], timeout=10)[0]["ok"])
+
+        #a file, which is not a socket, is kept
+        other_file = self.temp_dir.get_path("block1.c")
+        with self.assertRaises(OSError):
+            AntiwebServer(other_file, options)
+        self.assertTrue(os.path.isfile(other_file))
+
+        #the socket of a stopped server is replaced
+        stale_path = self.temp_dir.get_path("stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+
+        server = AntiwebServer(stale_path, options)
+        server.server_close()
+        self.assertFalse(os.path.exists(stale_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import sys
+import time
+import unittest
+import tracemalloc
+
+sys.path.append("..")
+
+from antiweb_lib import stats
+from antiweb_lib.stats import BuildStats
+from antiweb_lib.write import generate_from_text
+
+
+class Test_Stats(unittest.TestCase):
+
+    def tearDown(self):
+        stats.disable()
+
+    def test_disabled(self):
+        with stats.phase("compile"), stats.file("a.py"):
+            stats.count_lines(10)
+
+        self.assertIsNone(stats.get_recorder())
+
+    def test_nested_phases(self):
+        recorder = stats.enable()
+
+        with stats.phase("walk"):
+            time.sleep(0.01)
+
+        with stats.file("a.py"):
+            stats.count_lines(10)
+            with stats.phase("compile"):
+                time.sleep(0.01)
+                #the nested phase is not part of the enclosing phase
+                with stats.phase("lex"):
+                    time.sleep(0.03)
+
+        self.assertEqual(len(recorder.files), 1)
+        file_stats = recorder.files[0]
+        self.assertEqual(file_stats.lines, 10)
+        self.assertGreaterEqual(file_stats.phases["lex"], 0.03)
+        self.assertLess(file_stats.phases["compile"], 0.03)
+        self.assertNotIn("walk", file_stats.phases)
+        self.assertGreaterEqual(recorder.phases["walk"], 0.01)
+
+    def test_summary(self):
+        recorder = BuildStats()
+        for i in range(1, 101):
+            with recorder.file("%i.py" % i) as file_stats:
+                file_stats.phases["lex"] = i / 1000.0
+                file_stats.lines = i
+
+        summary = recorder.summary()
+        self.assertEqual(summary["files"], 100)
+        self.assertEqual(summary["lines"], 5050)
+        self.assertAlmostEqual(summary["phases"]["lex"]["p50"], 0.05)
+        self.assertAlmostEqual(summary["phases"]["lex"]["p95"], 0.095)
+        self.assertAlmostEqual(summary["phases"]["lex"]["max"], 0.1)
+        self.assertAlmostEqual(summary["phases"]["lex"]["total"], 5.05)
+        self.assertIn("lex", recorder.report(summary))
+
+    def test_trace(self):
+        recorder = stats.enable(trace=True)
+
+        with stats.file("/x/a.py"):
+            with stats.phase("compile"):
+                with stats.span("include", { "file" : "b.py" }):
+                    with stats.phase("lex"):
+                        pass
+
+        spans = { e["name"] : e for e in recorder.files[0].spans }
+        self.assertEqual(set(spans), set(["a.py", "compile", "include", "lex"]))
+
+        #the spans are nested
+        outer, inner = spans["a.py"], spans["lex"]
+        self.assertLessEqual(outer["ts"], inner["ts"])
+        self.assertGreaterEqual(outer["ts"] + outer["dur"], inner["ts"] + inner["dur"])
+        self.assertEqual(spans["include"]["args"], { "file" : "b.py" })
+        self.assertEqual(spans["a.py"]["cat"], "file")
+
+    def test_directives(self):
+        recorder = stats.enable()
+        calls = []
+        recorder.directive_hooks.append(lambda document, directive, seconds, cloned, removed:
+                                        calls.append((directive.__class__.__name__, cloned, removed)))
+
+        text = "\n".join(["#@start()",
+                          "#@include(a)",
+                          "#@include(a)",
+                          "",
+                          "#@cstart(a)",
+                          "def a():",
+                          "    #@indent 4",
+                          "    return 1",
+                          "#@(a)",
+                          ""])
+
+        with stats.file("a.py"):
+            generate_from_text(text, "a.py")
+
+        directives = recorder.files[0].directives
+        self.assertEqual(directives["Include"]["count"], 2)
+        self.assertEqual(directives["Indent"]["count"], 1)
+        #the compiled block a (6 lines) is cloned for each include, replacing the directive line
+        self.assertEqual(directives["Include"]["cloned"], 12)
+        self.assertEqual(directives["Include"]["removed"], 2)
+        #the indent line is removed, the following lines are indented when they are read
+        self.assertEqual(directives["Indent"]["cloned"], 0)
+        self.assertEqual(directives["Indent"]["removed"], 1)
+        self.assertEqual(len(calls), sum(d["count"] for d in directives.values()))
+
+        summary = recorder.summary()
+        self.assertEqual(summary["directives"]["Include"]["count"], 2)
+        self.assertIn("Include", recorder.report(summary))
+
+    def test_memory(self):
+        recorder = stats.enable(memory=True)
+        self.assertTrue(tracemalloc.is_tracing())
+
+        text = "\n".join(["#@start()", "#@include(a)", "",
+                          "#@cstart(a)", "def a():", "    return 1", "#@(a)", ""])
+
+        with stats.file("a.py"):
+            with stats.phase("lex"):
+                data = [ bytearray(100) for i in range(10000) ]
+                del data
+
+            generate_from_text(text, "a.py")
+
+        memory = recorder.files[0].memory
+        self.assertGreater(memory["phases"]["lex"], 1000000)
+        self.assertEqual(memory["peak"], max(memory["phases"].values()))
+        self.assertIn("compile", memory["phases"])
+        #the lines of the compiled document are allocated by antiweb
+        self.assertTrue(memory["allocations"])
+        self.assertTrue(all(not s["site"].startswith("stats.py") for s in memory["allocations"]))
+
+        summary = recorder.summary()
+        self.assertEqual(summary["memory"]["max"], memory["peak"])
+        self.assertIn("memory peak per file", recorder.report(summary))
+
+        stats.disable()
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import threading
+import unittest
+from tests.testutil import TempDir
+
+sys.path.append("..")
+
+from antiweb_lib.subdoccache import SubDocumentCache, shared_cache
+from antiweb_lib.write import generate
+
+
+class Test_SubDocumentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TempDir()
+        shared_cache.clear()
+        self.write_source("common.py", "#@start()\n#@start(common doc)\n#common 1\n")
+        self.write_source("a.py", "#@start()\n#a\n#@include(common doc, common.py)\n")
+        self.write_source(os.path.join("sub", "b.py"), "#@start()\n#b\n#@include(common doc, ../common.py)\n")
+
+    def tearDown(self):
+        shared_cache.clear()
+        self.temp_dir.remove_tempdir()
+
+    def write_source(self, name, text):
+        path = self.temp_dir.get_path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, "w") as f:
+            f.write(text)
+
+    def test_shared_entry(self):
+        hits = shared_cache.hits
+        self.assertEqual(generate(self.temp_dir.get_path("a.py"), None), "a\ncommon 1")
+        self.assertEqual(generate(self.temp_dir.get_path("sub", "b.py"), None), "b\ncommon 1")
+        self.assertEqual(len(shared_cache), 1)
+        self.assertEqual(shared_cache.hits, hits + 1)
+
+    def test_changed_file(self):
+        generate(self.temp_dir.get_path("a.py"), None)
+        time.sleep(0.01)
+        self.write_source("common.py", "#@start()\n#@start(common doc)\n#common 2\n")
+        self.assertEqual(generate(self.temp_dir.get_path("a.py"), None), "a\ncommon 2")
+
+    def test_changed_nested_file(self):
+        self.write_source("b.py", "#@start()\n#@start(b doc)\n#B 1\n")
+        self.write_source("nested.py", "#@start()\n#@start(nested doc)\n#nested\n#@include(b doc, b.py)\n")
+        self.write_source("main.py", "#@start()\n#main\n#@include(nested doc, nested.py)\n")
+
+        main = self.temp_dir.get_path("main.py")
+        self.assertEqual(generate(main, None), "main\nnested\nB 1")
+
+        #only the file included by the cached sub document changes
+        time.sleep(0.01)
+        self.write_source("b.py", "#@start()\n#@start(b doc)\n#B 2\n")
+        self.assertEqual(generate(main, None), "main\nnested\nB 2")
+
+        #a missing file included by the cached sub document is created
+        self.write_source("nested.py", "#@start()\n#@start(nested doc)\n#nested\n#@include(c doc, c.py)\n")
+        self.assertNotIn("C", generate(main, None))
+        self.write_source("c.py", "#@start()\n#@start(c doc)\n#C\n")
+        self.assertEqual(generate(main, None), "main\nnested\nC")
+
+    def test_tokens(self):
+        generate(self.temp_dir.get_path("a.py"), None)
+        generate(self.temp_dir.get_path("a.py"), ["token"])
+        self.assertEqual(len(shared_cache), 2)
+
+    def test_compiled_block_unlocked(self):
+        generate(self.temp_dir.get_path("a.py"), None)
+
+        locked, release = threading.Event(), threading.Event()
+        def compile_other():
+            #another thread compiling a shared sub document
+            with shared_cache.compile_lock:
+                locked.set()
+                release.wait(10)
+
+        thread = threading.Thread(target=compile_other)
+        thread.start()
+        locked.wait(10)
+        try:
+            #the compiled block of the shared sub document is read without the lock
+            self.assertEqual(generate(self.temp_dir.get_path("sub", "b.py"), None), "b\ncommon 1")
+            self.assertTrue(thread.is_alive())
+        finally:
+            release.set()
+            thread.join()
+
+    def test_eviction(self):
+        class Doc(object):
+            def __init__(self, size):
+                self.lines = [ type("Line", (), { "text" : "x" * size })() ]
+
+        cache = SubDocumentCache(budget=1000)
+        cache.put("a", Doc(300))
+        cache.put("b", Doc(300))
+        cache.get("a")
+        cache.put("c", Doc(300))
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from tests.testutil import DataDir
+
+sys.path.append("..")
+
+from antiweb_lib.document import WebError
+from antiweb_lib.write import generate, generate_from_text
+
+
+class Test_GenerateFromText(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = DataDir("test")
+
+    def read(self, name):
+        with open(self.data_dir.get_path(name), "r") as f:
+            return f.read()
+
+    def test_resolver(self):
+        expected = generate(self.data_dir.get_path("other_file.c"), None)
+
+        virtual_dir = os.path.join(os.sep, "virtual", "docs")
+        files = { os.path.join(virtual_dir, "block1.c") : self.read("block1.c") }
+        source = self.read("other_file.c")
+        dependencies = set()
+
+        #no file may be opened
+        with mock.patch("builtins.open", side_effect=AssertionError("file opened")):
+            text = generate_from_text(source, os.path.join(virtual_dir, "other_file.c"),
+                                      resolver=files.get, dependencies=dependencies)
+
+        self.assertEqual(text, expected)
+        self.assertEqual(dependencies, set(files))
+
+    def test_missing_include(self):
+        with self.assertRaises(WebError):
+            generate_from_text(self.read("other_file.c"), "other_file.c", resolver={}.get)
+
+    def test_language(self):
+        text = "x = 1\n#@start()\n#Title\n#=====\n#@code\ny = 2\n"
+        self.assertEqual(generate_from_text(text, "<editor>", language="python"),
+                         generate_from_text(text, "preview.py"))
+
+
+if __name__ == "__main__":
+    unittest.main()